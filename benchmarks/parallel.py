@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+A benchmark measuring the CPU time the calling process spends on the response
+bodies of a relation with a preprocessor, when they are parsed in the calling
+process, when the workers of a :class:`pyresto.parallel.ParsePool` send back
+the parsed data as it is, and when they send it back marshalled, which is what
+the pool does. The time of the workers is not counted, since it does not hold
+up the threads of the calling process. Run with::
+
+    python benchmarks/parallel.py
+
+"""
+
+import json
+import multiprocessing
+import resource
+
+from operator import itemgetter
+
+from pyresto.core import Many, Model
+from pyresto.parallel import ParsePool
+
+
+BODIES = 20
+COMMENTS = 5000
+
+
+class Comment(Model):
+    _url_base = 'http://example.com'
+    _pk = 'id'
+
+
+class Bug(Model):
+    _url_base = 'http://example.com'
+    _pk = 'id'
+    comments = Many(Comment, '/bug/{id}/comment',
+                    preprocessor=itemgetter('comments'))
+
+
+def make_body(bug):
+    comments = [dict(id=i, bug_id=bug, creator=u'user{0}@example.com'.format(
+        i % 50), text=u'Comment number {0} on the bug'.format(i),
+        creation_time=u'2012-01-01T00:00:00Z', is_private=False,
+        attachment_id=None, tags=[u'a', u'b']) for i in xrange(COMMENTS)]
+    return json.dumps(dict(comments=comments, bug_id=bug))
+
+
+def plain(body):
+    # What the workers sent back before the data was marshalled
+    return itemgetter('comments')(json.loads(body))
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def measure(parse, bodies):
+    best = None
+    for _ in xrange(3):
+        start = cpu_time()
+        for body in bodies:
+            parse(body)
+        elapsed = cpu_time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    bodies = [make_body(bug) for bug in xrange(BODIES)]
+    relation = vars(Bug)['comments']
+    pool = ParsePool(processes=2, min_size=0)
+    plain_pool = multiprocessing.Pool(2)
+
+    cases = (
+        ('parsed in process', lambda body: relation._sanitize_data(
+            Comment._parser(body))),
+        ('pool, plain data', lambda body: plain_pool.apply_async(
+            plain, (body,)).get()),
+        ('pool, marshalled', lambda body: pool.parse(Comment, body,
+                                                     relation)),
+    )
+
+    print '{0:>20} {1:>12}'.format('', 'parent cpu ms')
+    for name, parse in cases:
+        print '{0:>20} {1:>12.1f}'.format(name,
+                                          measure(parse, bodies) * 1e3)
+
+    pool.close()
+    plain_pool.close()
+    plain_pool.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+A micro-benchmark comparing paths built with
+:func:`pyresto.core.compile_path` and memoized per instance with calling
+:meth:`str.format` on the raw templates every time, the way paths were built
+before. Run with::
+
+    python benchmarks/paths.py
+
+"""
+
+import time
+
+from pyresto.apis.github import Repo
+from pyresto.core import compile_path
+
+
+MANY_PATHS = ('{self._current_path}/commits?per_page=100',
+              '{self._current_path}/comments?per_page=100',
+              '{self._current_path}/tags?per_page=100')
+COMPILED_MANY_PATHS = tuple(compile_path(path) for path in MANY_PATHS)
+INSTANCES = 20000
+
+
+class FormattedRepo(Repo):
+    @property
+    def _current_path(self):
+        # the old way: format the raw template on every access
+        return self._path.format(**self._footprint)
+
+
+def formatted(repos):
+    for repo in repos:
+        Repo._path.format(full_name=repo.full_name)  # Model.get
+        repo._current_path  # Model.__fetch
+        repo._current_path  # Model.__repr__
+        footprint = repo._footprint
+        for path in MANY_PATHS:  # Many.__get__
+            path.format(**footprint)
+
+
+def compiled(repos):
+    for repo in repos:
+        Repo._path_template(dict(full_name=repo.full_name))
+        repo._current_path
+        repo._current_path
+        footprint = repo._footprint
+        for path in COMPILED_MANY_PATHS:
+            path(footprint)
+
+
+def main():
+    for name, func, model in (('str.format', formatted, FormattedRepo),
+                              ('compiled', compiled, Repo)):
+        best = None
+        for _ in xrange(5):
+            # fresh instances every time so nothing is memoized beforehand
+            repos = [model(full_name='owner/repo{0}'.format(i))
+                     for i in xrange(INSTANCES)]
+            for repo in repos:
+                repo._footprint
+
+            start = time.time()
+            func(repos)
+            elapsed = time.time() - start
+            best = elapsed if best is None else min(best, elapsed)
+
+        print '{0:>12}: {1:.3f} us per instance'.format(
+            name, best / INSTANCES * 1e6)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+A benchmark comparing the size and the speed of :mod:`pyresto.serialize`
+with pickling the instance dictionaries of the models, which loses the loaded
+relations, and with dumping the raw data as JSON, for a repository with a
+loaded list of commits by a few authors. Each format is measured without and
+with the same :mod:`zlib` compression. Run with::
+
+    python benchmarks/serialize.py
+
+"""
+
+import cPickle
+import json
+import time
+import zlib
+
+from pyresto.apis.github import Commit, Repo
+from pyresto.serialize import dumps, loads
+
+
+COMMITS = 5000
+AUTHORS = 20
+
+
+def make_repo():
+    data = [dict(sha='{0:040x}'.format(i), url=u'https://api.github.com/x',
+                 author=dict(login=u'user{0}'.format(i % AUTHORS),
+                             id=i % AUTHORS,
+                             avatar_url=u'https://github.com/images/x.png'),
+                 commit=dict(message=u'Fix the thing', tree=dict(sha=u'x')))
+            for i in xrange(COMMITS)]
+    data = json.loads(json.dumps(data))  # no shared strings, like responses
+
+    repo = Repo(full_name=u'owner/repo', name=u'repo')
+    repo._fetched = True
+    vars(Repo)['commits']._restore(repo, data)
+    for commit in vars(Repo)['commits']._cached(repo):
+        commit.author  # load the embedded relation
+    return repo, data
+
+
+def best_of(func, *args):
+    best = None
+    for _ in xrange(5):
+        start = time.time()
+        result = func(*args)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    repo, data = make_repo()
+    commits = list(vars(Repo)['commits']._cached(repo))
+    states = [commit.__dict__ for commit in commits]
+    for state in states:  # not picklable and not needed anyway
+        state.pop('_pyresto_owner', None)
+        state.pop('_Model__footprint', None)
+
+    def compressed(dump, load):
+        return (lambda obj: zlib.compress(dump(obj), 1),
+                lambda data: load(zlib.decompress(data)))
+
+    pickle_dump = lambda obj: cPickle.dumps(obj, 2)
+    # the uncompressed and the compressed sizes are to be compared apart
+    cases = (
+        ('json (raw data)', json.dumps, json.loads, data),
+        ('pickle (states)', pickle_dump, cPickle.loads, states),
+        ('pyresto.serialize', lambda obj: dumps(obj, compress=0), loads,
+         [repo]),
+        ('json + zlib',) + compressed(json.dumps, json.loads) + (data,),
+        ('pickle + zlib',) + compressed(pickle_dump, cPickle.loads) +
+        (states,),
+        ('serialize + zlib', dumps, loads, [repo]),
+    )
+
+    print '{0:>20} {1:>10} {2:>10} {3:>10}'.format('', 'bytes', 'dump ms',
+                                                   'load ms')
+    for name, dump, load, obj in cases:
+        dump_time, serialized = best_of(dump, obj)
+        load_time, _ = best_of(load, serialized)
+        print '{0:>20} {1:>10} {2:>10.1f} {3:>10.1f}'.format(
+            name, len(serialized), dump_time * 1e3, load_time * 1e3)
+
+
+if __name__ == '__main__':
+    main()
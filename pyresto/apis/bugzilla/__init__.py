@@ -1,20 +1,20 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-import imp
-import os.path
 import sys
 import types
 
+import requests
+
+from . import models
+from ...auth import enable_auth
+from ...core import ModelBase
+
 
 __version__ = '0.2'
 __author__ = ('Berker Peksag <berker.peksag@gmail.com>',
               'Burak Yigit Kaya <ben@byk.im>')
 
-__models_file__ = os.path.join(os.path.dirname(__file__), 'models.py')
-__models_code__ = compile(open(__models_file__).read(),
-                          __models_file__, 'exec')
-
 __services__ = dict(
     mozilla='https://api-dev.bugzilla.mozilla.org/latest/',
     mozilla_test='https://api-dev.bugzilla.mozilla.org/test/latest/',
@@ -25,27 +25,109 @@ __services__ = dict(
 __all__ = ('Service',) + tuple(__services__.iterkeys())
 
 
+class BoundModelBase(ModelBase):
+    """
+    Metaclass of the model classes bound to a :class:`Service`. Besides the
+    instances of the bound class itself, the instances of the shared model
+    class which are bound to the same service, such as the ones fetched
+    through the relations of a bound instance, are instances of it too.
+
+    """
+
+    def __instancecheck__(cls, instance):
+        service = cls.__dict__.get('_service')
+        if service is not None and isinstance(instance, cls._model) and \
+                instance._url_base == service.url:
+            return True
+        return super(BoundModelBase, cls).__instancecheck__(instance)
+
+
+class BoundModel(object):
+    """
+    The base of the model classes bound to a :class:`Service`, such as
+    ``mozilla.Bug``, which are subclasses of the shared model classes.
+    Calling :meth:`get` or constructing instances through them binds the URL,
+    the authentication and the session of the service to the instances,
+    which then pass them on to the instances fetched through their relations.
+    They can be subclassed like any other model.
+
+    """
+
+    #: The :class:`Service` the class is bound to.
+    _service = None
+
+    #: The shared model class the class is bound from.
+    _model = None
+
+    def __init__(self, **kwargs):
+        super(BoundModel, self).__init__(**kwargs)
+        for name, value in self._service._bindings.iteritems():
+            setattr(self, '_' + name, value)
+
+    @classmethod
+    def get(cls, *args, **kwargs):
+        for name, value in cls._service._bindings.iteritems():
+            kwargs.setdefault(name, value)
+        return super(BoundModel, cls).get(*args, **kwargs)
+
+
 class Service(types.ModuleType):
+    """
+    A Bugzilla server. All services share the model classes defined in
+    :mod:`pyresto.apis.bugzilla.models` and only bind their own URL,
+    authentication and connection pool to the instances, so creating a
+    service for a custom Bugzilla installation is cheap::
+
+        myzilla = Service('myzilla', 'https://bugzilla.example.com/bzapi/')
+        myzilla.auth(username='<USERNAME>', password='<PASSWORD>')
+        bug = myzilla.Bug.get('42')
+
+    """
+
     def __init__(self, name, url):
+        super(Service, self).__init__('{0}.{1}'.format(__name__, name))
         self.name = name
-        self.module_name = '{0}.{1}'.format(__name__, self.name)
+        self.module_name = self.__name__
         self.url = url
-        self.__namespace = None
+        self._auth = None
+        self.__session = None
+        self.__bound_models = dict()
+
+        #: Sets the authentication for this service only, see
+        #: :func:`pyresto.auth.enable_auth`.
+        self.auth = enable_auth(models.auths, self, 'querystring')
+
+        sys.modules[self.module_name] = self
 
     @property
-    def namespace(self):
-        if self.__namespace is None:
-            # All these "namespacing tricks" are from (from slides 43+)
-            # https://speakerdeck.com/u/antocuni/p/python-white-magic?slide=87
-            self.__namespace = imp.new_module(self.module_name)
-            self.__namespace.__service_url__ = self.url
-            exec __models_code__ in self.__namespace.__dict__
-            sys.modules[self.module_name] = self.__namespace
+    def session(self):
+        """The :class:`requests.Session` holding the service's connections."""
+
+        if self.__session is None:
+            self.__session = requests.session()
+        return self.__session
 
-        return self.__namespace
+    @property
+    def _bindings(self):
+        bindings = dict(url_base=self.url, session=self.session)
+        if self._auth is not None:
+            bindings['auth'] = self._auth
+        return bindings
 
     def __getattr__(self, item):
-        return getattr(self.namespace, item)
+        if item.startswith('__'):  # do not shadow the module protocol
+            raise AttributeError(item)
+
+        attr = getattr(models, item)
+        if isinstance(attr, type) and issubclass(attr, models.BugzillaModel):
+            if item not in self.__bound_models:
+                self.__bound_models[item] = BoundModelBase(
+                    item, (BoundModel, attr),
+                    dict(_service=self, _model=attr, _url_base=self.url,
+                         __module__=self.module_name))
+            return self.__bound_models[item]
+
+        return attr
 
 
 # Create services
@@ -1,13 +1,31 @@
 # coding: utf-8
 
+import mmap  # built-in
+import os  # built-in
+import tempfile  # built-in
+import urlparse  # built-in
+
+from multiprocessing.pool import ThreadPool  # built-in
 from operator import itemgetter  # built-in
+from urllib import quote  # built-in
 
 from ...auth import UserQSAuth, AuthList, enable_auth
-from ...core import Foreign, Many, Model
+from ...core import _merge_query, Foreign, Many, Model
+from ...scheduler import BULK
+from ...transfer import Base64FieldDecoder
 
 
 class BugzillaModel(Model):
-    _url_base = __service_url__  # NOQA
+    # Bound per instance by the pyresto.apis.bugzilla.Service instances
+    _url_base = None
+    _update_method = 'PUT'
+
+    # The fields the bug searches match exactly, which can be filtered on the
+    # server
+    _exact_filters = frozenset((
+        'id', 'alias', 'product', 'component', 'classification', 'status',
+        'resolution', 'severity', 'priority', 'version', 'platform',
+        'op_sys', 'target_milestone', 'assigned_to', 'creator', 'qa_contact'))
 
     def __repr__(self):
         if hasattr(self, 'ref'):
@@ -18,15 +36,58 @@ class BugzillaModel(Model):
         return '<Bugzilla.{0} [{1}]>'.format(self.__class__.__name__, desc)
 
     @classmethod
-    def _rest_call(cls, url, method='GET', fetch_all=True, **kwargs):
-        if 'headers' not in kwargs:
-            kwargs['headers'] = dict()
+    def _project_path(cls, path, fields):
+        # Only the paths asking for all the fields are projected. The others,
+        # such as the ones of the Many fields of Bug, select a field of the
+        # bug already, and the fields of the items in it cannot be selected,
+        # so the items are only pruned on the client side: they take less
+        # memory but the whole field is still downloaded.
+        base, _, query = path.partition('?')
+        params = urlparse.parse_qsl(query, True)
+        include = dict(params).get('include_fields', '_all')
+        if include != '_all':
+            return None
+
+        params = [(k, v) for k, v in params
+                  if k not in ('include_fields', 'exclude_fields')]
+        params.append(('include_fields', ','.join(cls._pk + tuple(fields))))
+        return base + '?' + '&'.join('{0}={1}'.format(quote(k), quote(v, ','))
+                                     for k, v in params)
 
-        kwargs['headers']['Content-Type'] = 'application/json'
-        kwargs['headers']['Accept'] = 'application/json'
+    @classmethod
+    def _filter_path(cls, path, filters):
+        # Searches take any field as a parameter, but the Many fields of Bug
+        # are fields of a single bug which cannot be filtered on the server.
+        # Only the fields searched for exact values are pushed since others,
+        # such as summary, match substrings unlike the client side filters.
+        if path.partition('?')[0].rstrip('/').rpartition('/')[2] != 'bug':
+            return path, filters
+
+        pushed = dict((name, value) for name, value in filters.iteritems()
+                      if name in cls._exact_filters)
+        if not pushed:
+            return path, filters
+
+        remaining = dict((name, value) for name, value in filters.iteritems()
+                         if name not in pushed)
+        return _merge_query(path, pushed), remaining
+
+    def _write_request(self, action):
+        # The query strings of the paths only select the fields to fetch
+        method, path, fields = super(BugzillaModel, self)._write_request(
+            action)
+        return method, path.partition('?')[0], fields
+
+    def _write_result(self, action, data):
+        # Updates only return the list of changes, creations return the id
+        return data if action == 'create' else None
 
-        return super(BugzillaModel, cls)._rest_call(url, method, fetch_all,
-                                                    **kwargs)
+    @classmethod
+    def _request_headers(cls, method):
+        headers = super(BugzillaModel, cls)._request_headers(method)
+        headers['Content-Type'] = 'application/json'
+        headers['Accept'] = 'application/json'
+        return headers
 
 
 class User(BugzillaModel):
@@ -61,13 +122,84 @@ class ChangeSet(BugzillaModel):
 
 
 class Attachment(BugzillaModel):
-    _path = 'attachment/{id}?exclude_fields=flags'
+    # The payload is only fetched by download, never as a field
+    _path = 'attachment/{id}?exclude_fields=flags,data'
     _pk = 'id'
 
     attacher = Foreign(User, '__attacher', embedded=True)
     flags = Many(Flag, 'attachment/{id}?include_fields=flags',
                  preprocessor=itemgetter('flags'))
 
+    def download(self, target=None):
+        """
+        Downloads the content of the attachment, streaming the response and
+        decoding its base64 encoded ``data`` field as it arrives, so the
+        memory used does not depend on the size of the attachment.
+
+        :param target: (optional) The path of the file or the file object to
+                       write the content to. If not given, the content is
+                       written to a temporary file which is returned memory
+                       mapped.
+        :type target: string or file or None
+
+        :returns: The ``target``, or a read-only :class:`mmap.mmap` of the
+                  content if no ``target`` is given, which is an empty
+                  string for an empty attachment.
+
+        """
+
+        if isinstance(target, basestring):
+            with open(target, 'wb') as output:
+                self.download(output)
+            return target
+        elif target is None:
+            output = tempfile.TemporaryFile()
+            try:
+                self.download(output)
+                output.flush()
+                if not os.fstat(output.fileno()).st_size:
+                    return ''  # empty files cannot be mapped
+                return mmap.mmap(output.fileno(), 0, access=mmap.ACCESS_READ)
+            finally:
+                output.close()  # the mapping keeps the file alive
+
+        path = self._current_path.partition('?')[0] + \
+            '?attachmentdata=1&include_fields=data'
+        kwargs = self._request_kwargs
+        kwargs.pop('cache', None)
+
+        stream = Base64FieldDecoder('data')
+        for chunk in self._stream('GET', self._get_sanitized_url(
+                self._absolute_url(path)), **kwargs):
+            target.write(stream.decompress(chunk))
+        target.write(stream.flush())
+        return target
+
+    @classmethod
+    def download_many(cls, attachments, directory, concurrency=4):
+        """
+        Downloads the content of many attachments at once with
+        :meth:`download`, ``concurrency`` at a time, into the files named
+        after their ids in ``directory``, and returns the list of the paths.
+
+        """
+
+        def download(attachment):
+            path = os.path.join(directory, unicode(attachment.id))
+            try:
+                return attachment.download(path)
+            except Exception:
+                if os.path.exists(path):
+                    os.remove(path)  # do not leave partial files behind
+                raise
+
+        pool = ThreadPool(concurrency)
+        try:
+            return pool.map(download, attachments)
+        finally:
+            pool.close()
+            pool.join()
+
 
 class Bug(BugzillaModel):
     _path = 'bug/{id}'
@@ -78,7 +210,8 @@ class Bug(BugzillaModel):
         for field, model in many_fields.iteritems():
             path = cls._path + '?include_fields=' + field
             if model is cls:
-                preprocessor = lambda d: list(dict(id=b) for b in d[field])
+                preprocessor = lambda d, field=field: list(dict(id=b)
+                                                           for b in d[field])
             else:
                 preprocessor = itemgetter(field)
             setattr(cls, field, Many(model, path, preprocessor=preprocessor))
@@ -87,6 +220,101 @@ class Bug(BugzillaModel):
 
         return cls
 
+    @classmethod
+    def _fetch_many(cls, ids, url_base=None, session=None, **kwargs):
+        # Bugzilla can search for many bugs at once using a comma separated
+        # list of ids, with the same field filters as a single bug.
+        query = cls._path.partition('?')[2]
+        path = 'bug?id={0}&{1}'.format(','.join(unicode(i) for i in ids),
+                                       query)
+        if url_base:
+            path = urlparse.urljoin(url_base, path)
+        if session is not None:
+            kwargs['session'] = session
+
+        data = cls._rest_call(url=path, **kwargs).data
+        return data.get('bugs', list()) if data else list()
+
+    @classmethod
+    def load_relations(cls, bugs, *fields, **kwargs):
+        """
+        Loads the given :class:`Many <pyresto.core.Many>` fields, such as
+        ``'comments'`` or ``'history'``, of many bugs at once by searching
+        for ``batch_size`` bugs in a request, and caches them on every bug as
+        if they were accessed. The bugs which have all the fields loaded
+        already are skipped. For instance::
+
+            Bug.load_relations(bugs, 'comments', 'history')
+            for bug in bugs:
+                report(bug, bug.comments, bug.history)  # no more requests
+
+        :param batch_size: (optional) The number of bugs to search for in a
+                           request, 100 by default.
+        :type batch_size: int
+
+        :returns: The number of requests made.
+
+        """
+
+        batch_size = kwargs.pop('batch_size', 100)
+        if kwargs:
+            raise TypeError('Unexpected keyword arguments: {0}'.format(
+                ', '.join(kwargs)))
+
+        relations = dict()
+        for field in fields:
+            relation = next((klass.__dict__[field] for klass in cls.__mro__
+                             if field in klass.__dict__), None)
+            if not isinstance(relation, Many):
+                raise AttributeError('{0} has no Many relation called '
+                                     '{1}'.format(cls.__name__, field))
+            relations[field] = relation
+
+        # the bugs of different services are searched for separately, in
+        # the order they were first given, as lists of keys plus dicts since
+        # collections.OrderedDict is missing on Python 2.6
+        groups = dict()
+        services = list()
+        for bug in bugs:
+            if any(relation._cached(bug) is None
+                   for relation in relations.itervalues()):
+                url_base = bug.__dict__.get('_url_base')
+                if url_base not in groups:
+                    groups[url_base] = (list(), dict())
+                    services.append(url_base)
+                ids, by_id = groups[url_base]
+                if bug._id not in by_id:
+                    ids.append(bug._id)
+                by_id[bug._id] = bug
+
+        requests = 0
+        for url_base in services:
+            ids, by_id = groups[url_base]
+            members = [by_id[bug_id] for bug_id in ids]
+            for start in xrange(0, len(members), batch_size):
+                batch = members[start:start + batch_size]
+                path = 'bug?id={0}&include_fields=id,{1}'.format(
+                    ','.join(unicode(bug._id) for bug in batch),
+                    ','.join(fields))
+                request_kwargs = batch[0]._request_kwargs
+                request_kwargs.setdefault('priority', BULK)
+                data = cls._rest_call(url=batch[0]._absolute_url(path),
+                                      **request_kwargs).data
+                requests += 1
+
+                found = dict((unicode(item.get('id')), item)
+                             for item in (data or {}).get('bugs', ()))
+                for bug in batch:
+                    item = found.get(unicode(bug._id))
+                    if item is None:  # not visible to the user
+                        continue
+                    for field, relation in relations.iteritems():
+                        if field in item and relation._cached(bug) is None:
+                            relation._restore(bug,
+                                              relation._sanitize_data(item))
+
+        return requests
+
     assigned_to = Foreign(User, '__assigned_to', embedded=True)
     creator = Foreign(User, '__creator', embedded=True)
     qa_contact = Foreign(User, '__qa_contact', embedded=True)
@@ -1,11 +1,37 @@
 # coding: utf-8
 
 from ...auth import HTTPBasicAuth, AppQSAuth, AuthList, enable_auth
-from ...core import Foreign, Many, Model
+from ...core import _merge_query, Foreign, Many, Model
 
 
 class GitHubModel(Model):
     _url_base = 'https://api.github.com'
+    _page_size_param = 'per_page'
+    _max_page_size = 100
+
+    # The query parameters filtering the collections, by the last segment of
+    # their paths
+    _filter_params = dict(
+        commits=('sha', 'path', 'author', 'committer', 'since', 'until'),
+        repos=('type', 'visibility', 'affiliation'),
+        branches=('protected',),
+        issues=('state', 'labels', 'assignee', 'creator', 'mentioned',
+                'milestone', 'since'),
+        pulls=('state', 'head', 'base'),
+    )
+
+    @classmethod
+    def _filter_path(cls, path, filters):
+        collection = path.partition('?')[0].rstrip('/').rpartition('/')[2]
+        supported = cls._filter_params.get(collection, ())
+        pushed = dict((name, value) for name, value in filters.iteritems()
+                      if name in supported)
+        if not pushed:
+            return path, filters
+
+        remaining = dict((name, value) for name, value in filters.iteritems()
+                         if name not in pushed)
+        return _merge_query(path, pushed), remaining
 
     def __repr__(self):
         if hasattr(self, '_links'):
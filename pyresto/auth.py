@@ -22,12 +22,23 @@ class Auth(requests.auth.AuthBase):
     def __call__(self, r):
         return r
 
+    def fingerprint(self):
+        """
+        Returns a string identifying the credentials, which keeps the cached
+        responses of different users apart, or ``None`` if they cannot be
+        identified, in which case the responses are not cached.
+        """
+        return None
+
 
 class AppQSAuth(Auth):
     def __init__(self, client_id, client_secret):
         self.client_id = client_id
         self.client_secret = client_secret
 
+    def fingerprint(self):
+        return repr(('app', self.client_id, self.client_secret))
+
     def __call__(self, req):
         if not req.redirect:
             req.params['client_id'] = self.client_id
@@ -40,6 +51,9 @@ class UserQSAuth(Auth):
         self.username = username
         self.password = password
 
+    def fingerprint(self):
+        return repr(('user', self.username, self.password))
+
     def __call__(self, req):
         if not req.redirect:
             req.params['username'] = self.username
@@ -0,0 +1,221 @@
+# coding: utf-8
+
+"""
+pyresto.batch
+~~~~~~~~~~~~~
+
+This module contains the unit of work which saves and deletes many models at
+once, such as labelling thousands of issues, concurrently and under rate
+limit and retry control.
+
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from multiprocessing.pool import ThreadPool
+
+from requests.exceptions import ConnectionError, Timeout
+
+from .core import CircuitOpenException, ServerResponseException
+
+
+__all__ = ('Batch', 'BatchError', 'write_result')
+
+
+#: The type returned for every model by :meth:`Batch.commit` holding the
+#: model, the action which is one of ``'create'``, ``'update'`` or
+#: ``'delete'`` and the exception if the write failed, ``None`` otherwise.
+write_result = collections.namedtuple('write_result', 'model action error')
+
+#: The HTTP status codes for which the writes are retried.
+RETRY_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
+
+
+class BatchError(Exception):
+    """
+    Raised when leaving the context of a :class:`Batch` if any of the writes
+    failed.
+
+    """
+
+    def __init__(self, results):
+        #: The :data:`write_result` of all the writes.
+        self.results = results
+        #: The :data:`write_result` of the failed writes.
+        self.failures = [result for result in results
+                         if result.error is not None]
+        super(BatchError, self).__init__('{0} of {1} writes failed'.format(
+            len(self.failures), len(results)))
+
+
+class _Throttle(object):
+    # Spaces the requests started from all the threads at least 1 / rate
+    # seconds apart.
+
+    def __init__(self, rate):
+        self.__interval = 1.0 / rate if rate else 0
+        self.__next = 0
+        self.__lock = threading.Lock()
+
+    def wait(self):
+        if not self.__interval:
+            return
+
+        with self.__lock:
+            now = time.time()
+            start = max(now, self.__next)
+            self.__next = start + self.__interval
+
+        if start > now:
+            time.sleep(start - now)
+
+
+def _retryable(error, action):
+    # The creations are not idempotent, so they are only retried when the
+    # server surely did not act on them: when the request was not sent or
+    # it was rate limited.
+    if isinstance(error, CircuitOpenException):
+        return True
+    elif isinstance(error, ServerResponseException):
+        if action == 'create':
+            return error.status_code == 429
+        return error.status_code in RETRY_STATUS_CODES
+    return action != 'create' and isinstance(error, (ConnectionError, Timeout))
+
+
+class Batch(object):
+    """
+    A unit of work which collects the models to save and delete, and sends
+    them on :meth:`commit` concurrently. Existing models only send the fields
+    assigned since they were fetched, see :meth:`Model.save
+    <pyresto.core.Model.save>`, and the models without changes are skipped.
+    It can be used as a context manager which commits on exit unless there is
+    an exception, and raises :exc:`BatchError` if any of the writes failed::
+
+        with Batch(rate=10) as batch:
+            for issue in repo.issues:
+                batch.patch(issue, labels=['triaged'])
+
+    """
+
+    def __init__(self, concurrency=8, rate=None, retries=3, backoff=1.0):
+        """
+        Constructor for the batch.
+
+        :param concurrency: (optional) The number of concurrent requests.
+        :type concurrency: int
+
+        :param rate: (optional) The maximum number of requests per second, or
+                     ``None`` for no limit.
+        :type rate: float or None
+
+        :param retries: (optional) The number of times a write is retried
+                        after a connection error or a rate limit or server
+                        error response. The creations, which are not
+                        idempotent, are only retried after a rate limit
+                        response or when the request was not sent.
+        :type retries: int
+
+        :param backoff: (optional) The number of seconds to wait before the
+                        first retry, doubled for every next retry.
+        :type backoff: float
+
+        """
+
+        self.concurrency = concurrency
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.__pending = dict()
+        self.__order = list()  # the pending writes in the order of adding
+
+    def __add(self, model, action):
+        write = self.__pending.get(id(model))
+        if write is None:
+            write = self.__pending[id(model)] = [model, action]
+            self.__order.append(write)
+        return write
+
+    def save(self, *models):
+        """Adds the ``models`` to be created or updated."""
+
+        for model in models:
+            self.__add(model, 'save')
+
+    def patch(self, model, **fields):
+        """Sets the given fields on the ``model`` and adds it to be saved."""
+
+        for name, value in fields.iteritems():
+            setattr(model, name, value)
+        self.save(model)
+
+    def delete(self, *models):
+        """Adds the ``models`` to be deleted, dropping any pending save."""
+
+        for model in models:
+            self.__add(model, 'delete')[1] = 'delete'
+
+    def __len__(self):
+        return len(self.__pending)
+
+    def __write(self, throttle, model, action):
+        attempt = 0
+        while True:
+            throttle.wait()
+            try:
+                model._write(action)
+                return write_result(model, action, None)
+            except Exception as error:
+                if attempt >= self.retries or not _retryable(error, action):
+                    logging.error('Could not %s %r: %s', action, model, error)
+                    return write_result(model, action, error)
+
+            time.sleep(self.backoff * 2 ** attempt)
+            attempt += 1
+
+    def commit(self):
+        """
+        Sends all the pending writes and returns a list of
+        :data:`write_result` for them in the order they were added. The
+        failed writes are not raised but reported in the results.
+
+        :rtype: list
+
+        """
+
+        writes = list()
+        for model, action in self.__order:
+            if action == 'save':
+                if model._is_new:
+                    action = 'create'
+                elif model._dirty:
+                    action = 'update'
+                else:
+                    continue
+            writes.append((model, action))
+        self.__pending.clear()
+        del self.__order[:]
+
+        if not writes:
+            return list()
+
+        throttle = _Throttle(self.rate)
+        pool = ThreadPool(min(self.concurrency, len(writes)))
+        try:
+            return pool.map(lambda write: self.__write(throttle, *write),
+                            writes)
+        finally:
+            pool.close()
+            pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            results = self.commit()
+            if any(result.error is not None for result in results):
+                raise BatchError(results)
@@ -0,0 +1,329 @@
+# coding: utf-8
+
+"""
+pyresto.breaker
+~~~~~~~~~~~~~~~
+
+This module contains the circuit breaker which can be plugged into
+:attr:`Model._breaker <pyresto.core.Model._breaker>` so a failing server does
+not hold up the workers talking to it: once most of the recent requests to a
+host fail or time out, the requests to it fail right away for a while, the
+responses it served before are used instead where possible, and only a few
+probes are let through to see if it recovered.
+
+"""
+
+import collections
+import logging
+import threading
+import time
+import urlparse
+
+from requests.exceptions import ConnectionError, Timeout
+
+from .batch import RETRY_STATUS_CODES
+from .cache import _LRUDict
+from .core import (CircuitOpenException, ResponseTooLargeException,
+                   ServerResponseException)
+
+
+__all__ = ('CircuitBreaker', 'CLOSED', 'OPEN', 'HALF_OPEN')
+
+#: The state of the circuits letting all the requests through.
+CLOSED = 'closed'
+
+#: The state of the circuits failing all the requests fast.
+OPEN = 'open'
+
+#: The state of the circuits letting a few probes through after being open.
+HALF_OPEN = 'half_open'
+
+
+def _host(url):
+    parts = urlparse.urlsplit(url)
+    return '{0}://{1}'.format(parts.scheme, parts.netloc)
+
+
+def _failure(error):
+    # The errors showing that the server is in trouble, unlike the client
+    # errors such as 404 which are the same whatever the state of the server
+    if isinstance(error, ResponseTooLargeException):
+        return False
+    elif isinstance(error, ServerResponseException):
+        return error.status_code in RETRY_STATUS_CODES
+    return isinstance(error, (ConnectionError, Timeout))
+
+
+class _Circuit(object):
+    # The state of the requests to a host
+
+    def __init__(self, window, reset_timeout):
+        self.state = CLOSED
+        self.outcomes = collections.deque(maxlen=window)
+        self.opened_at = None
+        self.reset_timeout = reset_timeout
+        self.probes = 0
+        self.active = 0
+
+
+class _StaleStore(object):
+    # The responses kept for the rejected requests, the least recently used
+    # ones dropped once their bodies take more than max_size bytes.
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.__entries = _LRUDict()
+        self.__lock = threading.Lock()
+
+    def set(self, key, response):
+        size = len(response.body)
+        with self.__lock:
+            previous = self.__entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous.body)
+            if size > self.max_size:
+                return
+
+            self.__entries[key] = response
+            self.size += size
+            while self.size > self.max_size:
+                _, dropped = self.__entries.popitem()
+                self.size -= len(dropped.body)
+
+    def get(self, key):
+        with self.__lock:
+            return self.__entries.get(key)  # marks it as recently used
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+class CircuitBreaker(object):
+    """
+    Keeps a circuit for every host, which is the scheme and the network
+    location of the URLs, so every :attr:`Model._url_base
+    <pyresto.core.Model._url_base>` on its own host has its own::
+
+        Model._breaker = CircuitBreaker(failure_rate=0.5, reset_timeout=30)
+
+    A circuit opens when at least ``failure_rate`` of its last ``window``
+    requests failed, once it has seen ``min_requests``. The failures are the
+    connection errors, the timeouts, the server errors and the rate limited
+    responses, along with the responses slower than ``slow_call`` seconds if
+    given. While open, the requests raise
+    :exc:`CircuitOpenException <pyresto.core.CircuitOpenException>` without
+    being sent. After ``reset_timeout`` seconds, ``probes`` requests are let
+    through: the circuit closes if they succeed and opens again for twice as
+    long, up to ``max_reset_timeout``, if not. The requests beyond
+    ``max_concurrent`` in flight to a host, if given, are rejected the same
+    way to shed the load.
+
+    The responses of the successful ``GET`` requests are kept as they are,
+    up to ``stale_size`` bytes of bodies, and served by
+    :meth:`Model._cached_request <pyresto.core.Model._cached_request>` when a
+    request is rejected.
+
+    """
+
+    def __init__(self, failure_rate=0.5, min_requests=10, window=50,
+                 slow_call=None, reset_timeout=30, max_reset_timeout=300,
+                 probes=1, max_concurrent=None, stale_size=16 * 1024 * 1024):
+        """
+        Constructor for the circuit breaker.
+
+        :param failure_rate: (optional) The share of the failed requests
+                             which opens a circuit.
+        :type failure_rate: float
+
+        :param min_requests: (optional) The number of requests a circuit
+                             needs to see before opening.
+        :type min_requests: int
+
+        :param window: (optional) The number of recent requests to calculate
+                       the failure rate from.
+        :type window: int
+
+        :param slow_call: (optional) The seconds after which a successful
+                          response counts as a failure, or ``None``.
+        :type slow_call: float or None
+
+        :param reset_timeout: (optional) The seconds a circuit stays open
+                              before the probes.
+        :type reset_timeout: float
+
+        :param max_reset_timeout: (optional) The longest seconds a circuit
+                                  stays open after failed probes.
+        :type max_reset_timeout: float
+
+        :param probes: (optional) The number of requests let through at once
+                       by a half open circuit.
+        :type probes: int
+
+        :param max_concurrent: (optional) The number of requests which can be
+                               in flight to a host, or ``None`` for no limit.
+        :type max_concurrent: int or None
+
+        :param stale_size: (optional) The total size in bytes of the bodies
+                           of the responses to keep, dropping the least
+                           recently used ones, or ``0`` to keep none.
+        :type stale_size: int
+
+        """
+
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.probes = probes
+        self.max_concurrent = max_concurrent
+        self.__stale = _StaleStore(stale_size)
+        self.__window = window
+        self.__lock = threading.Lock()
+        self.__circuits = dict()
+        self.__metrics = collections.defaultdict(int)
+
+    def __circuit(self, host):
+        circuit = self.__circuits.get(host)
+        if circuit is None:
+            circuit = self.__circuits[host] = _Circuit(self.__window,
+                                                       self.reset_timeout)
+        return circuit
+
+    def __reject(self, host, reason, metric):
+        self.__metrics[metric] += 1
+        raise CircuitOpenException('Request to {0} rejected: {1}'.format(
+            host, reason))
+
+    def __acquire(self, host):
+        # Lets a request through or raises CircuitOpenException, and returns
+        # whether the request is a probe
+        with self.__lock:
+            circuit = self.__circuit(host)
+            if circuit.state == OPEN:
+                if time.time() - circuit.opened_at < circuit.reset_timeout:
+                    self.__reject(host, 'the circuit is open', 'rejected')
+                circuit.state = HALF_OPEN
+
+            probe = circuit.state == HALF_OPEN
+            if probe and circuit.probes >= self.probes:
+                self.__reject(host, 'the circuit is half open', 'rejected')
+            if self.max_concurrent is not None and \
+                    circuit.active >= self.max_concurrent:
+                self.__reject(host, 'too many requests in flight', 'shed')
+
+            circuit.active += 1
+            if probe:
+                circuit.probes += 1
+            self.__metrics['requests'] += 1
+            return probe
+
+    def __open(self, host, circuit, reset_timeout):
+        circuit.state = OPEN
+        circuit.opened_at = time.time()
+        circuit.reset_timeout = reset_timeout
+        self.__metrics['opened'] += 1
+        logging.warning('Circuit for %s opened for %d seconds', host,
+                        reset_timeout)
+
+    def __release(self, host, probe, failed):
+        with self.__lock:
+            circuit = self.__circuit(host)
+            circuit.active -= 1
+            if failed:
+                self.__metrics['failures'] += 1
+
+            if probe:
+                circuit.probes -= 1
+                if failed:
+                    self.__open(host, circuit, min(self.max_reset_timeout,
+                                                   circuit.reset_timeout * 2))
+                elif circuit.state == HALF_OPEN:
+                    circuit.state = CLOSED
+                    circuit.outcomes.clear()
+                    circuit.reset_timeout = self.reset_timeout
+                    logging.info('Circuit for %s closed', host)
+                return
+
+            if circuit.state != CLOSED:  # sent before the circuit opened
+                return
+
+            outcomes = circuit.outcomes
+            outcomes.append(failed)
+            if len(outcomes) >= self.min_requests and \
+                    sum(outcomes) >= self.failure_rate * len(outcomes):
+                self.__open(host, circuit, self.reset_timeout)
+
+    def call(self, url, send):
+        """
+        Returns the result of ``send``, which makes a request to the ``url``,
+        if the circuit of its host lets it through and records the outcome.
+        Raises :exc:`CircuitOpenException
+        <pyresto.core.CircuitOpenException>` otherwise.
+
+        """
+
+        host = _host(url)
+        probe = self.__acquire(host)
+        started = time.time()
+        try:
+            result = send()
+        except BaseException as error:
+            self.__release(host, probe, _failure(error))
+            raise
+
+        slow = self.slow_call is not None and \
+            time.time() - started > self.slow_call
+        self.__release(host, probe, slow)
+        return result
+
+    def state(self, url):
+        """
+        Returns the state of the circuit of the host of the ``url``, which is
+        one of :data:`CLOSED`, :data:`OPEN` and :data:`HALF_OPEN`.
+
+        """
+
+        with self.__lock:
+            circuit = self.__circuits.get(_host(url))
+            return circuit.state if circuit is not None else CLOSED
+
+    def keep(self, key, response):
+        """
+        Keeps the :data:`raw_response <pyresto.core.raw_response>` of a
+        request for the cache ``key``.
+
+        """
+
+        self.__stale.set(key, response)
+
+    def stale(self, key):
+        """Returns the response kept for the cache ``key`` or ``None``."""
+
+        response = self.__stale.get(key)
+        with self.__lock:
+            self.__metrics['stale_hits' if response is not None
+                           else 'stale_misses'] += 1
+        return response
+
+    def metrics(self):
+        """
+        Returns a dictionary of the number of requests let through, the
+        failures, the requests rejected by the open circuits and shed for
+        the concurrency limit, the number of times the circuits opened, the
+        stale responses served and missing, the number and the size of the
+        responses kept, and the states of the circuits by host.
+
+        """
+
+        with self.__lock:
+            metrics = dict((name, self.__metrics[name])
+                           for name in ('requests', 'failures', 'rejected',
+                                        'shed', 'opened', 'stale_hits',
+                                        'stale_misses'))
+            metrics['circuits'] = dict((host, circuit.state) for host, circuit
+                                       in self.__circuits.iteritems())
+        metrics['stale_kept'] = len(self.__stale)
+        metrics['stale_size'] = self.__stale.size
+        return metrics
@@ -0,0 +1,599 @@
+# coding: utf-8
+
+"""
+pyresto.cache
+~~~~~~~~~~~~~
+
+This module contains the response cache backends which can be plugged into
+:attr:`Model._cache <pyresto.core.Model._cache>` to avoid re-fetching the same
+resources over and over again.
+
+"""
+
+import collections
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+from multiprocessing.pool import ThreadPool
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows, use process-local locks then
+    fcntl = None
+
+
+__all__ = ('CacheEntry', 'CachePolicy', 'StaleWhileRevalidate',
+           'MemoryCache', 'DiskCache')
+
+
+#: The type returned by the :meth:`get` method of the cache backends. The
+#: ``stored_at`` and ``expires_at`` fields are UNIX timestamps and
+#: ``expires_at`` is ``None`` for entries which never expire.
+CacheEntry = collections.namedtuple('CacheEntry',
+                                    'value stored_at expires_at')
+
+
+class CachePolicy(object):
+    """
+    The default, read-through cache policy: a cached value is served as long
+    as the cache backend has it, otherwise it is fetched and stored with the
+    default TTL of the backend.
+
+    """
+
+    def get(self, cache, key, fetch):
+        """
+        Returns the value for the ``key`` from the ``cache`` or calls
+        ``fetch`` to get and store a fresh one.
+
+        :param cache: The cache backend.
+        :type cache: :class:`MemoryCache` or :class:`DiskCache`
+
+        :param key: The cache key.
+        :type key: string
+
+        :param fetch: The function returning a fresh value for the key.
+        :type fetch: function()
+
+        """
+
+        entry = cache.get(key)
+        if entry is not None:
+            return entry.value
+
+        value = fetch()
+        cache.set(key, value)
+        return value
+
+
+class StaleWhileRevalidate(CachePolicy):
+    """
+    A cache policy which serves values older than ``soft_ttl`` immediately
+    and refreshes them on a background worker pool for the next reader. Only
+    values older than ``hard_ttl`` make the callers wait for a fresh fetch.
+    Refreshes are deduplicated per key so a hot key is never fetched more than
+    once at a time.
+
+    """
+
+    def __init__(self, soft_ttl, hard_ttl, workers=4):
+        """
+        :param soft_ttl: The age in seconds after which a value is refreshed
+                         in the background.
+        :type soft_ttl: number
+
+        :param hard_ttl: The age in seconds after which a value is not served
+                         anymore. Passed to the cache backend as the TTL.
+        :type hard_ttl: number
+
+        :param workers: (optional) The number of background refresh threads.
+        :type workers: int
+
+        """
+
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.workers = workers
+
+        self.__pool = None
+        self.__in_flight = set()
+        self.__lock = threading.Lock()
+        self.__metrics = collections.defaultdict(int)
+        self.__lag_total = 0.0
+        self.__lag_max = 0.0
+
+    def get(self, cache, key, fetch):
+        entry = cache.get(key)
+        if entry is None:
+            self.__count('misses')
+            value = fetch()
+            cache.set(key, value, ttl=self.hard_ttl)
+            return value
+
+        if time.time() - entry.stored_at < self.soft_ttl:
+            self.__count('hits')
+        else:
+            self.__count('stale_hits')
+            self.__schedule(cache, key, fetch, entry.stored_at)
+
+        return entry.value
+
+    def __count(self, name):
+        with self.__lock:
+            self.__metrics[name] += 1
+
+    def __schedule(self, cache, key, fetch, stored_at):
+        with self.__lock:
+            if key in self.__in_flight:
+                self.__metrics['deduplicated'] += 1
+                return
+
+            self.__in_flight.add(key)
+            if self.__pool is None:
+                self.__pool = ThreadPool(self.workers)
+
+        self.__pool.apply_async(self.__refresh,
+                                (cache, key, fetch, stored_at))
+
+    def __refresh(self, cache, key, fetch, stored_at):
+        try:
+            cache.set(key, fetch(), ttl=self.hard_ttl)
+        except Exception:
+            logging.exception('Background refresh failed for: %s', key)
+            self.__count('refresh_errors')
+        else:
+            # the lag is how long readers were served a stale value
+            lag = max(time.time() - (stored_at + self.soft_ttl), 0.0)
+            with self.__lock:
+                self.__metrics['refreshes'] += 1
+                self.__lag_total += lag
+                self.__lag_max = max(self.__lag_max, lag)
+        finally:
+            with self.__lock:
+                self.__in_flight.discard(key)
+
+    def metrics(self):
+        """
+        Returns a dict with the hit, stale hit, miss, refresh, deduplicated
+        and refresh error counts along with the average and maximum refresh
+        lag in seconds.
+
+        """
+
+        with self.__lock:
+            metrics = dict.fromkeys(('hits', 'stale_hits', 'misses',
+                                     'refreshes', 'deduplicated',
+                                     'refresh_errors'), 0)
+            metrics.update(self.__metrics)
+            refreshes = metrics['refreshes']
+            metrics['refresh_lag_avg'] = (self.__lag_total / refreshes
+                                          if refreshes else 0.0)
+            metrics['refresh_lag_max'] = self.__lag_max
+            metrics['in_flight'] = len(self.__in_flight)
+
+        return metrics
+
+    def join(self):
+        """Waits until all scheduled background refreshes are finished."""
+
+        with self.__lock:
+            pool, self.__pool = self.__pool, None
+
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+class _LRUDict(object):
+    # A mapping which keeps track of the order its keys were last used in for
+    # the LRU caches, since collections.OrderedDict is missing on Python 2.6.
+    # Every use queues the key with a new tick, the queued ticks which are not
+    # the latest ones of their keys are skipped when evicting and dropped once
+    # they outnumber the keys. Not thread safe, the owners hold their locks.
+
+    def __init__(self):
+        self.__values = dict()
+        self.__ticks = dict()
+        self.__queue = collections.deque()
+        self.__tick = 0
+
+    def __use(self, key):
+        self.__tick += 1
+        self.__ticks[key] = self.__tick
+        self.__queue.append((self.__tick, key))
+        if len(self.__queue) > 2 * len(self.__ticks) + 16:
+            ticks = self.__ticks
+            self.__queue = collections.deque(
+                (tick, key) for tick, key in self.__queue
+                if ticks.get(key) == tick)
+
+    def __setitem__(self, key, value):
+        self.__values[key] = value
+        self.__use(key)
+
+    def get(self, key, default=None):
+        """Returns the value of the ``key``, marking it as recently used."""
+
+        if key not in self.__values:
+            return default
+        self.__use(key)
+        return self.__values[key]
+
+    def peek(self, key, default=None):
+        """Returns the value of the ``key`` without marking it as used."""
+
+        return self.__values.get(key, default)
+
+    def pop(self, key, default=None):
+        self.__ticks.pop(key, None)
+        return self.__values.pop(key, default)
+
+    def popitem(self):
+        """Removes and returns the least recently used key and value."""
+
+        while self.__queue:
+            tick, key = self.__queue.popleft()
+            if self.__ticks.get(key) == tick:
+                del self.__ticks[key]
+                return key, self.__values.pop(key)
+        raise KeyError('popitem(): dictionary is empty')
+
+    def clear(self):
+        self.__values.clear()
+        self.__ticks.clear()
+        self.__queue.clear()
+
+    def __contains__(self, key):
+        return key in self.__values
+
+    def __len__(self):
+        return len(self.__values)
+
+
+class MemoryCache(object):
+    """
+    A simple, thread safe, in-process LRU cache with per entry TTL support. It
+    is mostly useful for tests and for processes which live long enough to
+    benefit from their own cache.
+
+    """
+
+    def __init__(self, ttl=None, max_entries=4096):
+        """
+        :param ttl: (optional) The default time to live for the entries in
+                    seconds. Entries never expire if it is ``None``.
+        :type ttl: number or None
+
+        :param max_entries: (optional) The maximum number of entries to keep.
+                            Least recently used entries are evicted first.
+        :type max_entries: int
+
+        """
+
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.__entries = _LRUDict()
+        self.__lock = threading.RLock()
+
+    def get(self, key):
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is None:
+                return None
+
+            if entry.expires_at is not None and entry.expires_at <= time.time():
+                self.__entries.pop(key)
+                return None
+
+            return entry
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+        entry = CacheEntry(value, now, now + ttl if ttl is not None else None)
+
+        with self.__lock:
+            self.__entries[key] = entry
+            while len(self.__entries) > self.max_entries:
+                self.__entries.popitem()
+
+    def delete(self, key):
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+class _FileLock(object):
+    """
+    An inter-process reader/writer lock based on :func:`fcntl.flock` on a lock
+    file which is never replaced, so compactions of the data file do not break
+    the locking. Falls back to being a no-op where :mod:`fcntl` is missing.
+
+    """
+
+    def __init__(self, path):
+        self.__fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+
+    def acquire(self, exclusive):
+        if fcntl:
+            fcntl.flock(self.__fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+    def release(self):
+        if fcntl:
+            fcntl.flock(self.__fd, fcntl.LOCK_UN)
+
+    def close(self):
+        os.close(self.__fd)
+
+
+class DiskCache(object):
+    """
+    A persistent cache which can be shared between many processes on the same
+    host. Entries are stored in an append-only log file, each record having a
+    header with the key and value lengths, a checksum, the store time and the
+    expiry time. Every process keeps an in-memory index of the log and only
+    scans the records appended since its last look, so a cold process gets
+    a warm cache after a single pass over the file.
+
+    Concurrent access is coordinated with ``flock`` on a separate ``.lock``
+    file: readers hold a shared lock, writers and compaction an exclusive one.
+    When the log grows past ``max_size`` it is compacted by rewriting live
+    entries to a new file which atomically replaces the old one. Expired
+    entries are dropped first, then the least recently used ones until the
+    size falls below ``compact_ratio * max_size``. Recency is tracked per
+    process and falls back to the store time for entries this process never
+    read.
+
+    """
+
+    _header = struct.Struct('>IIIdd')  # key len, value len, crc, stored, expires
+
+    def __init__(self, path, ttl=None, max_size=64 * 1024 * 1024,
+                 compact_ratio=0.75):
+        """
+        :param path: The path of the log file. A ``.lock`` file will be
+                     created next to it.
+        :type path: string
+
+        :param ttl: (optional) The default time to live for the entries in
+                    seconds. Entries never expire if it is ``None``.
+        :type ttl: number or None
+
+        :param max_size: (optional) The size cap for the log file in bytes.
+        :type max_size: int
+
+        :param compact_ratio: (optional) The fraction of ``max_size`` to keep
+                              after a size triggered compaction.
+        :type compact_ratio: float
+
+        """
+
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+        self.compact_ratio = compact_ratio
+
+        self.__lock = threading.RLock()
+        self.__file_lock = _FileLock(path + '.lock')
+        self.__file = None
+        self.__inode = None
+        self.__index = dict()  # key -> (offset, value_len, stored, expires)
+        self.__last_access = dict()
+        self.__indexed_upto = 0
+
+    def __open(self):
+        if self.__file:
+            self.__file.close()
+
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600)
+        self.__file = os.fdopen(fd, 'a+b')
+        self.__inode = os.fstat(fd).st_ino
+        self.__index.clear()
+        self.__indexed_upto = 0
+
+    def __sync(self, truncate=False):
+        """
+        Brings the in-memory index up to date with the log file. Reopens the
+        file when it was replaced by a compaction in another process. Must be
+        called with the file lock held. A partially written record at the end
+        of the log, left by a crashed writer, is truncated away when
+        ``truncate`` is ``True``, which requires the exclusive lock.
+
+        """
+
+        try:
+            replaced = os.stat(self.path).st_ino != self.__inode
+        except OSError:
+            replaced = True
+
+        if not self.__file or replaced:
+            self.__open()
+
+        f = self.__file
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        offset = self.__indexed_upto
+        header = self._header
+
+        while offset + header.size <= size:
+            f.seek(offset)
+            key_len, value_len, crc, stored, expires = header.unpack(
+                f.read(header.size))
+            end = offset + header.size + key_len + value_len
+            if end > size:
+                break
+
+            key = f.read(key_len)
+            if zlib.crc32(key + f.read(value_len)) & 0xffffffff != crc:
+                break
+
+            self.__index[key] = (offset + header.size + key_len, value_len,
+                                 stored, expires if expires >= 0 else None)
+            offset = end
+
+        if offset < size and truncate:
+            f.truncate(offset)
+
+        self.__indexed_upto = offset
+
+    def __append(self, key, value, stored, expires):
+        crc = zlib.crc32(key + value) & 0xffffffff
+        header = self._header.pack(len(key), len(value), crc, stored,
+                                   -1 if expires is None else expires)
+        f = self.__file
+        f.seek(0, os.SEEK_END)
+        offset = f.tell()
+        f.write(header + key + value)
+        f.flush()
+
+        self.__index[key] = (offset + len(header) + len(key), len(value),
+                             stored, expires)
+        self.__indexed_upto = offset + len(header) + len(key) + len(value)
+
+    def get(self, key):
+        key = _to_bytes(key)
+
+        with self.__lock:
+            self.__file_lock.acquire(exclusive=False)
+            try:
+                self.__sync()
+                location = self.__index.get(key)
+                if location is None:
+                    return None
+
+                offset, value_len, stored, expires = location
+                if expires is not None and expires <= time.time():
+                    return None
+
+                self.__file.seek(offset)
+                value = self.__file.read(value_len)
+            finally:
+                self.__file_lock.release()
+
+            self.__last_access[key] = time.time()
+
+        return CacheEntry(value, stored, expires)
+
+    def set(self, key, value, ttl=None):
+        key, value = _to_bytes(key), _to_bytes(value)
+        ttl = self.ttl if ttl is None else ttl
+        now = time.time()
+
+        with self.__lock:
+            self.__file_lock.acquire(exclusive=True)
+            try:
+                self.__sync(truncate=True)
+                self.__append(key, value, now,
+                              now + ttl if ttl is not None else None)
+                if self.__indexed_upto > self.max_size:
+                    self.__compact(self.max_size * self.compact_ratio)
+            finally:
+                self.__file_lock.release()
+
+            self.__last_access[key] = now
+
+    def delete(self, key):
+        # Deletion is an already expired record which is dropped by the next
+        # compaction.
+        key = _to_bytes(key)
+
+        with self.__lock:
+            self.__file_lock.acquire(exclusive=True)
+            try:
+                self.__sync(truncate=True)
+                if key in self.__index:
+                    self.__append(key, b'', time.time(), 0)
+            finally:
+                self.__file_lock.release()
+
+    def compact(self):
+        """Rewrites the log file, dropping expired and overwritten entries."""
+
+        with self.__lock:
+            self.__file_lock.acquire(exclusive=True)
+            try:
+                self.__sync(truncate=True)
+                self.__compact(self.max_size)
+            finally:
+                self.__file_lock.release()
+
+    def clear(self):
+        with self.__lock:
+            self.__file_lock.acquire(exclusive=True)
+            try:
+                self.__sync(truncate=True)
+                self.__compact(0)
+            finally:
+                self.__file_lock.release()
+
+    def __compact(self, target_size):
+        now = time.time()
+        recency = self.__last_access
+        live = [(key, location) for key, location in self.__index.iteritems()
+                if location[3] is None or location[3] > now]
+        live.sort(key=lambda (key, loc): max(loc[2], recency.get(key, 0)),
+                  reverse=True)
+
+        tmp_path = '{0}.{1}.tmp'.format(self.path, os.getpid())
+        kept = list()
+        size = 0
+        # the responses may be private to the user, so is the file replacing
+        # the data file
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as tmp:
+            for key, (offset, value_len, stored, expires) in live:
+                record_size = self._header.size + len(key) + value_len
+                if size + record_size > target_size:
+                    continue
+
+                self.__file.seek(offset)
+                value = self.__file.read(value_len)
+                crc = zlib.crc32(key + value) & 0xffffffff
+                tmp.write(self._header.pack(len(key), value_len, crc, stored,
+                                            -1 if expires is None else expires))
+                tmp.write(key + value)
+                kept.append(key)
+                size += record_size
+            tmp.flush()
+            os.fsync(tmp.fileno())
+
+        os.rename(tmp_path, self.path)
+        self.__open()
+        self.__sync()
+
+        kept = set(kept)
+        for key in recency.keys():
+            if key not in kept:
+                del recency[key]
+
+    def __len__(self):
+        with self.__lock:
+            self.__file_lock.acquire(exclusive=False)
+            try:
+                self.__sync()
+                now = time.time()
+                return sum(1 for location in self.__index.itervalues()
+                           if location[3] is None or location[3] > now)
+            finally:
+                self.__file_lock.release()
+
+    def close(self):
+        with self.__lock:
+            if self.__file:
+                self.__file.close()
+                self.__file = None
+            self.__file_lock.close()
+
+
+def _to_bytes(value):
+    return value.encode('utf-8') if isinstance(value, unicode) else value
@@ -10,37 +10,127 @@ classes.
 """
 
 import collections
+import datetime
+import hashlib
 import json
 import logging
 import re
+import time
 import urlparse
 
 import requests
 
 from abc import ABCMeta, abstractproperty
-from urllib import quote
+from requests.compat import chardet
+from string import Formatter
+from urllib import quote, urlencode
+
+from .cache import CachePolicy, _LRUDict
+from .loader import current_loader
+from .paging import PageSizer
+from .scheduler import BULK, INTERACTIVE, current_priority
+from .transfer import ACCEPT_ENCODING, TransferMetrics, decoder
 
 
 __all__ = ('ServerResponseException',
+           'ResponseTooLargeException',
+           'CircuitOpenException',
            'InvalidRestMethodException',
-           'Relation', 'Model', 'Many', 'Foreign')
+           'Relation', 'Model', 'Many', 'Foreign', 'Cursor', 'Query')
 
 ALLOWED_HTTP_METHODS = frozenset(('GET', 'POST', 'PUT', 'DELETE', 'PATCH'))
 
+_key_property_re = re.compile(r'(\w+)(?:\[(\w+)\])?')
+
+#: The type returned by :meth:`Model._request` holding the unparsed body of a
+#: response along with the continuation URL and the total page count extracted
+#: from it by :meth:`Model._continuator` and :meth:`Model._page_counter`, and
+#: the ``ETag`` and ``Last-Modified`` headers of the response as a dictionary.
+#: The body is ``None`` for a ``304 Not Modified`` response.
+raw_response = collections.namedtuple('raw_response',
+                                      'body continuation_url page_count '
+                                      'validators')
+raw_response.__new__.__defaults__ = (None,)
+
+# The response headers identifying the version of a resource, which are sent
+# back in the conditional requests
+_VALIDATORS = (('etag', 'If-None-Match'),
+               ('last-modified', 'If-Modified-Since'))
+
+#: The type returned by :meth:`Model._fetch_page` holding the parsed data of a
+#: page along with the total page count, the continuation URL and the size of
+#: the unparsed body in bytes.
+fetched_page = collections.namedtuple('fetched_page',
+                                      'data page_count continuation_url size')
+
 
 class ServerResponseException(Exception):
     """Server response error class for pyresto."""
 
+    def __init__(self, message, status_code=None):
+        super(ServerResponseException, self).__init__(message)
+        #: The HTTP status code of the response, if there was a response.
+        self.status_code = status_code
+
+
+class ResponseTooLargeException(ServerResponseException):
+    """The response body exceeded :attr:`Model._max_response_size`."""
+
+
+class CircuitOpenException(ServerResponseException):
+    """
+    The request was not sent since the :attr:`Model._breaker` found its host
+    failing or overloaded.
+
+    """
+
 
 class InvalidRestMethodException(ValueError):
     """A valid HTTP method is required to make a request."""
 
 
+def compile_path(template):
+    """
+    Analyzes a path template such as :attr:`Model._path` or the path of a
+    :class:`Many` relation once, and returns a function which takes a mapping
+    and returns the same result as calling :meth:`str.format` on the template
+    with the mapping as keyword arguments. Templates which only refer to
+    plain names, like ``/repos/{full_name}``, are turned into ``%`` format
+    strings whose bound ``__mod__`` method is returned, so filling them costs
+    no Python level call at all. The others, like
+    ``{self._current_path}/comments``, are formatted as usual since
+    :meth:`str.format` is as fast as it gets for attribute lookups.
+
+    :param template: The path template in :meth:`str.format` notation.
+    :type template: string
+
+    :rtype: ``function(mapping)``
+
+    """
+
+    parts = list()
+    for literal, field, spec, conversion in Formatter().parse(template):
+        parts.append(literal.replace('%', '%%'))
+        if field is None:
+            continue
+
+        name, accessors = field._formatter_field_name_split()
+        if (spec or conversion or not isinstance(name, basestring) or
+                not name or list(accessors)):
+            # not a plain name so not worth optimizing
+            return lambda mapping: template.format(**mapping)
+
+        parts.append('%({0})s'.format(name))
+
+    return template[:0].join(parts).__mod__
+
+
 class ModelBase(ABCMeta):
     """
     Meta class for :class:`Model` class. This class automagically creates the
     necessary :attr:`Model._path` class variable if it is not already
-    defined. The default path pattern is ``/modelname/{id}``.
+    defined. The default path pattern is ``/modelname/{id}``. It also compiles
+    :attr:`Model._path` with :func:`compile_path` whenever it is set.
 
     """
 
@@ -53,12 +143,32 @@ class ModelBase(ABCMeta):
         # don't override if defined
         if not new_class._path:
             new_class._path = u'/{0}/{{id}}'.format(quote(name.lower()))
+        elif '_path' in attrs:
+            new_class._path_template = staticmethod(
+                compile_path(new_class._path))
 
         if not isinstance(new_class._pk, tuple):  # make sure it is a tuple
             new_class._pk = (new_class._pk,)
 
+        for attr, value in attrs.iteritems():
+            mcs.__register(new_class, attr, value)
+
         return new_class
 
+    @staticmethod
+    def __register(cls, name, value):
+        if isinstance(value, Relation) and value._owner is None:
+            value._owner, value._name = cls, name
+
+    def __setattr__(cls, name, value):
+        super(ModelBase, cls).__setattr__(name, value)
+        if name == '_path':  # keep the compiled template in sync
+            super(ModelBase, cls).__setattr__(
+                '_path_template',
+                staticmethod(compile_path(value)) if value else None)
+        else:
+            ModelBase.__register(cls, name, value)
+
 
 class WrappedList(list):
     """
@@ -66,11 +176,47 @@ class WrappedList(list):
     to access an item or a slice in the list. Returns a generator instead, when
     someone tries to iterate over the whole list.
 
+    When the name of the primary key attribute is provided, the list also
+    maintains an index of the primary key values of its items. This makes the
+    ``in`` operator, :meth:`get_by_pk` and :meth:`intersection` work without
+    creating a model instance for every item.
+
     """
 
-    def __init__(self, iterable, wrapper):
+    def __init__(self, iterable, wrapper, pk=None):
         super(self.__class__, self).__init__(iterable)
         self.__wrapper = wrapper
+        self.__pk = pk
+        self.__index = None
+
+    def __key(self, item):
+        if isinstance(item, Model):
+            return item._id
+        elif isinstance(item, dict) and self.__pk:
+            return item.get(self.__pk)
+
+    @property
+    def __pk_index(self):
+        # Returns the pk -> position index, building it if necessary, or
+        # None if some items do not have a pk value.
+        if self.__index is None and self.__pk:
+            index = dict()
+            for position, item in enumerate(
+                    super(self.__class__, self).__iter__()):
+                key = self.__key(item)
+                if key is None:
+                    return None
+                index.setdefault(key, position)
+            self.__index = index
+
+        return self.__index
+
+    def __same_keys(self, key, value):
+        old = super(self.__class__, self).__getitem__(key)
+        if isinstance(key, slice):
+            return (len(old) == len(value) and
+                    map(self.__key, old) == map(self.__key, value))
+        return self.__key(old) == self.__key(value)
 
     def __getitem__(self, key):
         item = super(self.__class__, self).__getitem__(key)
@@ -95,6 +241,15 @@ class WrappedList(list):
             self[i:j] = items  # cache wrapped slice
         return items
 
+    def __setitem__(self, key, value):
+        # Caching wrapped items does not change the keys so keep the index
+        if self.__index is not None and not self.__same_keys(key, value):
+            self.__index = None
+        super(self.__class__, self).__setitem__(key, value)
+
+    def __setslice__(self, i, j, items):
+        self.__setitem__(slice(max(i, 0), max(j, 0)), items)
+
     def __iter__(self):
         # Call the base __iter__ to avoid infinite recursion and then simply
         # return an iterator.
@@ -102,9 +257,114 @@ class WrappedList(list):
         return (self.__wrapper(item) for item in iterator)
 
     def __contains__(self, item):
-        # Not very performant but necessary to use Model instances as operands
-        # for the in operator.
-        return item in iter(self)
+        index = self.__pk_index
+        if index is None or not isinstance(item, Model):
+            # Not very performant but necessary to use Model instances as
+            # operands for the in operator.
+            return item in iter(self)
+
+        position = index.get(item._id)
+        return position is not None and self[position] == item
+
+    def append(self, item):
+        index = self.__index
+        super(self.__class__, self).append(item)
+        if index is not None:
+            key = self.__key(item)
+            if key is None:
+                self.__index = None
+            else:
+                index.setdefault(key, len(self) - 1)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    # The methods below move the items around so they invalidate the index
+
+    def __delitem__(self, key):
+        self.__index = None
+        return super(self.__class__, self).__delitem__(key)
+
+    def __delslice__(self, i, j):
+        self.__index = None
+        return super(self.__class__, self).__delslice__(i, j)
+
+    def insert(self, index, item):
+        self.__index = None
+        return super(self.__class__, self).insert(index, item)
+
+    def pop(self, *args):
+        self.__index = None
+        return super(self.__class__, self).pop(*args)
+
+    def remove(self, item):
+        self.__index = None
+        return super(self.__class__, self).remove(item)
+
+    def reverse(self):
+        self.__index = None
+        return super(self.__class__, self).reverse()
+
+    def sort(self, *args, **kwargs):
+        self.__index = None
+        return super(self.__class__, self).sort(*args, **kwargs)
+
+    def __imul__(self, n):
+        self.__index = None
+        return super(self.__class__, self).__imul__(n)
+
+    def pks(self):
+        """Returns the set of primary key values of the items in the list."""
+
+        index = self.__pk_index
+        if index is None:
+            return set(item._id for item in self)
+        return set(index)
+
+    def get_by_pk(self, pk, default=None):
+        """
+        Returns the item having the given primary key value, or ``default``
+        if there is no such item in the list.
+
+        """
+
+        index = self.__pk_index
+        if index is None:
+            return next((item for item in self if item._id == pk), default)
+
+        position = index.get(pk)
+        return default if position is None else self[position]
+
+    def intersection(self, other):
+        """
+        Returns a new :class:`WrappedList` with the items whose primary keys
+        are also present in ``other``, which can be any collection of models
+        such as another :class:`WrappedList` or a :class:`PagedList`, or a set
+        of primary key values. For instance
+        ``repo.contributors.intersection(repo.watcher_list)``.
+
+        """
+
+        other_pks = _pks_of(other)
+        raw_items = super(self.__class__, self).__iter__()
+        return self.__class__((item for item in raw_items
+                               if self.__key(item) in other_pks),
+                              self.__wrapper, self.__pk)
+
+    __and__ = intersection
+
+
+def _pks_of(collection):
+    if isinstance(collection, (set, frozenset)):
+        return collection
+    elif hasattr(collection, 'pks'):
+        return collection.pks()
+    return set(item._id for item in collection)
 
 
 class LazyList(object):
@@ -114,26 +374,618 @@ class LazyList(object):
     structured generator. No caching and memoization at all since the intended
     usage is for small number of iterations.
 
+    Every iteration is a :class:`Cursor` whose position can be saved and
+    restored with :meth:`LazyList.cursor`, when the list is created by a
+    :class:`Many` relation.
+
+    """
+
+    def __init__(self, wrapper, fetcher, resume=None, identity=None,
+                 query=None):
+        """
+        :param wrapper: The function which creates a model instance from an
+                        item in a page.
+        :type wrapper: function(item)
+
+        :param fetcher: The function which returns the items in the first
+                        page and the fetcher of the next page, or ``None``.
+        :type fetcher: function()
+
+        :param resume: (optional) The function which returns the fetcher for
+                       the ``position`` attribute of a fetcher, for restoring
+                       the cursors.
+        :type resume: function(position)
+
+        :param identity: (optional) The dictionary identifying the relation
+                         the list belongs to, included in the cursor states.
+        :type identity: dict
+
+        :param query: (optional) The function which returns a :class:`Query`
+                      over the collection, for :meth:`LazyList.filter`.
+        :type query: function()
+
+        """
+
+        self.__wrapper = wrapper
+        self.__fetcher = fetcher
+        self.__resume = resume
+        self.__identity = identity
+        self.__query = query
+
+    def filter(self, **filters):
+        """
+        Returns a :class:`Query` over the items of the list matching the
+        ``filters``, when the list is created by a :class:`Many` relation.
+        See :meth:`Query.filter`.
+
+        """
+
+        if self.__query is None:
+            raise ValueError('The list cannot be filtered')
+        return self.__query().filter(**filters)
+
+    def cursor(self, state=None):
+        """
+        Returns a new :class:`Cursor` iterating over the list from the start,
+        or from the position saved with :meth:`Cursor.state` if ``state`` is
+        given.
+
+        """
+
+        if state is None:
+            return Cursor(self.__wrapper, self.__fetcher, self.__identity)
+
+        if self.__resume is None:
+            raise ValueError('The list cannot be resumed')
+
+        position = state['position']
+        fetcher = self.__resume(position) if position else None
+        return Cursor(self.__wrapper, fetcher, self.__identity, state['skip'])
+
+    def __iter__(self):
+        # fetchers are stored in the cursors to prevent interference between
+        # possible multiple iterations going at once
+        return self.cursor()
+
+
+class Cursor(object):
+    """
+    An iterator over a :class:`LazyList` which knows its position, so a long
+    iteration can be saved with :meth:`Cursor.state` and continued later, in
+    another process if needed, from the same item. For instance::
+
+        cursor = repo.commits.cursor()
+        for commit in cursor:
+            process(commit)
+            checkpoint(json.dumps(cursor.state()))
+
+    and after a restart, with :func:`pyresto.distribute.resume`::
+
+        for commit in resume(json.loads(saved)):
+            process(commit)
+
     """
 
-    def __init__(self, wrapper, fetcher):
+    def __init__(self, wrapper, fetcher, identity=None, skip=0):
         self.__wrapper = wrapper
         self.__fetcher = fetcher
+        self.__identity = identity
+        self.__current = None
+        self.__page = ()
+        self.__index = 0
+        self.__skip = skip
+
+    def __iter__(self):
+        return self
+
+    def next(self):
+        while self.__index >= len(self.__page):
+            if not self.__fetcher:
+                raise StopIteration
+
+            self.__current = self.__fetcher
+            data, self.__fetcher = self.__fetcher()
+            self.__page = data or ()
+            self.__index, self.__skip = self.__skip, 0
+
+        item = self.__page[self.__index]
+        self.__index += 1
+        return self.__wrapper(item)
+
+    def state(self):
+        """
+        Returns the position of the cursor as a dictionary of plain values
+        which can be stored as JSON. It has the ``position`` of the page to
+        continue from, which is ``None`` when the iteration is finished, the
+        number of items to ``skip`` in that page, and the fields identifying
+        the relation if the list was created by a :class:`Many` relation.
+
+        """
+
+        if self.__index < len(self.__page):
+            fetcher, skip = self.__current, self.__index
+        else:
+            fetcher, skip = self.__fetcher, self.__skip
+
+        position = getattr(fetcher, 'position', None)
+        if fetcher is not None and position is None:
+            raise ValueError('The position of the cursor is not known')
+
+        state = dict(self.__identity or ())
+        state.update(position=position, skip=skip)
+        return state
+
+
+class PagedList(object):
+    """
+    Paged list implementation for collections which are too large to fetch
+    at once but are still accessed by index, such as the repositories of a
+    user. Only the pages covering the requested indexes or slices are fetched
+    and the length is calculated from the first and the last pages, so
+    ``repos[0]`` or ``len(repos)`` costs at most two requests regardless of
+    the size of the collection. Fetched pages are kept in an LRU cache of
+    ``max_pages`` pages.
+
+    """
+
+    def __init__(self, wrapper, fetcher, max_pages=16, pk=None, query=None):
+        """
+        :param wrapper: The function which creates a model instance from an
+                        item in a page.
+        :type wrapper: function(item)
+
+        :param fetcher: The function which returns the items in the given page
+                        and the total page count, if known, as a tuple.
+        :type fetcher: function(page)
+
+        :param max_pages: (optional) The number of pages to keep in memory.
+        :type max_pages: int
+
+        :param pk: (optional) The name of the primary key attribute of the
+                   items, passed to the :class:`WrappedList` of each page.
+        :type pk: string or None
+
+        :param query: (optional) The function which returns a :class:`Query`
+                      over the collection, for :meth:`PagedList.filter`.
+        :type query: function()
+
+        """
+
+        self.__wrapper = wrapper
+        self.__pk = pk
+        self.__query = query
+        self.__fetcher = fetcher
+        # the first page is kept aside since it defines the page size
+        self.__max_pages = max(max_pages, 2) - 1
+        self.__first = None
+        self.__pages = _LRUDict()
+        self.__page_size = None
+        self.__page_count = None
+        self.__length = None
+
+    def __page(self, number):
+        if number == 1 and self.__first is not None:
+            return self.__first
+
+        pages = self.__pages
+        if number in pages:
+            return pages.get(number)  # marks it as recently used
+
+        data, page_count = self.__fetcher(number)
+        data = WrappedList(data or list(), self.__wrapper, self.__pk)
+        if page_count is not None:
+            self.__page_count = page_count
+
+        if number == 1:
+            self.__page_size = len(data)
+            self.__first = data
+            return data
+
+        pages[number] = data
+        while len(pages) > self.__max_pages:
+            pages.popitem()
+
+        return data
+
+    def __locate(self, index):
+        first = self.__page(1)
+        if not self.__page_size:
+            raise IndexError('list index out of range')
+
+        page, offset = divmod(index, self.__page_size)
+        if page == 0:
+            return first, offset
+
+        if self.__page_count is not None and page + 1 > self.__page_count:
+            raise IndexError('list index out of range')
+
+        return self.__page(page + 1), offset
+
+    def __len__(self):
+        if self.__length is None:
+            first = self.__page(1)
+            number = 1
+            while self.__page_count is None:  # walk until we learn the end
+                number += 1
+                self.__page(number)
+
+            last = self.__page(self.__page_count)
+            if self.__page_count == 1:
+                self.__length = len(first)
+            else:
+                self.__length = ((self.__page_count - 1) * self.__page_size +
+                                 len(last))
+
+        return self.__length
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.start, key.stop, key.step
+            if (stop is None or (start or 0) < 0 or stop < 0 or
+                    (step or 1) < 0):
+                indices = xrange(*key.indices(len(self)))
+            else:
+                indices = xrange(start or 0, stop, step or 1)
+
+            items = list()
+            try:
+                for index in indices:
+                    items.append(self[index])
+            except IndexError:
+                pass
+            return items
+
+        if key < 0:
+            key += len(self)
+            if key < 0:
+                raise IndexError('list index out of range')
+
+        page, offset = self.__locate(key)
+        if offset >= len(page):
+            raise IndexError('list index out of range')
+
+        return page[offset]
+
+    def __getslice__(self, i, j):
+        # We need this implementation for backwards compatibility.
+        return self.__getitem__(slice(max(i, 0), max(j, 0)))
+
+    def __iter__(self):
+        for page in self.__walk_pages():
+            for item in page:
+                yield item
+
+    def __walk_pages(self):
+        number = 1
+        while True:
+            page = self.__page(number)
+            yield page
+
+            if not page or (self.__page_count is not None and
+                            number >= self.__page_count):
+                break
+
+            number += 1
+
+    def __contains__(self, item):
+        return any(item in page for page in self.__walk_pages())
+
+    def pks(self):
+        """
+        Returns the set of primary key values of the items, fetching all the
+        pages.
+
+        """
+
+        pks = set()
+        for page in self.__walk_pages():
+            pks.update(page.pks())
+        return pks
+
+    def get_by_pk(self, pk, default=None):
+        """
+        Returns the item having the given primary key value, or ``default``
+        if there is no such item. Stops fetching pages once the item is found.
+
+        """
+
+        for page in self.__walk_pages():
+            item = page.get_by_pk(pk)
+            if item is not None:
+                return item
+        return default
+
+    def intersection(self, other):
+        """
+        Returns a :class:`WrappedList` with the items whose primary keys are
+        also present in ``other``. See :meth:`WrappedList.intersection`.
+
+        """
+
+        other_pks = _pks_of(other)
+        result = WrappedList(list(), self.__wrapper, self.__pk)
+        for page in self.__walk_pages():
+            result.extend(page.intersection(other_pks))
+        return result
+
+    __and__ = intersection
+
+    def filter(self, **filters):
+        """
+        Returns a :class:`Query` over the items of the list matching the
+        ``filters``, when the list is created by a :class:`Many` relation.
+        See :meth:`Query.filter`.
+
+        """
+
+        if self.__query is None:
+            raise ValueError('The list cannot be filtered')
+        return self.__query().filter(**filters)
+
+
+class Query(object):
+    """
+    A query over the collection of a :class:`Many` relation, created by the
+    ``filter`` method of the lazy and paged relations or by
+    :meth:`Model.query` for any relation. The filters are chainable and the
+    ones the API supports for the path of the relation are sent to the server
+    as query parameters through :meth:`Model._filter_path`, so only the
+    matching items are downloaded::
+
+        commits = repo.commits.filter(since=last_week).filter(author='byk')
+        for commit in commits:
+            print commit.sha
+
+    The other filters are applied on the client side to the data of the
+    items, comparing the field of the same name for equality. A filter value
+    can also be a function, which receives the value of the field and is
+    always applied on the client side. Iterating over a query fetches the
+    pages lazily like a :class:`LazyList`.
+
+    """
+
+    def __init__(self, relation, instance, path, filters=None):
+        """
+        :param relation: The relation of the collection.
+        :type relation: :class:`Many`
+
+        :param instance: The instance owning the collection.
+        :type instance: :class:`Model`
+
+        :param path: The path of the collection.
+        :type path: string
+
+        :param filters: (optional) The filters as field names mapped to the
+                        values to match.
+        :type filters: dict
+
+        """
+
+        self.__relation = relation
+        self.__instance = instance
+        self.__path = path
+        self.__filters = dict(filters or ())
+        self.__metrics = collections.defaultdict(int)
+
+    def filter(self, **filters):
+        """
+        Returns a new query with the ``filters`` added to the ones of this
+        query, replacing the ones on the same fields.
+
+        """
+
+        merged = dict(self.__filters)
+        merged.update(filters)
+        return Query(self.__relation, self.__instance, self.__path, merged)
+
+    def __plan(self):
+        # Returns the path with the pushed filters and the remaining ones
+        model = self.__relation._model
+        pushable = dict((name, value)
+                        for name, value in self.__filters.iteritems()
+                        if not callable(value))
+        path, remaining = model._filter_path(self.__path, pushable)
+        remaining = dict(remaining)
+        remaining.update((name, value)
+                         for name, value in self.__filters.iteritems()
+                         if callable(value))
+        return path, remaining
+
+    def explain(self):
+        """
+        Returns a dictionary of the ``path`` requested for the query with the
+        filters sent to the server, the names of those ``pushed`` filters and
+        the names of the ``client`` side ones.
+
+        """
+
+        path, remaining = self.__plan()
+        return dict(path=path,
+                    pushed=sorted(set(self.__filters) - set(remaining)),
+                    client=sorted(remaining))
+
+    def __keep(self, filters):
+        metrics = self.__metrics
+
+        def keep(item):
+            metrics['fetched'] += 1
+            for name, expected in filters.iteritems():
+                value = item.get(name) if isinstance(item, dict) \
+                    else getattr(item, name, None)
+                if not (expected(value) if callable(expected)
+                        else value == expected):
+                    return False
+            metrics['matched'] += 1
+            return True
+
+        return keep
+
+    def cursor(self, state=None):
+        """
+        Returns a :class:`Cursor` over the matching items, from the start or
+        from the position saved with :meth:`Cursor.state` if ``state`` is
+        given. See :meth:`LazyList.cursor`.
+
+        """
+
+        path, remaining = self.__plan()
+        keep = self.__keep(remaining) if remaining else None
+        return self.__relation._lazy(self.__instance, path,
+                                     keep).cursor(state)
 
     def __iter__(self):
-        fetcher = self.__fetcher
-        while fetcher:
-            # fetcher is stored locally to prevent interference between
-            # possible multiple iterations going at once
-            data, fetcher = fetcher()  # this part never gets hit if the below
-            # loop is not exhausted.
-            for item in data:
-                yield self.__wrapper(item)
+        return self.cursor()
+
+    def metrics(self):
+        """
+        Returns a dictionary of the number of items ``fetched`` and
+        ``matched`` by the client side filters of the query, which are
+        both 0 when all the filters are sent to the server.
+
+        """
+
+        return dict((name, self.__metrics[name])
+                    for name in ('fetched', 'matched'))
+
+
+# The prefix of the keys in the instance dictionaries where the relations
+# keep their values, so the values are tied to the instances themselves and
+# two equal instances fetched separately never share them
+_RELATION_STATE = '_pyresto_relation_'
+
+# Tells the relations not accessed yet apart from the ones which are None
+_MISSING = object()
 
 
 class Relation(object):
     """Base class for all relation types."""
 
+    #: The :class:`Model` class the relation is defined on and its name there,
+    #: set by :class:`ModelBase` so the relation can be referred to from other
+    #: processes.
+    _owner = None
+    _name = None
+
+    @property
+    def _state_key(self):
+        # The key of the value of the relation in the instance dictionaries
+        return '{0}{1:x}'.format(_RELATION_STATE, id(self))
+
+    def _cached(self, instance, default=None):
+        """
+        Returns the value cached for the ``instance`` or ``default`` if it is
+        not accessed yet.
+
+        """
+
+        return instance.__dict__.get(self._state_key, default)
+
+    def _store(self, instance, value):
+        # Caches the value of the relation for the instance
+        instance.__dict__[self._state_key] = value
+        return value
+
+
+def _project(data, model, fields):
+    # Drops the fields other than the requested ones and the primary keys
+    if not isinstance(data, dict):
+        return data
+    keep = set(fields).union(model._pk)
+    return dict((k, v) for k, v in data.iteritems() if k in keep)
+
+
+# The number of bytes logged from the body of a response which is not OK
+_LOGGED_BODY_SIZE = 1024
+
+
+def _response_error(url, response, kwargs):
+    # Logs a response which is not OK, with the start of its body only since
+    # a failing server may send anything, and returns the exception to raise
+    try:
+        stream = decoder(response.headers.get('content-encoding', ''))
+        body = stream.decompress(response.raw.read(_LOGGED_BODY_SIZE))
+    except Exception:  # nothing more to tell about the response then
+        body = ''
+    finally:
+        _discard(response)
+
+    if len(body) >= _LOGGED_BODY_SIZE:
+        body = body[:_LOGGED_BODY_SIZE] + '...'
+    msg = '%s returned HTTP %d: %s\nResponse\nHeaders: %s\nBody: %s'
+    logging.error(msg, url, response.status_code, kwargs,
+                  response.headers, body.decode('utf-8', 'replace'))
+
+    return ServerResponseException('Server response not OK. '
+                                   'Response code: {0:d}'
+                                   .format(response.status_code),
+                                   response.status_code)
+
+
+def _discard(response):
+    # Closes the connection of a streamed response whose body is not read,
+    # so it is not reused with the unread body in it
+    raw = response.raw
+    connection = getattr(raw, '_connection', None)
+    if connection is not None:
+        connection.close()
+    if hasattr(raw, 'release_conn'):
+        raw.release_conn()
+
+
+def _throttle(session):
+    # Spends the request budget of a session which has one, such as the
+    # session of a pyresto.tenant.Tenant, before a slot of the scheduler is
+    # taken, so a request over its budget does not sleep holding the slot
+    throttle = getattr(session, 'throttle', None)
+    if throttle is not None:
+        throttle()
+
+
+def _filtered(fetcher, keep):
+    # Wraps a fetcher of a LazyList to drop the items keep returns false for
+    def filtered():
+        data, new_fetcher = fetcher()
+        data = [item for item in data or () if keep(item)]
+        return data, _filtered(new_fetcher, keep) if new_fetcher else None
+
+    filtered.position = fetcher.position
+    return filtered
+
+
+def _query_value(value):
+    # Formats a filter value as a query parameter: datetimes in ISO 8601 in
+    # UTC, lists comma separated and booleans in lowercase
+    if isinstance(value, datetime.datetime):
+        if value.utcoffset() is not None:
+            value = value.replace(tzinfo=None) - value.utcoffset()
+        return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+    elif isinstance(value, datetime.date):
+        return value.isoformat()
+    elif isinstance(value, bool):
+        return 'true' if value else 'false'
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        return ','.join(_query_value(item) for item in value)
+    elif isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
+
+
+def _merge_query(path, params):
+    """
+    Returns the ``path`` with the ``params`` added to its query string,
+    replacing the existing parameters of the same names. The values are
+    formatted with ``_query_value``, leaving the commas of the lists
+    unquoted.
+
+    """
+
+    base, _, query = path.partition('?')
+    pairs = [(k, v) for k, v in urlparse.parse_qsl(query, True)
+             if k not in params]
+    pairs.extend(sorted((k, _query_value(v)) for k, v in params.iteritems()))
+    return base + '?' + '&'.join('{0}={1}'.format(quote(k), quote(v, ','))
+                                 for k, v in pairs)
+
 
 class Many(Relation):
     """
@@ -144,7 +996,8 @@ class Many(Relation):
 
     """
 
-    def __init__(self, model, path=None, lazy=False, preprocessor=None):
+    def __init__(self, model, path=None, lazy=False, preprocessor=None,
+                 paged=False, page_sizer=None):
         """
         Constructor for Many relation instances.
 
@@ -164,13 +1017,39 @@ class Many(Relation):
                      generator.
         :type lazy: boolean
 
+        :param preprocessor: (optional) The function which extracts the list
+                             of items from the parsed response data.
+        :type preprocessor: function(data)
+
+        :param paged: (optional) A boolean indicator to make the field a
+                      :class:`PagedList` which fetches only the pages that are
+                      accessed. Use ``paged=True`` for large collections
+                      which are accessed by index or whose length is needed.
+                      :meth:`Model.paged` does the same for a single access.
+        :type paged: boolean
+
+        :param page_sizer: (optional) The page sizing policy for a lazy field
+                           whose model supports variable page sizes through
+                           :attr:`Model._page_size_param`. Defaults to a
+                           :class:`pyresto.paging.PageSizer` of its own for
+                           every field.
+        :type page_sizer: :class:`pyresto.paging.PageSizer`
+
         """
 
         self.__model = model
-        self.__path = path or model._path
+        self.__path = compile_path(path or model._path)
         self.__lazy = lazy
+        self.__paged = paged
+        self.page_sizer = page_sizer or PageSizer()
+        self.__pk = model._pk[-1] if model._pk else None
         self.__preprocessor = preprocessor
-        self.__cache = dict()
+
+    @property
+    def _model(self):
+        """The :class:`Model` class of the items of the collection."""
+
+        return self.__model
 
     def _with_owner(self, owner):
         """
@@ -187,7 +1066,7 @@ class Many(Relation):
         def mapper(data):
             if isinstance(data, dict):
                 instance = self.__model(**data)
-                instance._pyresto_owner = owner
+                instance._bind(owner)
                 return instance
             elif isinstance(data, self.__model):
                 return data
@@ -196,13 +1075,39 @@ class Many(Relation):
 
         return mapper
 
-    def __sanitize_data(self, data):
+    def _sanitize_data(self, data):
+        # Extracts the list of items from the parsed data of a response,
+        # either here or in the workers of the Model._parse_pool
         if not data:
             return list()
         elif self.__preprocessor:
             return self.__preprocessor(data)
         return data
 
+    def __request_kwargs(self, instance, priority=None):
+        # With a Model._parse_pool, the data is preprocessed while parsing in
+        # the workers so the relation is passed along to the model
+        kwargs = instance._request_kwargs
+        if self.__model._parse_pool is not None:
+            kwargs['relation'] = self
+        if priority is not None:
+            kwargs['priority'] = current_priority() or priority
+        return kwargs
+
+    def __preprocess(self, data):
+        if self.__model._parse_pool is not None:
+            return data
+        return self._sanitize_data(data)
+
+    def __track(self, instance, data):
+        # Registers the items as siblings with the active pyresto.loader so
+        # their implicit fetches are batched
+        loader = current_loader()
+        if loader is not None and data:
+            loader.add(self.__model, data, self._with_owner(instance),
+                       instance._url_base)
+        return data
+
     def __make_fetcher(self, url, instance):
         """
         A function factory method which creates a simple fetcher function for
@@ -219,19 +1124,202 @@ class Many(Relation):
         """
 
         def fetcher():
-            data, new_url = self.__model._rest_call(url=url,
-                                                    auth=instance._auth,
-                                                    fetch_all=False)
+            data, new_url = self.__model._rest_call(
+                url=instance._absolute_url(url), fetch_all=False,
+                **self.__request_kwargs(instance, BULK))
             # Note the fetch_all=False in the call above, since this method is
             # intended for iterative LazyList calls.
-            data = self.__sanitize_data(data)
+            data = self.__track(instance, self.__preprocess(data))
 
             new_fetcher = self.__make_fetcher(new_url,
                                               instance) if new_url else None
             return data, new_fetcher
 
+        fetcher.position = dict(url=url)
+        return fetcher
+
+    def __make_sized_fetcher(self, url, instance, offset=0, previous=None):
+        """
+        A function factory method which creates a fetcher function for the
+        :class:`LazyList` instances of the models supporting variable page
+        sizes, asking the :attr:`Many.page_sizer` for the size of every page
+        and reporting the results back to it.
+
+        :param url: The url which the fetcher function will be bound to.
+        :type url: unicode
+
+        :param offset: The number of items fetched before the page.
+        :type offset: int
+
+        :param previous: The size of the previous page or ``None``.
+        :type previous: int or None
+
+        """
+
+        def fetcher():
+            model = self.__model
+            sizer = self.page_sizer
+            size = sizer.size_for(offset, previous, model._max_page_size)
+
+            start = time.time()
+            page = model._fetch_page(instance._absolute_url(url),
+                                     offset // size + 1, per_page=size,
+                                     **self.__request_kwargs(instance, BULK))
+            data = self.__track(instance, self.__preprocess(page.data))
+            sizer.observe(size, len(data), time.time() - start, page.size)
+
+            new_fetcher = None
+            if page.continuation_url and len(data) >= size:
+                new_fetcher = self.__make_sized_fetcher(url, instance,
+                                                        offset + len(data),
+                                                        size)
+            return data, new_fetcher
+
+        fetcher.position = dict(url=url, offset=offset, previous=previous)
         return fetcher
 
+    def __resume(self, instance, position):
+        # Returns the fetcher for the position of a fetcher of the relation
+        url = position['url']
+        if self.__model._page_size_param:
+            return self.__make_sized_fetcher(url, instance,
+                                             position.get('offset', 0),
+                                             position.get('previous'))
+        return self.__make_fetcher(url, instance)
+
+    def __identity(self, instance):
+        # The fields of the cursor states identifying the relation and the
+        # instance, which pyresto.distribute.resume uses to restore them
+        cls = instance.__class__
+        identity = dict(owner='{0}.{1}'.format(cls.__module__, cls.__name__),
+                        pk=list(instance._pk_vals), relation=self._name)
+        if '_url_base' in instance.__dict__:
+            identity['url_base'] = instance._url_base
+        return identity
+
+    def __make_page_fetcher(self, url, instance):
+        """
+        A function factory method which creates a page fetcher function for
+        the :class:`PagedList` instances, calling :meth:`Model._fetch_page`
+        for the requested page.
+
+        :param url: The url which the fetcher function will be bound to.
+        :type url: unicode
+
+        """
+
+        def fetcher(page):
+            response = self.__model._fetch_page(
+                instance._absolute_url(url), page,
+                **self.__request_kwargs(instance, BULK))
+            data = self.__track(instance, self.__preprocess(response.data))
+            return data, response.page_count
+
+        return fetcher
+
+    def fetch(self, instance, fields=None):
+        """
+        Fetches the collection for the ``instance`` without caching it, like
+        accessing the field of a non-lazy relation. If ``fields`` are given,
+        only those fields and the primary keys of the items are requested,
+        through :meth:`Model._project_path` if the model supports it for the
+        path of the relation, and the others are dropped before creating the
+        models otherwise. See :meth:`Model.related`.
+
+        :param fields: (optional) The names of the fields to load.
+        :type fields: list of strings or None
+
+        :rtype: :class:`WrappedList`
+
+        """
+
+        model = self.__model
+        path = self.__path(instance._footprint)
+        projected = model._project_path(path, fields) if fields else None
+
+        data, next_url = model._rest_call(url=instance._absolute_url(
+            projected or path), **self.__request_kwargs(instance))
+        data = self.__preprocess(data)
+        if fields and not projected:
+            data = [_project(item, model, fields) for item in data]
+
+        self.__track(instance, data)
+        return WrappedList(data, self._with_owner(instance), self.__pk)
+
+    def _lazy(self, instance, path, keep=None):
+        """
+        Returns a :class:`LazyList` over the collection at ``path`` for the
+        ``instance``, with only the items ``keep`` returns true for if given.
+
+        """
+
+        def resume(position):
+            fetcher = self.__resume(instance, position)
+            return _filtered(fetcher, keep) if keep else fetcher
+
+        return LazyList(self._with_owner(instance), resume(dict(url=path)),
+                        resume, self.__identity(instance),
+                        lambda: self.query(instance))
+
+    def paged(self, instance, max_pages=16):
+        """
+        Returns a :class:`PagedList` over the collection for the
+        ``instance``, whether the relation is paged or not. See
+        :meth:`Model.paged`.
+
+        """
+
+        return PagedList(self._with_owner(instance), self.__make_page_fetcher(
+            self.__path(instance._footprint), instance), max_pages,
+            pk=self.__pk, query=lambda: self.query(instance))
+
+    def query(self, instance):
+        """
+        Returns a :class:`Query` over the collection for the ``instance``,
+        without any filters yet. See :meth:`Model.query`.
+
+        """
+
+        return Query(self, instance, self.__path(instance._footprint))
+
+    def _url(self, instance):
+        """Returns the URL of the collection for the ``instance``."""
+
+        return instance._absolute_url(self.__path(instance._footprint))
+
+    def _restore(self, instance, items):
+        """
+        Caches a :class:`WrappedList` of the ``items``, which can be models or
+        their data, as the collection of the ``instance``.
+
+        """
+
+        self._store(instance, WrappedList(items, self._with_owner(instance),
+                                          self.__pk))
+
+    def _sync(self, owner, item, action):
+        """
+        Updates the cached collection of the ``owner``, if there is one, after
+        ``item`` is written with :meth:`Model.save` or :meth:`Model.delete`.
+        The ``action`` is one of ``'create'``, ``'update'`` or ``'delete'``.
+
+        """
+
+        items = self._cached(owner)
+        if not isinstance(items, WrappedList) or \
+                not isinstance(item, self.__model):
+            return
+
+        existing = items.get_by_pk(item._id)
+        if action == 'delete':
+            if existing is not None:
+                items.remove(existing)
+        elif existing is None:
+            if action == 'create':
+                items.append(item)
+        elif existing is not item:
+            existing._load(item._fields)
+
     def __get__(self, instance, owner):
         # This method is called whenever a field defined as Many is tried to
         # be accessed. There is also another usage which lacks an object
@@ -239,21 +1327,16 @@ class Many(Relation):
         if not instance:
             return self.__model
 
-        cache = self.__cache
-        if instance not in cache:
-            model = self.__model
-
-            path = self.__path.format(**instance._footprint)
+        cached = self._cached(instance, _MISSING)
+        if cached is not _MISSING:
+            return cached
 
-            if self.__lazy:
-                cache[instance] = LazyList(self._with_owner(instance),
-                                           self.__make_fetcher(path, instance))
-            else:
-                data, next_url = model._rest_call(url=path,
-                                                  auth=instance._auth)
-                cache[instance] = WrappedList(self.__sanitize_data(data),
-                                              self._with_owner(instance))
-        return cache[instance]
+        if self.__lazy:
+            return self._store(instance, self._lazy(
+                instance, self.__path(instance._footprint)))
+        elif self.__paged:
+            return self._store(instance, self.paged(instance))
+        return self._store(instance, self.fetch(instance))
 
 
 class Foreign(Relation):
@@ -287,7 +1370,6 @@ class Foreign(Relation):
         """
 
         self.__model = model
-        self.__cache = dict()
         self.__embedded = embedded and not key_extractor
 
         self.__key_property = key_property or '__' + model.__name__.lower()
@@ -295,40 +1377,58 @@ class Foreign(Relation):
         if key_extractor:
             self.__key_extractor = key_extractor
         elif not embedded:
+            # the key property never changes so parse it only once
+            item_name, key = _key_property_re.match(
+                self.__key_property).groups()
+            parent_pk = self.__model._pk[:-1]
+
             def extract(instance):
                 footprint = instance._footprint
                 ids = list()
 
-                for k in self.__model._pk[:-1]:
+                for k in parent_pk:
                     ids.append(footprint[k] if k in footprint
                                else getattr(instance, k))
 
-                item, key = re.match(r'(\w+)(?:\[(\w+)\])?',
-                                     key_property).groups()
-                item = getattr(instance, item)
+                item = getattr(instance, item_name)
                 ids.append(item[key] if key else item)
 
                 return tuple(ids)
 
             self.__key_extractor = extract
 
+    def _restore(self, instance, related):
+        """Caches ``related`` as the related model of the ``instance``."""
+
+        self._store(instance, related)
+
     def __get__(self, instance, owner):
         # Please see Many.__get__ for more info on this method.
         if not instance:
             return self.__model
 
-        if instance not in self.__cache:
+        related = self._cached(instance, _MISSING)
+        if related is _MISSING:
             if self.__embedded:
                 properties = getattr(instance, self.__key_property)
-                self.__cache[instance] = self.__model(**properties) if properties else None
-                self.__cache[instance]._auth = instance._auth
+                interner = self.__model._interner
+                if not properties:
+                    related = None
+                elif interner is not None:  # bound by the interner
+                    related = interner.model(self.__model, properties,
+                                             instance)
+                else:
+                    related = self.__model(**properties)
+                    related._bind(instance)
             else:
-                self.__cache[instance] = self.__model.get(
-                    *self.__key_extractor(instance), auth=instance._auth)
+                related = self.__model.get(*self.__key_extractor(instance),
+                                           **instance._bindings)
+                if related is not None:
+                    related._bind(instance)
 
-            self.__cache[instance]._pyresto_owner = instance
+            self._store(instance, related)
 
-        return self.__cache[instance]
+        return related
 
 
 class Model(object):
@@ -345,6 +1445,10 @@ class Model(object):
 
     __pk_vals = None
 
+    __current_path = None
+
+    __hashed_by_id = False
+
     #: The class variable that holds the bae uel for the API endpoint for the
     #: :class:`Model`. This should be a "full" URL including the scheme, port
     #: and the initial path if there is any.
@@ -358,11 +1462,93 @@ class Model(object):
     #: be available to this string for formatting.
     _path = None
 
+    #: The class variable that holds :attr:`Model._path` compiled with
+    #: :func:`compile_path`. It is maintained by :class:`ModelBase`, so it
+    #: should not be set directly.
+    _path_template = None
+
     #: The class variable that holds the default authentication object to be
     #: passed to :mod:`requests`. Can be overridden on either class or instance
     #: level for convenience.
     _auth = None
 
+    #: The class variable that holds the :class:`requests.Session` to send
+    #: the requests through, to share a connection pool. Like
+    #: :attr:`Model._url_base` and :attr:`Model._auth`, it can be overridden
+    #: on instance level, in which case it is passed on to the instances
+    #: fetched through the relations of the instance.
+    _session = None
+
+    #: The names of the attributes which are bound on instance level by
+    #: :meth:`Model.get` and passed on from owners to the instances fetched
+    #: through their relations by :meth:`Model._bind`.
+    _bindable = ('_url_base', '_auth', '_session', '_cache')
+
+    #: The class variable that holds the response cache to be used for
+    #: ``GET`` requests, such as a :class:`pyresto.cache.DiskCache` instance
+    #: shared by all processes on a host. Caching is disabled when ``None``.
+    #: It can be overridden on instance level, like :attr:`Model._session`,
+    #: to keep the responses of a :class:`pyresto.tenant.Tenant` apart.
+    _cache = None
+
+    #: The class variable that holds the policy deciding when a cached
+    #: response is served and when it is refreshed. Use
+    #: :class:`pyresto.cache.StaleWhileRevalidate` to serve stale responses
+    #: while refreshing them in the background.
+    _cache_policy = CachePolicy()
+
+    #: The class variable that holds the value of the ``Accept-Encoding``
+    #: header sent with the requests. Defaults to the encodings which
+    #: :meth:`Model._read_body` can decode while streaming the response:
+    #: ``gzip``, ``deflate`` and ``br`` if :mod:`brotli` is installed. Set it
+    #: to ``'identity'`` to disable compression.
+    _accept_encoding = ACCEPT_ENCODING
+
+    #: The class variable that holds the largest allowed size of a decoded
+    #: response body in bytes, or ``None`` for no limit. Larger responses
+    #: are aborted while they are being read, raising
+    #: :exc:`ResponseTooLargeException`.
+    _max_response_size = 64 * 1024 * 1024
+
+    #: The number of bytes read from the connection at a time.
+    _chunk_size = 64 * 1024
+
+    #: The :class:`pyresto.transfer.TransferMetrics` instance where the wire
+    #: and decoded sizes of the responses are recorded. It is shared by all
+    #: the models unless overridden.
+    _transfer_metrics = TransferMetrics()
+
+    #: The class variable that holds the :class:`pyresto.parallel.ParsePool`
+    #: used to parse the response bodies and preprocess them for the
+    #: :class:`Many` relations in worker processes, or ``None`` to parse them
+    #: in the calling thread.
+    _parse_pool = None
+
+    #: The class variable that holds the :class:`pyresto.scheduler.Scheduler`
+    #: which admits the requests by their priority and limits the concurrent
+    #: requests per host, or ``None`` to send them right away. The requests
+    #: through a session with a ``throttle`` method, such as the session of a
+    #: :class:`pyresto.tenant.Tenant`, call it before waiting for a slot.
+    _scheduler = None
+
+    #: The class variable that holds the :class:`pyresto.hedge.Hedger` which
+    #: sends a duplicate of the ``GET`` requests slower than usual for their
+    #: endpoint, or ``None`` to never send duplicates.
+    _hedger = None
+
+    #: The class variable that holds the
+    #: :class:`pyresto.breaker.CircuitBreaker` which fails the requests to the
+    #: failing hosts fast, serving the last responses it kept for them when
+    #: it can, or ``None`` to always send the requests.
+    _breaker = None
+
+    #: The class variable that holds the :class:`pyresto.interning.Interner`
+    #: which stores a single copy of the equal embedded sub-objects, such as
+    #: the author of every commit, and a single read-only :class:`Model`
+    #: instance for them, or ``None`` to keep a copy for every resource,
+    #: which is the default.
+    _interner = None
+
     @classmethod
     def _continuator(cls, response):
         """
@@ -387,6 +1573,68 @@ class Model(object):
 
         return link
 
+    @classmethod
+    def _page_counter(cls, response):
+        """
+        The class method which receives the response from the server and is
+        expected to return the total number of pages for a paginated resource,
+        or ``None`` if it cannot be determined. The default implementation
+        reads the ``page`` parameter of the URL provided under the label
+        "last" in the standard HTTP link header.
+
+        :param response: The response for the HTTP request made to fetch the
+                         resources.
+        :type response: :class:`requests.Response`
+
+        """
+
+        link = response.links.get('last', None)
+        if link and isinstance(link, dict):
+            link = link.get('url')
+
+        if not link:
+            return None
+
+        query = urlparse.parse_qs(urlparse.urlsplit(link).query)
+        try:
+            return int(query['page'][0])
+        except (KeyError, ValueError):
+            return None
+
+    #: The class variable that holds the name of the query parameter which
+    #: sets the number of items per page for the paginated resources, or
+    #: ``None`` if the API does not support variable page sizes. The lazy
+    #: :class:`Many` relations of the models supporting it pick their page
+    #: sizes through a :class:`pyresto.paging.PageSizer`.
+    _page_size_param = None
+
+    #: The class variable that holds the largest number of items per page
+    #: allowed by the API when :attr:`Model._page_size_param` is set.
+    _max_page_size = 100
+
+    @classmethod
+    def _page_url(cls, url, page, per_page=None):
+        """
+        The class method which returns the URL for the given page number of a
+        paginated resource located at ``url``. The default implementation sets
+        the ``page`` query parameter which is what the :class:`PagedList`
+        expects the :meth:`Model._page_counter` to read back, and the
+        :attr:`Model._page_size_param` query parameter if ``per_page`` is
+        given.
+
+        """
+
+        replaced = ('page', cls._page_size_param if per_page else None)
+        scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+        params = [(k, v) for k, v in urlparse.parse_qsl(query, True)
+                  if k not in replaced]
+        params.append(('page', str(page)))
+        if per_page:
+            params.append((cls._page_size_param, str(per_page)))
+
+        return urlparse.urlunsplit((scheme, netloc, path, urlencode(params),
+                                    fragment))
+
     #: The class method which receives the class object and the body text of
     #: the server response to be parsed. It is expected to return a
     #: dictionary object having the properties of the related model. Defaults
@@ -394,6 +1642,15 @@ class Model(object):
     #: to override it if the response type is valid JSON.
     _parser = staticmethod(json.loads)
 
+    #: The counterpart of :attr:`Model._parser` which receives the fields to
+    #: send with :meth:`Model.save` and returns the request body. Defaults to
+    #: a "staticazed" version of :func:`json.dumps`.
+    _serializer = staticmethod(json.dumps)
+
+    #: The class variable that holds the HTTP method :meth:`Model.save` uses
+    #: to send the changed fields of an existing resource.
+    _update_method = 'PATCH'
+
     @abstractproperty
     def _pk(self):
         """
@@ -418,6 +1675,16 @@ class Model(object):
     #: current :class:`Model` instance while fetching its related resources.
     _get_params = dict()
 
+    #: The instance variable which holds the :class:`Model` instance that
+    #: the instance is fetched through a :class:`Relation` of, if there is
+    #: any. It is used to inherit the parent primary key values.
+    _pyresto_owner = None
+
+    #: The instance variable which holds the names of the fields assigned
+    #: since the instance was created or last saved. Only these fields are
+    #: sent when an existing resource is saved with :meth:`Model.save`.
+    _dirty = frozenset()
+
     def __init__(self, **kwargs):
         """
         Constructor for model instances. All named parameters passed to this
@@ -438,6 +1705,15 @@ class Model(object):
 
         self.__update_data(kwargs)
 
+    def __setattr__(self, name, value):
+        if name[0] != '_' and self.__dict__.get('_pyresto_shared'):
+            raise AttributeError(
+                'Cannot set {0!r} on a {1} shared by the interner'.format(
+                    name, self.__class__.__name__))
+        if name[0] != '_' and (name not in self.__dict__ or
+                               self.__dict__[name] != value):
+            self.__dict__['_dirty'] = self._dirty | frozenset((name,))
+        super(Model, self).__setattr__(name, value)
 
     @property
     def _id(self):
@@ -450,7 +1726,7 @@ class Model(object):
     @property
     def _pk_vals(self):
         if not self.__pk_vals:
-            if hasattr(self, '_pyresto_owner'):
+            if self._pyresto_owner is not None:
                 self.__pk_vals = self.\
                     _pyresto_owner._pk_vals[:len(self._pk) - 1] + (self._id,)
             else:
@@ -462,6 +1738,8 @@ class Model(object):
     def _pk_vals(self, value):
         if len(value) == len(self._pk):
             self.__pk_vals = tuple(value)
+            self.__footprint = None  # computed from the old values
+            self.__current_path = None
         else:
             raise ValueError
 
@@ -475,12 +1753,74 @@ class Model(object):
 
     @property
     def _current_path(self):
-        return self._path.format(**self._footprint)
+        if self.__current_path is None:
+            self.__current_path = self._path_template(self._footprint)
+
+        return self.__current_path
 
     @classmethod
     def _get_sanitized_url(cls, url):
         return urlparse.urljoin(cls._url_base, url)
 
+    @property
+    def _bindings(self):
+        """
+        A property that returns the :attr:`Model._bindable` attributes bound
+        on the instance as keyword arguments for :meth:`Model.get`. The
+        authentication is always included.
+
+        """
+
+        bindings = dict((name[1:], self.__dict__[name])
+                        for name in self._bindable if name in self.__dict__)
+        bindings['auth'] = self._auth
+        return bindings
+
+    @property
+    def _request_kwargs(self):
+        """
+        A property that returns the keyword arguments to pass to
+        :meth:`Model._rest_call` for the requests made on behalf of the
+        instance.
+
+        """
+
+        kwargs = dict(auth=self._auth)
+        if self._session is not None:
+            kwargs['session'] = self._session
+        if '_cache' in self.__dict__:
+            kwargs['cache'] = self._cache
+        return kwargs
+
+    def _absolute_url(self, path):
+        """
+        Returns the full URL for the ``path`` if the instance has its own
+        :attr:`Model._url_base`, and the ``path`` as it is otherwise, leaving
+        it to :meth:`Model._get_sanitized_url` of the class.
+
+        """
+
+        if '_url_base' in self.__dict__:
+            return urlparse.urljoin(self._url_base, path)
+        return path
+
+    def _bind(self, owner):
+        """
+        Sets the owner of the instance and copies the :attr:`Model._bindable`
+        attributes bound on the owner, so the instances fetched through the
+        relations of a model talk to the same server with the same
+        credentials and session as their owner.
+
+        :param owner: The owner Model for the instance.
+        :type owner: Model
+
+        """
+
+        self._pyresto_owner = owner
+        for name in self._bindable:
+            if name in owner.__dict__:
+                self.__dict__[name] = owner.__dict__[name]
+
     @classmethod
     def _rest_call(cls, url, method='GET', fetch_all=True, **kwargs):
         """
@@ -497,6 +1837,10 @@ class Model(object):
                           continuation URL.
         :type fetch_all: boolean
 
+        :param relation: (optional) The :class:`Many` relation to preprocess
+                         the parsed data for. See :meth:`Model._parse_body`.
+        :type relation: :class:`Many`
+
         :returns: Returns a tuple where the first part is the parsed data from
                   the server using :attr:`Model._parser`, and the second half
                   is the continuation URL extracted using
@@ -508,67 +1852,701 @@ class Model(object):
         url = cls._get_sanitized_url(url)
 
         if cls._auth is not None and 'auth' not in kwargs:
-            kwargs['auth'] = cls.auth
+            kwargs['auth'] = cls._auth
 
-        if method in ALLOWED_HTTP_METHODS:
-            response = requests.request(method.lower(), url, verify=True,
-                                        **kwargs)
-        else:
+        if cls._session is not None and 'session' not in kwargs:
+            kwargs['session'] = cls._session
+
+        if method not in ALLOWED_HTTP_METHODS:
             raise InvalidRestMethodException(
                 'Invalid method "{0:s}" is used for the HTTP request. Can only'
                 'use the following: {1!s}'.format(method, ALLOWED_HTTP_METHODS)
             )
 
         result = collections.namedtuple('result', 'data continuation_url')
-        if 200 <= response.status_code < 300:
-            continuation_url = cls._continuator(response)
-            response_data = response.text
-            data = cls._parser(response_data) if response_data else None
-            if continuation_url:
-                logging.debug('Found more at: %s', continuation_url)
-                if fetch_all:
-                    kwargs['url'] = continuation_url
-                    data += cls._rest_call(**kwargs).data
-                else:
-                    return result(data, continuation_url)
-            return result(data, None)
+        relation = kwargs.pop('relation', None)
+        response = cls._cached_request(method, url, **kwargs)
+        continuation_url = response.continuation_url
+        data = cls._parse_body(response.body, relation)
+        if continuation_url:
+            logging.debug('Found more at: %s', continuation_url)
+            if fetch_all:
+                kwargs['url'] = continuation_url
+                data += cls._rest_call(relation=relation, **kwargs).data
+            else:
+                return result(data, continuation_url)
+        return result(data, None)
+
+    @classmethod
+    def _fetch_page(cls, url, page, per_page=None, relation=None, **kwargs):
+        """
+        Fetches a single page of a paginated resource, using
+        :meth:`Model._page_url` to build its URL.
+
+        :param per_page: (optional) The number of items to request for the
+                         page if the model supports variable page sizes.
+        :type per_page: int or None
+
+        :param relation: (optional) The :class:`Many` relation to preprocess
+                         the parsed data for. See :meth:`Model._parse_body`.
+        :type relation: :class:`Many`
+
+        :returns: Returns a :data:`fetched_page` of the parsed data, the total
+                  page count which is ``None`` if it is not known yet, the
+                  continuation URL and the size of the response body.
+        :rtype: tuple
+
+        """
+
+        url = cls._get_sanitized_url(cls._page_url(url, page, per_page))
+
+        if cls._auth is not None and 'auth' not in kwargs:
+            kwargs['auth'] = cls._auth
+
+        if cls._session is not None and 'session' not in kwargs:
+            kwargs['session'] = cls._session
+
+        response = cls._cached_request('GET', url, **kwargs)
+        data = cls._parse_body(response.body, relation)
+        page_count = response.page_count
+        if page_count is None and not response.continuation_url:
+            page_count = page  # no "next" and no "last" so this is the last
+
+        return fetched_page(data, page_count, response.continuation_url,
+                            len(response.body or ''))
+
+    @classmethod
+    def _parse_body(cls, body, relation=None):
+        """
+        Parses a response body with :attr:`Model._parser` and extracts the
+        items for the :class:`Many` ``relation`` with its ``preprocessor`` if
+        given. Both are done in a worker process if :attr:`Model._parse_pool`
+        is set.
+
+        """
+
+        pool = cls._parse_pool
+        if body and pool is not None:
+            return pool.parse(cls, body, relation)
+
+        data = cls._parser(body) if body else None
+        return relation._sanitize_data(data) if relation else data
+
+    @classmethod
+    def _cache_key(cls, method, url, **kwargs):
+        """
+        The class method which generates the :attr:`Model._cache` key for a
+        request. The key is made of the HTTP method, the full URL with the
+        query parameters and a digest of the authentication credentials so
+        different users never see each other's responses.
+
+        The credentials are identified by the ``fingerprint`` method of the
+        auth object, see :meth:`Auth.fingerprint
+        <pyresto.auth.Auth.fingerprint>`. Returns ``None``, so the request is
+        not cached, for the auth objects which cannot be identified this way.
+
+        """
+
+        params = kwargs.get('params') or dict()
+        auth = kwargs.get('auth')
+        if auth is None:
+            identity = ''
+        elif isinstance(auth, tuple):
+            identity = repr(auth)
         else:
-            msg = '%s returned HTTP %d: %s\nResponse\nHeaders: %s\nBody: %s'
-            logging.error(msg, url, response.status_code, kwargs,
-                          response.headers, response.text)
+            fingerprint = getattr(auth, 'fingerprint', None)
+            identity = fingerprint() if callable(fingerprint) else None
+            if identity is None:
+                return None
+            identity = u'{0}:{1}'.format(auth.__class__.__name__, identity)
+
+        key = u'{0} {1} {2!r}'.format(method, url, sorted(params.items()))
+        if isinstance(identity, unicode):
+            identity = identity.encode('utf-8')
+
+        return key + u' ' + hashlib.sha1(identity).hexdigest()
+
+    @classmethod
+    def _cached_request(cls, method, url, **kwargs):
+        """
+        Serves ``GET`` requests from :attr:`Model._cache`, or the ``cache``
+        keyword argument if given, according to the
+        :attr:`Model._cache_policy`. Other methods always go to the server
+        through :meth:`Model._request`.
+
+        With a :attr:`Model._breaker`, the ``GET`` responses are also kept
+        by the breaker and served stale when it does not let the request
+        through.
+
+        """
+
+        cache = kwargs.pop('cache', cls._cache)
+        breaker = cls._breaker
+        if method != 'GET' or cache is None and breaker is None:
+            return cls._request(method, url, **kwargs)
+
+        def fetch():
+            response = cls._request(method, url, **kwargs)
+            if breaker is not None and response.body is not None:
+                breaker.keep(key, response)
+            return response
+
+        def fetch_encoded():
+            response = fetch()
+            return json.dumps(dict(body=response.body,
+                                   next=response.continuation_url,
+                                   pages=response.page_count,
+                                   validators=response.validators))
+
+        key = cls._cache_key(method, url, **kwargs)
+        if key is None:  # cannot be kept apart from other users' responses
+            return cls._request(method, url, **kwargs)
+
+        try:
+            if cache is None:
+                return fetch()
+            value = cls._cache_policy.get(cache, key, fetch_encoded)
+        except CircuitOpenException:
+            response = breaker.stale(key)
+            if response is None:
+                raise
+            return response
+
+        cached = json.loads(value)
+        return raw_response(cached['body'], cached['next'],
+                            cached.get('pages'), cached.get('validators'))
+
+    @classmethod
+    def _request(cls, method, url, **kwargs):
+        """
+        Makes a single HTTP request and returns a :data:`raw_response` with
+        the response body, the continuation URL extracted by
+        :meth:`Model._continuator` and the page count extracted by
+        :meth:`Model._page_counter`. Raises :exc:`ServerResponseException` if
+        the response is not OK. The request waits for a slot from the
+        :attr:`Model._scheduler` with its ``priority``, if there is one.
+
+        Conditional requests, sent with the ``If-None-Match`` or the
+        ``If-Modified-Since`` headers built from the ``validators`` of an
+        earlier response, return a :data:`raw_response` without a body if
+        the resource is not modified.
+
+        ``GET`` requests are hedged by the :attr:`Model._hedger` if there is
+        one, so the request may be sent twice. With a :attr:`Model._breaker`,
+        :exc:`CircuitOpenException` is raised without sending the request if
+        the breaker does not let it through.
+
+        """
+
+        hedger = cls._hedger
+        if hedger is not None and method.upper() == 'GET':
+            send = lambda: hedger.request(url, lambda cancelled: cls._send(
+                method, url, cancelled, **kwargs))
+        else:
+            send = lambda: cls._send(method, url, **kwargs)
+
+        breaker = cls._breaker
+        return breaker.call(url, send) if breaker is not None else send()
+
+    @classmethod
+    def _request_headers(cls, method):
+        """
+        The class method which returns a new dictionary of the HTTP headers
+        sent with every request of the model, such as the media types the
+        API expects. The headers given to a request override them. Every
+        request made by :meth:`Model._request` and :meth:`Model._stream`
+        sends them, including the ones made by the watchers and the page
+        queues. Returns no headers by default.
+
+        """
+
+        return dict()
+
+    @classmethod
+    def _send(cls, method, url, cancelled=None, **kwargs):
+        """
+        Sends a request for :meth:`Model._request`. If the ``cancelled``
+        event is set by the time the response headers arrive, the response is
+        dropped without reading its body and ``None`` is returned.
+
+        """
+
+        priority = kwargs.pop('priority', None)
+        _throttle(kwargs.get('session'))
+        scheduler = cls._scheduler
+        if scheduler is not None:
+            scheduler.acquire(url, priority)
+
+        try:
+            headers = cls._request_headers(method)
+            headers.update(kwargs.pop('headers', None) or ())
+            headers.setdefault('Accept-Encoding', cls._accept_encoding)
+            response = requests.request(method.lower(), url, verify=True,
+                                        headers=headers, prefetch=False,
+                                        **kwargs)
+            if cancelled is not None and cancelled.is_set():
+                _discard(response)
+                return None
+
+            validators = dict((name, response.headers[name])
+                              for name, _ in _VALIDATORS
+                              if response.headers.get(name))
+            if 200 <= response.status_code < 300:
+                return raw_response(cls._read_body(response, url),
+                                    cls._continuator(response),
+                                    cls._page_counter(response), validators)
+            elif response.status_code == 304 and any(
+                    header in headers for _, header in _VALIDATORS):
+                return raw_response(None, None, None, validators)
+        finally:
+            if scheduler is not None:
+                scheduler.release(url)
+
+        raise _response_error(url, response, kwargs)
 
-            raise ServerResponseException('Server response not OK. '
-                                          'Response code: {0:d}'
-                                          .format(response.status_code))
+    @classmethod
+    def _stream(cls, method, url, **kwargs):
+        """
+        Makes a single HTTP request like :meth:`Model._request` and yields
+        the decoded body of the response in chunks as they arrive, without
+        the :attr:`Model._max_response_size` limit, for the bodies which are
+        too large to hold in memory such as file downloads. Raises
+        :exc:`ServerResponseException` if the response is not OK. The slot
+        of the :attr:`Model._scheduler` is held until the generator is
+        exhausted or closed.
+
+        """
+
+        priority = kwargs.pop('priority', None)
+        _throttle(kwargs.get('session'))
+        scheduler = cls._scheduler
+        if scheduler is not None:
+            scheduler.acquire(url, priority)
+
+        try:
+            headers = cls._request_headers(method)
+            headers.update(kwargs.pop('headers', None) or ())
+            headers.setdefault('Accept-Encoding', cls._accept_encoding)
+            response = requests.request(method.lower(), url, verify=True,
+                                        headers=headers, prefetch=False,
+                                        **kwargs)
+            if not 200 <= response.status_code < 300:
+                raise _response_error(url, response, kwargs)
+
+            for chunk in cls._iter_body(response, url, None):
+                yield chunk
+        finally:
+            if scheduler is not None:
+                scheduler.release(url)
+
+    @classmethod
+    def _read_body(cls, response, url):
+        """
+        Reads the body of a successful response from the connection in
+        :attr:`Model._chunk_size` chunks, decompressing them as they arrive,
+        and returns it as unicode, decoded with the charset of the response
+        or the one detected from the body like :attr:`requests.Response.text`
+        does if there is none. Raises :exc:`ResponseTooLargeException`
+        as soon as the decoded body exceeds :attr:`Model._max_response_size`.
+        The wire and decoded sizes are recorded in
+        :attr:`Model._transfer_metrics`.
+
+        """
+
+        body = ''.join(cls._iter_body(response, url,
+                                      cls._max_response_size))
+        encoding = response.encoding
+        if not encoding and body and chardet is not None:
+            # no charset in the headers, detect it like response.text does
+            encoding = chardet.detect(body)['encoding']
+        try:
+            return body.decode(encoding or 'utf-8', 'replace')
+        except LookupError:  # an unknown charset
+            return body.decode('utf-8', 'replace')
+
+    @classmethod
+    def _iter_body(cls, response, url, limit):
+        # Yields the decoded chunks of the body for Model._read_body and
+        # Model._stream, up to limit bytes if not None
+        encoding = response.headers.get('content-encoding', '')
+        length = response.headers.get('content-length')
+        if limit and length and not encoding and int(length) > limit:
+            raise ResponseTooLargeException(
+                'Response of {0} is {1} bytes, larger than the limit of {2} '
+                'bytes'.format(url, length, limit))
+
+        stream = decoder(encoding)
+        wire_bytes = decoded_bytes = 0
+        while True:
+            chunk = response.raw.read(cls._chunk_size)
+            data = stream.decompress(chunk) if chunk else stream.flush()
+            wire_bytes += len(chunk)
+            decoded_bytes += len(data)
+            if limit and decoded_bytes > limit:
+                raise ResponseTooLargeException(
+                    'Response of {0} is larger than the limit of {1} '
+                    'bytes'.format(url, limit))
+            if data:
+                yield data
+            if not chunk:
+                break
+
+        cls._transfer_metrics.record(url, encoding, wire_bytes, decoded_bytes)
+        logging.debug('Received %d bytes (%d decoded) from %s', wire_bytes,
+                      decoded_bytes, url)
 
     def __update_data(self, data):
         cls = self.__class__
+        for name in self._dirty:  # do not overwrite the unsaved changes
+            data.pop(name, None)
         overlaps = set(cls.__dict__) & set(data)
 
+        interner = self._interner
         for item in overlaps:
             if issubclass(getattr(cls, item), Model):
-                self.__dict__['__' + item] = data.pop(item)
+                value = data.pop(item)
+                if interner is not None and isinstance(value, dict):
+                    value = interner.intern(value)
+                self.__dict__['__' + item] = value
 
         self.__dict__.update(data)
 
 
     def __fetch(self):
-        data, next_url = self._rest_call(url=self._current_path,
-                                         auth=self._auth)
+        data, next_url = self._rest_call(
+            url=self._absolute_url(self._current_path),
+            **self._request_kwargs)
 
         if data:
             self.__update_data(data)
 
         self._fetched = True
 
+    def _load(self, data=None):
+        """
+        Fills the instance with the given ``data``, such as an item of the
+        result of :meth:`Model._fetch_many`, and marks it as fetched. Fetches
+        the data from the server if ``data`` is not provided.
+
+        """
+
+        if data is None:
+            self.__fetch()
+        else:
+            self.__update_data(dict(data))
+            self._fetched = True
+
+    @property
+    def _fields(self):
+        """
+        A property that returns the fields of the instance, which are the
+        public attributes that are not relations, as a dictionary.
+
+        """
+
+        return dict((name, value) for name, value in self.__dict__.iteritems()
+                    if name[0] != '_')
+
+    @property
+    def _is_new(self):
+        """
+        A property that tells if the instance is not created on the server
+        yet, that is it does not have a primary key value.
+
+        """
+
+        if self.__pk_vals:
+            return self.__pk_vals[-1] is None
+        return self.__dict__.get(self._pk[-1]) is None
+
+    def _write_request(self, action):
+        """
+        Returns the HTTP method, the path and the fields to send for the
+        ``action`` which is one of ``'create'``, ``'update'`` or ``'delete'``.
+        The default implementation creates resources by posting all the fields
+        to the path of the instance without its last segment, such as
+        ``/repos/:user/:repo/issues``, updates them by sending only the
+        changed fields to :attr:`Model._current_path` using
+        :attr:`Model._update_method` and deletes them with ``DELETE``.
+
+        """
+
+        if action == 'create':
+            fields = dict((name, value)
+                          for name, value in self._fields.iteritems()
+                          if value is not None or name not in self._pk)
+            return 'POST', self._current_path.rsplit('/', 1)[0], fields
+        elif action == 'update':
+            changes = dict((name, self.__dict__[name]) for name in self._dirty
+                           if name in self.__dict__)
+            return self._update_method, self._current_path, changes
+        return 'DELETE', self._current_path, None
+
+    def _write_result(self, action, data):
+        """
+        Receives the parsed response of a write request for the ``action``
+        and returns the fields to update the instance with, or ``None``. The
+        default implementation returns the response if it is a dictionary.
+
+        """
+
+        return data if isinstance(data, dict) else None
+
+    def _write(self, action):
+        """
+        Sends the request built by :meth:`Model._write_request` for the
+        ``action``, fills the instance with the returned data and updates the
+        cached collections of its owner and :attr:`Model._cache`. Used by
+        :meth:`Model.save`, :meth:`Model.delete` and
+        :class:`pyresto.batch.Batch`.
+
+        """
+
+        if action == 'create':  # do not try to fetch the missing id
+            self.__dict__.setdefault(self._pk[-1], None)
+
+        method, path, fields = self._write_request(action)
+        if action == 'update' and not fields:
+            return self  # nothing changed
+
+        kwargs = self._request_kwargs
+        if fields is not None:
+            kwargs['data'] = self._serializer(fields)
+            kwargs['headers'] = {'Content-Type': 'application/json'}
+
+        data = self._rest_call(url=self._absolute_url(path), method=method,
+                               **kwargs).data
+
+        self.__dict__.pop('_dirty', None)
+        data = self._write_result(action, data)
+        if data:
+            self.__update_data(data)
+        if action == 'create':  # the primary key is known now
+            self.__pk_vals = self.__footprint = self.__current_path = None
+
+        cache = self._cache
+        if cache is not None:
+            url = self._get_sanitized_url(
+                self._absolute_url(self._current_path))
+            key = self._cache_key('GET', url, **self._request_kwargs)
+            if key is not None:
+                cache.delete(key)
+
+        owner = self._pyresto_owner
+        if owner is not None:
+            for klass in owner.__class__.__mro__:
+                for relation in vars(klass).itervalues():
+                    if isinstance(relation, Many):
+                        relation._sync(owner, self, action)
+
+        return self
+
+    def save(self):
+        """
+        Creates the resource on the server if it does not have a primary key
+        value, and sends the fields assigned since it was fetched or last
+        saved otherwise. Use :class:`pyresto.batch.Batch` to save many models
+        at once.
+
+        A new model which was hashed, for instance put in a set or used as a
+        dict key, before being created keeps hashing and comparing by
+        identity afterwards, so it is never equal to another instance of the
+        same resource. Fetch it again for that.
+
+        :rtype: :class:`Model`
+
+        """
+
+        return self._write('create' if self._is_new else 'update')
+
+    def patch(self, **fields):
+        """
+        Sets the given fields on the instance and saves them. For instance
+        ``issue.patch(state='closed')``.
+
+        :rtype: :class:`Model`
+
+        """
+
+        for name, value in fields.iteritems():
+            setattr(self, name, value)
+        return self.save()
+
+    def delete(self):
+        """Deletes the resource on the server."""
+
+        self._write('delete')
+
+    @classmethod
+    def _project_path(cls, path, fields):
+        """
+        The class method which receives a request path and a list of field
+        names, and is expected to return a path for which the server only
+        sends those fields and the primary keys, or ``None`` if the API does
+        not support field selection for the path. In that case the other
+        fields are dropped on the client side. The default implementation
+        returns ``None``.
+
+        """
+
+        return None
+
+    @classmethod
+    def _filter_path(cls, path, filters):
+        """
+        The class method which receives the path of a collection of the model
+        and a dictionary of :class:`Query` filters, and is expected to return
+        the path with the filters the API supports for it added as query
+        parameters, and a dictionary of the other filters, which are applied
+        on the client side. The default implementation supports no filters
+        and returns the ``path`` and the ``filters`` as they are.
+
+        """
+
+        return path, filters
+
+    def __many(self, name):
+        # Returns the Many relation called name defined on the class
+        for klass in self.__class__.__mro__:
+            relation = klass.__dict__.get(name)
+            if isinstance(relation, Many):
+                return relation
+
+        raise AttributeError('{0} has no Many relation called {1}'.format(
+            self.__class__.__name__, name))
+
+    def related(self, name, fields=None):
+        """
+        Fetches the collection of the :class:`Many` relation called ``name``
+        for the instance, projected to the given fields, without touching the
+        cached value of the relation. The fields are selected by the server
+        if :meth:`Model._project_path` supports the path of the relation, and
+        the others are dropped on the client side otherwise. Accessing a
+        field which was not loaded on an item fetches the whole item, as
+        usual. For instance::
+
+            comments = bug.related('comments', fields=('creator', 'time'))
+
+        :param name: The name of the :class:`Many` field.
+        :type name: string
+
+        :param fields: (optional) The names of the fields to load.
+        :type fields: list of strings or None
+
+        :rtype: :class:`WrappedList`
+
+        """
+
+        return self.__many(name).fetch(self, fields)
+
+    def paged(self, name, max_pages=16):
+        """
+        Returns a :class:`PagedList` over the collection of the :class:`Many`
+        relation called ``name`` for the instance, without touching the
+        cached value of the relation. This turns paging on for the relations
+        which download the whole collection on access, so only the pages
+        covering the accessed items are fetched. For instance::
+
+            repos = user.paged('repos')
+            print len(repos), repos[0].name  # at most two requests
+
+        :param name: The name of the :class:`Many` field.
+        :type name: string
+
+        :param max_pages: (optional) The number of pages to keep in memory.
+        :type max_pages: int
+
+        :rtype: :class:`PagedList`
+
+        """
+
+        return self.__many(name).paged(self, max_pages)
+
+    def query(self, name):
+        """
+        Returns a :class:`Query` over the collection of the :class:`Many`
+        relation called ``name`` for the instance, to be narrowed down with
+        :meth:`Query.filter`, without touching the cached value of the
+        relation. The lazy and paged relations also have a ``filter`` method
+        for the same. For instance::
+
+            for repo in user.query('repos').filter(type='owner'):
+                print repo.full_name
+
+        :param name: The name of the :class:`Many` field.
+        :type name: string
+
+        :rtype: :class:`Query`
+
+        """
+
+        return self.__many(name).query(self)
+
+    @classmethod
+    def _fetch_many(cls, ids, **kwargs):
+        """
+        The class method which fetches the data of many resources with a
+        single request, for the APIs which support it. It receives the values
+        of the last primary key of the resources and the keyword arguments
+        for :meth:`Model.get`, and is expected to return a list of dicts, the
+        same as :meth:`Model.get` would use, in any order. The default
+        implementation returns ``None`` to indicate that the API does not
+        support this, in which case the resources are fetched one by one.
+
+        """
+
+        return None
+
     def __getattr__(self, name):
         if self._fetched:  # if we fetched and still don't have it, no luck!
             raise AttributeError
-        self.__fetch()
+
+        loader = current_loader()
+        data = loader.load(self) if loader is not None else None
+        if data is not None:  # fetched along with its siblings
+            self._load(data)
+        else:
+            self.__fetch()
         return getattr(self, name)  # try again after fetching
 
+    def __known_id(self):
+        # The primary key value if it is known without fetching the resource,
+        # which is not the case for the models not created on the server yet
+        if not self._pk:
+            return None
+        elif self.__pk_vals:
+            return self.__pk_vals[-1]
+        return self.__dict__.get(self._pk[-1])
+
     def __eq__(self, other):
-        return isinstance(other, self.__class__) and self._id == other._id
+        if not isinstance(other, self.__class__):
+            return False
+        if self.__hashed_by_id or other.__hashed_by_id or \
+                self.__known_id() is None or other.__known_id() is None:
+            # no way to identify the resource other than itself
+            return self is other
+
+        # Parent key values are only compared when both sides know them since
+        # models created without an owner do not have them.
+        return self._id == other._id and self._url_base == other._url_base \
+            and all(
+            mine == theirs or mine is None or theirs is None
+            for mine, theirs in zip(self._pk_vals[:-1], other._pk_vals[:-1]))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        # Only the last primary key value is hashed so that instances which
+        # are equal as defined by __eq__ always have the same hash.
+        # A model hashed before it had a primary key, such as a new one put
+        # in a set before being saved, keeps its identity for its lifetime
+        # so it can still be found in the sets and dicts it was put in.
+        known_id = None if self.__hashed_by_id else self.__known_id()
+        if known_id is None:
+            self.__hashed_by_id = True
+            return id(self)
+        return hash((self.__class__.__name__, known_id, self._url_base))
 
     def __repr__(self):
         if self._path:
@@ -589,23 +2567,76 @@ class Model(object):
         :param pk: The primary key value for the requested resource.
         :type pk: string
 
+        :param auth: (optional) The authentication to use instead of
+                     :attr:`Model._auth`.
+
+        :param url_base: (optional) The base URL to use instead of
+                         :attr:`Model._url_base`, such as the URL of another
+                         server running the same API.
+        :type url_base: string
+
+        :param session: (optional) The :class:`requests.Session` to use
+                        instead of :attr:`Model._session`.
+
+        :param cache: (optional) The cache to use instead of
+                      :attr:`Model._cache`.
+
+        :param priority: (optional) The priority of the request for the
+                         :attr:`Model._scheduler`. Defaults to the one set
+                         with :func:`pyresto.scheduler.priority` or
+                         ``'interactive'``.
+        :type priority: string
+
+        :param fields: (optional) The names of the only fields to load,
+                       using :meth:`Model._project_path` if supported. The
+                       instance is not marked as fetched in this case, so
+                       accessing any other field fetches the whole resource.
+        :type fields: list of strings
+
         :rtype: :class:`Model` or None
 
         """
 
         auth = kwargs.pop('auth', cls._auth)
+        url_base = kwargs.pop('url_base', None)
+        session = kwargs.pop('session', None)
+        cache = kwargs.pop('cache', None)
+        priority = kwargs.pop('priority', None)
+        fields = kwargs.pop('fields', None)
 
         ids = dict(zip(cls._pk, args))
-        path = cls._path.format(**ids)
-        data = cls._rest_call(url=path, auth=auth).data
+        path = cls._path_template(ids)
+        projected = cls._project_path(path, fields) if fields else None
+        if projected:
+            path = projected
+        if url_base:
+            path = urlparse.urljoin(url_base, path)
+
+        request_kwargs = dict(auth=auth, priority=priority or
+                              current_priority() or INTERACTIVE)
+        if session is not None:
+            request_kwargs['session'] = session
+        if cache is not None:
+            request_kwargs['cache'] = cache
+
+        data = cls._rest_call(url=path, **request_kwargs).data
 
         if not data:
             return None
 
+        if fields and not projected:
+            data = _project(data, cls, fields)
+
         instance = cls(**data)
         instance._pk_vals = args
-        instance._fetched = True
+        instance._fetched = not fields
         if auth:
             instance._auth = auth
+        if url_base:
+            instance._url_base = url_base
+        if session is not None:
+            instance._session = session
+        if cache is not None:
+            instance._cache = cache
 
         return instance
@@ -0,0 +1,176 @@
+# coding: utf-8
+
+"""
+pyresto.crawler
+~~~~~~~~~~~~~~~
+
+This module contains the graph crawler which walks the relations of models,
+such as the dependency tree of a Bugzilla bug or the followers of a GitHub
+user, concurrently and breadth first.
+
+"""
+
+from multiprocessing.pool import ThreadPool
+
+from .core import Model, Relation
+
+
+__all__ = ('crawl', 'load_many')
+
+
+def _node_key(node):
+    return node.__class__, node._pk_vals
+
+
+def _neighbours(node, relations):
+    found = list()
+    cls = node.__class__
+    for name in relations:
+        # skip nodes which do not have the relation, like users in a bug tree
+        if not any(isinstance(klass.__dict__.get(name), Relation)
+                   for klass in cls.__mro__):
+            continue
+
+        value = getattr(node, name)
+        if value is None:
+            continue
+        elif isinstance(value, Model):
+            found.append(value)
+        else:
+            found.extend(value)
+
+    return node, found
+
+
+def load_many(nodes, pool=None, batch_size=100):
+    """
+    Fetches the data of all the unfetched ``nodes``. The nodes of the models
+    supporting :meth:`Model._fetch_many <pyresto.core.Model._fetch_many>` are
+    fetched ``batch_size`` at a time, the others one by one, on the ``pool``
+    if provided.
+
+    :param nodes: The model instances to fetch.
+    :type nodes: list
+
+    :param pool: (optional) The thread pool to run the requests on.
+    :type pool: :class:`multiprocessing.pool.ThreadPool`
+
+    :param batch_size: (optional) The maximum number of ids in one request.
+    :type batch_size: int
+
+    """
+
+    groups = dict()
+    for node in nodes:
+        if not node._fetched:
+            key = node.__class__, tuple(sorted(node._bindings.items()))
+            groups.setdefault(key, list()).append(node)
+
+    jobs = list()
+    for (model, bindings), group in groups.iteritems():
+        bindings = dict(bindings)
+        for start in xrange(0, len(group), batch_size):
+            jobs.append((model, bindings, group[start:start + batch_size]))
+
+    def load(job):
+        model, bindings, batch = job
+        data = model._fetch_many([node._id for node in batch], **bindings)
+        if data is None:
+            for node in batch:
+                node._load()
+            return
+
+        by_id = dict((node._id, node) for node in batch)
+        for item in data:
+            node = by_id.get(item.get(model._pk[-1]))
+            if node is not None:
+                node._load(item)
+
+    if pool is None:
+        map(load, jobs)
+    else:
+        pool.map(load, jobs)
+
+
+def crawl(roots, relations, max_depth=None, max_nodes=None, concurrency=8,
+          fetch_nodes=False, batch_size=100):
+    """
+    Walks the graph formed by the given relations breadth first, starting
+    from the ``roots``, and yields ``(node, depth)`` tuples as soon as the
+    relations of each node are resolved. Each level is resolved on a pool of
+    ``concurrency`` threads and every node is visited only once, based on its
+    model and primary key values. For instance::
+
+        for bug, depth in crawl([mozilla.Bug.get(774141)],
+                                ('depends_on', 'blocks'), max_depth=3,
+                                fetch_nodes=True):
+            print depth, bug.id, bug.summary
+
+    :param roots: The model instances to start from.
+    :type roots: list
+
+    :param relations: The names of the :class:`Relation
+                      <pyresto.core.Relation>` fields to follow. Nodes which
+                      do not have a relation are not expanded through it.
+    :type relations: list of strings
+
+    :param max_depth: (optional) The maximum distance from the roots.
+    :type max_depth: int or None
+
+    :param max_nodes: (optional) The maximum number of nodes to visit.
+    :type max_nodes: int or None
+
+    :param concurrency: (optional) The maximum number of nodes resolved at
+                        the same time.
+    :type concurrency: int
+
+    :param fetch_nodes: (optional) Whether to fetch the data of the nodes
+                        before yielding them, in batches where the API
+                        supports it. See :func:`load_many`.
+    :type fetch_nodes: boolean
+
+    :param batch_size: (optional) See :func:`load_many`.
+    :type batch_size: int
+
+    """
+
+    visited = set()
+    frontier = list()
+    for root in roots:
+        if _node_key(root) not in visited:
+            visited.add(_node_key(root))
+            frontier.append(root)
+
+    if max_nodes is not None:
+        frontier = frontier[:max_nodes]
+
+    pool = ThreadPool(concurrency)
+    try:
+        depth = 0
+        while frontier:
+            if fetch_nodes:
+                load_many(frontier, pool, batch_size)
+
+            if max_depth is None or depth < max_depth:
+                resolved = pool.imap_unordered(
+                    lambda node: _neighbours(node, relations), frontier)
+            else:
+                resolved = ((node, ()) for node in frontier)
+
+            next_frontier = list()
+            for node, neighbours in resolved:
+                yield node, depth
+
+                for neighbour in neighbours:
+                    if max_nodes is not None and len(visited) >= max_nodes:
+                        break
+
+                    key = _node_key(neighbour)
+                    if key not in visited:
+                        visited.add(key)
+                        next_frontier.append(neighbour)
+
+            frontier = next_frontier
+            depth += 1
+    finally:
+        pool.terminate()
@@ -0,0 +1,204 @@
+# coding: utf-8
+
+"""
+pyresto.distribute
+~~~~~~~~~~~~~~~~~~
+
+This module contains the tools for long scans of large relations, such as
+all the commits of a big repository: :func:`resume` continues an iteration
+saved with :meth:`Cursor.state <pyresto.core.Cursor.state>` after a crash or
+in another process, and :class:`PageQueue` shares the pages of a relation
+between many workers through a SQLite file.
+
+"""
+
+import sqlite3
+import sys
+import time
+
+from .scheduler import BULK
+
+
+__all__ = ('resume', 'PageQueue')
+
+# The states of the pages in a PageQueue
+_PENDING, _CLAIMED, _DONE = 0, 1, 2
+
+
+def _owner(state, auth=None, session=None):
+    # Creates the owner instance identified by a cursor state
+    module, _, name = state['owner'].rpartition('.')
+    __import__(module)  # importlib is missing on Python 2.6
+    cls = getattr(sys.modules[module], name)
+    owner = cls(**dict(zip(cls._pk, state['pk'])))
+    owner._pk_vals = state['pk']
+    if state.get('url_base'):
+        owner._url_base = state['url_base']
+    if auth is not None:
+        owner._auth = auth
+    if session is not None:
+        owner._session = session
+    return owner
+
+
+def resume(state, auth=None, session=None):
+    """
+    Returns a :class:`Cursor <pyresto.core.Cursor>` continuing the iteration
+    over the lazy :class:`Many <pyresto.core.Many>` relation whose position
+    was saved with :meth:`Cursor.state <pyresto.core.Cursor.state>`, from the
+    item after the last one returned.
+
+    :param state: The saved state of the cursor.
+    :type state: dict
+
+    :param auth: (optional) The authentication to bind to the owner of the
+                 relation.
+
+    :param session: (optional) The :class:`requests.Session` to bind to the
+                    owner of the relation.
+
+    """
+
+    owner = _owner(state, auth, session)
+    return getattr(owner, state['relation']).cursor(state)
+
+
+class PageQueue(object):
+    """
+    A work queue of the pages of a :class:`Many <pyresto.core.Many>` relation
+    stored in a SQLite file, so the pages are processed by many workers on a
+    host, in the same or different processes, each page by one worker::
+
+        queue = PageQueue('/tmp/commits.db', repo, 'commits')
+        for commits in queue:
+            process(commits)
+
+    If the API reports the page count, through :meth:`Model._page_counter
+    <pyresto.core.Model._page_counter>`, the worker fetching the first page
+    queues all the other pages by their numbers with :meth:`Model._page_url
+    <pyresto.core.Model._page_url>` so they are fetched in parallel.
+    Otherwise every page queues the next one from its continuation URL.
+
+    A page is marked as done when the worker asks for the next one. The pages
+    claimed by a worker which did not finish them in ``lease`` seconds, such
+    as a crashed one, are given to the other workers, so a scan started again
+    with the same file continues where it stopped.
+
+    """
+
+    def __init__(self, path, owner, relation, lease=300, poll=1.0):
+        """
+        Constructor for the queue.
+
+        :param path: The path of the SQLite file, shared by the workers.
+        :type path: string
+
+        :param owner: The instance owning the relation.
+        :type owner: :class:`Model <pyresto.core.Model>`
+
+        :param relation: The name of the :class:`Many <pyresto.core.Many>`
+                         relation.
+        :type relation: string
+
+        :param lease: (optional) The seconds a worker has to finish a page.
+        :type lease: float
+
+        :param poll: (optional) The seconds to wait before checking again for
+                     pages while the other workers have unfinished ones.
+        :type poll: float
+
+        """
+
+        cls = owner.__class__
+        self.__owner = owner
+        self.__relation = next(klass.__dict__[relation]
+                               for klass in cls.__mro__
+                               if relation in klass.__dict__)
+        self.__model = getattr(cls, relation)
+        self.lease = lease
+        self.poll = poll
+
+        url = self.__model._get_sanitized_url(self.__relation._url(owner))
+        self.__scan = '{0}.{1} {2!r} {3}'.format(cls.__module__, cls.__name__,
+                                                 owner._pk_vals, relation)
+        self.__db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.__db.execute('CREATE TABLE IF NOT EXISTS pages (scan TEXT, '
+                          'url TEXT, chain INTEGER, state INTEGER, '
+                          'claimed REAL, PRIMARY KEY (scan, url))')
+        self.__add([(url, True)])
+
+    def __add(self, pages):
+        self.__db.executemany(
+            'INSERT OR IGNORE INTO pages VALUES (?, ?, ?, ?, NULL)',
+            [(self.__scan, url, chain, _PENDING) for url, chain in pages])
+
+    def __claim(self):
+        # Returns the URL of a pending or abandoned page and whether it
+        # should queue the next page, and marks it as claimed.
+        db = self.__db
+        now = time.time()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            row = db.execute(
+                'SELECT url, chain FROM pages WHERE scan = ? AND (state = ? '
+                'OR state = ? AND claimed < ?) LIMIT 1',
+                (self.__scan, _PENDING, _CLAIMED, now - self.lease)).fetchone()
+            if row is not None:
+                db.execute('UPDATE pages SET state = ?, claimed = ? WHERE '
+                           'scan = ? AND url = ?',
+                           (_CLAIMED, now, self.__scan, row[0]))
+        finally:
+            db.execute('COMMIT')
+        return row
+
+    def __unfinished(self):
+        return self.__db.execute(
+            'SELECT COUNT(*) FROM pages WHERE scan = ? AND state != ?',
+            (self.__scan, _DONE)).fetchone()[0]
+
+    def __fetch(self, url, chain):
+        model, owner = self.__model, self.__owner
+        kwargs = owner._request_kwargs
+        kwargs.setdefault('priority', BULK)
+        response = model._cached_request('GET', url, **kwargs)
+        data = model._parse_body(response.body, self.__relation)
+
+        # the pages already in the queue are ignored, so the first page can
+        # be fetched again when a scan is resumed
+        if chain and response.page_count:
+            self.__add([(model._page_url(url, page), False)
+                        for page in xrange(2, response.page_count + 1)])
+        elif chain and response.continuation_url:
+            self.__add([(response.continuation_url, True)])
+
+        return data
+
+    def __iter__(self):
+        mapper = self.__relation._with_owner(self.__owner)
+        while True:
+            row = self.__claim()
+            if row is None:
+                if not self.__unfinished():
+                    return
+                time.sleep(self.poll)  # others may still queue more pages
+                continue
+
+            url, chain = row
+            data = self.__fetch(url, chain)
+            yield [mapper(item) for item in data]
+            self.__db.execute('UPDATE pages SET state = ? WHERE scan = ? AND '
+                              'url = ?', (_DONE, self.__scan, url))
+
+    def metrics(self):
+        """
+        Returns a dictionary of the number of pending, claimed and done pages
+        of the scan.
+
+        """
+
+        counts = dict(self.__db.execute(
+            'SELECT state, COUNT(*) FROM pages WHERE scan = ? GROUP BY state',
+            (self.__scan,)).fetchall())
+        return dict(pending=counts.get(_PENDING, 0),
+                    claimed=counts.get(_CLAIMED, 0),
+                    done=counts.get(_DONE, 0))
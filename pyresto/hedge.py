@@ -0,0 +1,238 @@
+# coding: utf-8
+
+"""
+pyresto.hedge
+~~~~~~~~~~~~~
+
+This module contains the hedging policy which can be plugged into
+:attr:`Model._hedger <pyresto.core.Model._hedger>` to cut the tail latency
+of the ``GET`` requests: a request which takes longer than most of the recent
+requests to the same endpoint is sent once more, the first response wins and
+the other one is abandoned.
+
+"""
+
+import collections
+import Queue
+import sys
+import threading
+import time
+import urlparse
+
+from .cache import _LRUDict
+
+
+__all__ = ('Hedger',)
+
+
+def _endpoint(url):
+    # The requests to the same path with different query strings, such as
+    # the pages of a collection, share their latencies
+    parts = urlparse.urlsplit(url)
+    return parts.netloc + parts.path
+
+
+class Hedger(object):
+    """
+    Sends a duplicate of a ``GET`` request when its response has not arrived
+    after the ``percentile`` of the latencies of the last ``window`` requests
+    to its endpoint, which is the URL without the query string. While an
+    endpoint has fewer than ``min_samples`` latencies, the latencies of its
+    host are used, and the requests are not hedged until the host has enough
+    of them either::
+
+        Model._hedger = Hedger(percentile=95, max_rate=0.05)
+
+    The duplicates spend a budget which grows by ``max_rate`` for every
+    request, up to ``burst``, so at most about one request in ``1 /
+    max_rate`` is hedged in the long run and the rate limits of the API are
+    not burnt when a whole server slows down. The requests which cannot be
+    hedged are sent from the calling thread as usual.
+
+    """
+
+    def __init__(self, percentile=95, window=100, min_samples=20,
+                 min_delay=0.01, max_rate=0.05, burst=10, max_endpoints=1000):
+        """
+        Constructor for the hedging policy.
+
+        :param percentile: (optional) The percentile of the latencies to wait
+                           for before hedging.
+        :type percentile: float
+
+        :param window: (optional) The number of latencies to keep for every
+                       endpoint and host.
+        :type window: int
+
+        :param min_samples: (optional) The number of latencies needed to
+                            hedge the requests to an endpoint or a host.
+        :type min_samples: int
+
+        :param min_delay: (optional) The shortest seconds to wait for before
+                          hedging.
+        :type min_delay: float
+
+        :param max_rate: (optional) The share of the requests which can be
+                         hedged.
+        :type max_rate: float
+
+        :param burst: (optional) The number of requests which can be hedged
+                      in a row after a calm period.
+        :type burst: int
+
+        :param max_endpoints: (optional) The number of endpoints to keep the
+                              latencies of, dropping the least recently used
+                              ones.
+        :type max_endpoints: int
+
+        """
+
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_rate = max_rate
+        self.burst = burst
+        self.__window = window
+        self.__max_endpoints = max_endpoints
+        self.__lock = threading.Lock()
+        self.__endpoints = _LRUDict()
+        self.__hosts = dict()
+        self.__tokens = float(burst)
+        self.__metrics = collections.defaultdict(int)
+
+    def delay(self, url):
+        """
+        Returns the seconds to wait for the response of a request to the
+        ``url`` before hedging it, or ``None`` if too few latencies are known.
+
+        """
+
+        with self.__lock:
+            for samples in (self.__endpoints.peek(_endpoint(url)),
+                            self.__hosts.get(urlparse.urlsplit(url).netloc)):
+                if samples is not None and len(samples) >= self.min_samples:
+                    ordered = sorted(samples)
+                    index = int(len(ordered) * self.percentile / 100.0)
+                    return max(self.min_delay,
+                               ordered[min(index, len(ordered) - 1)])
+        return None
+
+    def observe(self, url, latency):
+        """Records the ``latency`` of a request to the ``url`` in seconds."""
+
+        endpoint = _endpoint(url)
+        host = urlparse.urlsplit(url).netloc
+        with self.__lock:
+            endpoints = self.__endpoints
+            samples = endpoints.get(endpoint)  # marks it as recently used
+            if samples is None:
+                samples = collections.deque(maxlen=self.__window)
+                if len(endpoints) >= self.__max_endpoints:
+                    endpoints.popitem()
+                endpoints[endpoint] = samples
+            samples.append(latency)
+
+            if host not in self.__hosts:
+                self.__hosts[host] = collections.deque(maxlen=self.__window)
+            self.__hosts[host].append(latency)
+
+    def __spend(self):
+        # Takes a hedge from the budget if there is one left
+        with self.__lock:
+            if self.__tokens < 1:
+                self.__metrics['denied'] += 1
+                return False
+            self.__tokens -= 1
+            self.__metrics['hedged'] += 1
+            return True
+
+    def request(self, url, send):
+        """
+        Returns the result of ``send``, which makes a request to the ``url``,
+        calling it once more if the first call is slower than the
+        :meth:`delay` of the ``url`` and the budget allows. ``send`` receives
+        a :class:`threading.Event` which is set when another call won, so it
+        can stop and return early. The error of a call is raised only if no
+        other call succeeds.
+
+        """
+
+        with self.__lock:
+            self.__metrics['requests'] += 1
+            self.__tokens = min(self.burst, self.__tokens + self.max_rate)
+            budget = self.__tokens >= 1
+
+        delay = self.delay(url) if budget else None
+        if delay is None:  # cannot be hedged, no need for another thread
+            started = time.time()
+            result = send(threading.Event())
+            self.observe(url, time.time() - started)
+            return result
+
+        results = Queue.Queue()
+        attempts = list()
+
+        def attempt():
+            cancelled = threading.Event()
+
+            def run():
+                started = time.time()
+                try:
+                    result = send(cancelled)
+                except Exception:
+                    results.put((cancelled, False, sys.exc_info()))
+                else:
+                    if not cancelled.is_set():
+                        self.observe(url, time.time() - started)
+                    results.put((cancelled, True, result))
+
+            attempts.append(cancelled)
+            thread = threading.Thread(target=run)
+            thread.daemon = True
+            thread.start()
+
+        attempt()
+        try:
+            outcome = results.get(timeout=delay)
+        except Queue.Empty:
+            outcome = None
+            if self.__spend():
+                attempt()
+
+        pending = len(attempts)
+        while True:
+            if outcome is None:
+                outcome = results.get()
+            pending -= 1
+            winner, succeeded, value = outcome
+            if succeeded or not pending:
+                break
+            outcome = None
+
+        for cancelled in attempts:
+            if cancelled is not winner:
+                cancelled.set()
+
+        if not succeeded:
+            raise value[0], value[1], value[2]
+        if winner is not attempts[0]:
+            with self.__lock:
+                self.__metrics['wins'] += 1
+        return value
+
+    def metrics(self):
+        """
+        Returns a dictionary of the number of requests, the hedged ones, the
+        hedges which won, the hedges denied by the budget and the share of
+        the hedged requests.
+
+        """
+
+        with self.__lock:
+            metrics = dict((name, self.__metrics[name])
+                           for name in ('requests', 'hedged', 'wins',
+                                        'denied'))
+        metrics['hedge_rate'] = (float(metrics['hedged']) /
+                                 metrics['requests']
+                                 if metrics['requests'] else 0.0)
+        return metrics
@@ -0,0 +1,174 @@
+# coding: utf-8
+
+"""
+pyresto.interning
+~~~~~~~~~~~~~~~~~
+
+This module contains the shared storage for the sub-objects embedded in the
+resources, such as the author of every commit, so the memory used for them
+grows with the number of distinct objects instead of the number of resources
+embedding them. It is enabled by setting :attr:`Model._interner
+<pyresto.core.Model._interner>`.
+
+"""
+
+import threading
+import weakref
+
+
+__all__ = ('Interner',)
+
+# The key of the values which cannot be shared since they are not hashable
+_UNSHARED = object()
+
+
+class Interner(object):
+    """
+    Shared storage for the embedded sub-objects and their string values. Equal
+    dictionaries, lists and unicode strings passed to :meth:`intern` are
+    replaced with a single shared copy, and :meth:`model` returns a single
+    :class:`Model <pyresto.core.Model>` instance for equal embedded objects
+    of the same model, like the same user embedded as the author of many
+    commits::
+
+        GitHubModel._interner = Interner()
+
+    The shared values must not be modified in place, and the fields of the
+    shared models cannot be set. The shared models have no owner, and are
+    dropped once no resource refers to them. The values are all dropped
+    when more than ``max_entries`` distinct ones are stored, so the storage
+    cannot grow without bounds in long running processes.
+
+    """
+
+    def __init__(self, max_entries=100000):
+        """
+        Constructor for the shared storage.
+
+        :param max_entries: (optional) The number of distinct values to store
+                            before dropping all of them.
+        :type max_entries: int
+
+        """
+
+        self.max_entries = max_entries
+        self.__lock = threading.Lock()
+        self.__values = dict()
+        self.__models = weakref.WeakValueDictionary()
+        self.__hits = 0
+
+    def __share(self, key, value):
+        values = self.__values
+        shared = values.get(key)
+        if shared is None:
+            if len(values) >= self.max_entries:
+                self.clear()
+            shared = values.setdefault(key, value)
+        if shared is not value:
+            self.__hits += 1
+        return shared
+
+    def __intern(self, value):
+        # Returns the shared copy of the value and the key it is stored with,
+        # which is _UNSHARED if the value cannot be shared.
+        if isinstance(value, unicode):
+            return self.__share(value, value), value
+        elif isinstance(value, str):
+            value = intern(value)
+            return value, value
+        elif isinstance(value, dict):
+            pairs = [(self.__intern(k), self.__intern(v))
+                     for k, v in value.iteritems()]
+            value = dict((k, v) for (k, _), (v, _) in pairs)
+            keys = [(k, v) for (_, k), (_, v) in pairs]
+            if any(_UNSHARED in pair for pair in keys):
+                return value, _UNSHARED
+            key = (dict, frozenset(keys))
+        elif isinstance(value, list):
+            items = [self.__intern(item) for item in value]
+            value = [item for item, _ in items]
+            keys = tuple(key for _, key in items)
+            if _UNSHARED in keys:
+                return value, _UNSHARED
+            key = (list, keys)
+        else:
+            try:  # the type is a part of the key so 1, 1.0 and True differ
+                key = (value.__class__, value)
+                hash(key)
+            except TypeError:
+                return value, _UNSHARED
+            return value, key
+
+        return self.__share(key, value), key
+
+    def intern(self, value):
+        """
+        Returns the shared copy of the ``value`` if it is a dictionary, a list
+        or a string, interning the values in it recursively, and the ``value``
+        as it is otherwise.
+
+        """
+
+        return self.__intern(value)[0]
+
+    def model(self, model, properties, owner):
+        """
+        Returns the shared instance of the ``model`` created from the embedded
+        ``properties`` of the ``owner`` instance, which carries the bindings
+        of the ``owner`` but not the ``owner`` itself. Models whose paths
+        depend on the primary keys of their owners are not shared, and are
+        bound to the ``owner`` like the embedded models which are not
+        interned.
+
+        :param model: The model class of the embedded object.
+        :type model: :class:`Model <pyresto.core.Model>`
+
+        :param properties: The data of the embedded object.
+        :type properties: dict
+
+        :param owner: The instance embedding the object.
+        :type owner: :class:`Model <pyresto.core.Model>`
+
+        """
+
+        properties, key = self.__intern(properties)
+        bindings = tuple(owner.__dict__.get(name) for name in model._bindable)
+        key = (model, key, bindings)
+        try:
+            shared = self.__models.get(key)
+        except TypeError:  # unhashable bindings
+            key = None
+            shared = None
+
+        if shared is not None:
+            self.__hits += 1
+            return shared
+
+        instance = model(**properties)
+        if key is None or key[1] is _UNSHARED or len(model._pk) != 1:
+            instance._bind(owner)
+            return instance
+
+        # shared by the resources of many owners, so bound to none of them
+        for name, value in zip(model._bindable, bindings):
+            if name in owner.__dict__:
+                instance.__dict__[name] = value
+        instance.__dict__['_pyresto_shared'] = True
+        return self.__models.setdefault(key, instance)
+
+    def metrics(self):
+        """
+        Returns a dictionary of the number of shared values and models, and
+        the number of times a shared copy was returned instead of a new one.
+
+        """
+
+        return dict(values=len(self.__values), models=len(self.__models),
+                    hits=self.__hits)
+
+    def clear(self):
+        """Drops all the shared values and models."""
+
+        with self.__lock:
+            self.__values.clear()
+            self.__models.clear()
@@ -0,0 +1,212 @@
+# coding: utf-8
+
+"""
+pyresto.loader
+~~~~~~~~~~~~~~
+
+This module contains the loader which batches the implicit fetches of the
+models in the same collection, such as the bugs in ``bug.depends_on``, so
+code like ``[b.summary for b in bug.depends_on]`` makes one request for all
+the bugs instead of one for every bug.
+
+"""
+
+import threading
+
+from multiprocessing.pool import ThreadPool
+
+
+__all__ = ('Loader', 'current_loader')
+
+_local = threading.local()
+
+
+def current_loader():
+    """Returns the active :class:`Loader` of the thread or ``None``."""
+
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+
+class _Group(object):
+    # The items of a collection fetched by a Many relation, in the order they
+    # were received, with the mapper creating their models.
+
+    def __init__(self, model, items, mapper):
+        self.model = model
+        self.items = items
+        self.mapper = mapper
+        self.lock = threading.Lock()
+
+
+class Loader(object):
+    """
+    Batches the implicit fetches of the models which were received in the
+    same collection of a :class:`Many <pyresto.core.Many>` relation while the
+    loader is active, as a context manager. When a field which was not loaded
+    is accessed on one of the models, the data of its unfetched siblings is
+    fetched with it, with :meth:`Model._fetch_many
+    <pyresto.core.Model._fetch_many>` where the API supports it and
+    concurrently otherwise, and the siblings use that data instead of making
+    their own requests::
+
+        with Loader():
+            summaries = [b.summary for b in bug.depends_on]
+
+    The siblings are gathered per page for the lazy and the paged relations,
+    and the fetched data is kept until the loader exits.
+
+    """
+
+    def __init__(self, batch_size=100, concurrency=8):
+        """
+        Constructor for the loader.
+
+        :param batch_size: (optional) The maximum number of models fetched at
+                           once.
+        :type batch_size: int
+
+        :param concurrency: (optional) The number of concurrent requests for
+                            the models which cannot be fetched in a single
+                            request.
+        :type concurrency: int
+
+        """
+
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.__groups = dict()
+        self.__data = dict()
+        self.__pool = None
+        self.__lock = threading.Lock()
+        self.__requests = 0
+        self.__loaded = 0
+
+    @staticmethod
+    def __key(model, pk, url_base):
+        return model, pk, url_base
+
+    def add(self, model, items, mapper, url_base=None):
+        """
+        Registers the ``items`` of a collection as siblings. Called by
+        :class:`Many <pyresto.core.Many>` for every collection or page it
+        fetches.
+
+        :param model: The model of the items.
+        :type model: :class:`Model <pyresto.core.Model>`
+
+        :param items: The data of the items.
+        :type items: list of dicts
+
+        :param mapper: The function creating a model from an item, see
+                       :meth:`Many._with_owner
+                       <pyresto.core.Many._with_owner>`.
+        :type mapper: function(item)
+
+        :param url_base: (optional) The URL base bound to the items.
+
+        """
+
+        pk = model._pk[-1] if model._pk else None
+        if not pk:
+            return
+
+        items = [item for item in items
+                 if isinstance(item, dict) and item.get(pk) is not None]
+        if len(items) < 2:
+            return
+
+        group = _Group(model, items, mapper)
+        with self.__lock:
+            for item in items:
+                self.__groups[self.__key(model, item[pk], url_base)] = group
+
+    @property
+    def _pool(self):
+        with self.__lock:
+            if self.__pool is None:
+                self.__pool = ThreadPool(self.concurrency)
+            return self.__pool
+
+    def __fetch(self, instances):
+        model = instances[0].__class__
+        data = model._fetch_many([instance._id for instance in instances],
+                                 **instances[0]._bindings)
+        if data is not None:
+            with self.__lock:
+                self.__requests += 1
+            pk = model._pk[-1]
+            return dict((item.get(pk), item) for item in data)
+
+        def fetch_one(instance):
+            return instance._rest_call(
+                url=instance._absolute_url(instance._current_path),
+                **instance._request_kwargs).data
+
+        with self.__lock:
+            self.__requests += len(instances)
+        results = self._pool.map(fetch_one, instances)
+        return dict((instance._id, item)
+                    for instance, item in zip(instances, results) if item)
+
+    def load(self, instance):
+        """
+        Returns the data for the unfetched ``instance``, fetching it along
+        with its siblings if it is not fetched yet, or ``None`` if the
+        ``instance`` is not a part of a registered collection.
+
+        """
+
+        key = self.__key(instance.__class__, instance._id, instance._url_base)
+        group = self.__groups.get(key)
+        if group is None:
+            return None
+
+        model, url_base = group.model, instance._url_base
+        with group.lock:
+            if key not in self.__data:
+                pk = model._pk[-1]
+                pending = [item for item in group.items
+                           if item[pk] != instance._id and self.__key(
+                               model, item[pk], url_base) not in self.__data]
+                batch = [instance] + map(group.mapper,
+                                         pending[:self.batch_size - 1])
+
+                fetched = self.__fetch(batch)
+                # the ones the server did not return are fetched one by one
+                for sibling in batch:
+                    self.__data[self.__key(model, sibling._id, url_base)] = \
+                        fetched.get(sibling._id)
+
+            data = self.__data[key]
+
+        if data is not None:
+            with self.__lock:
+                self.__loaded += 1
+        return data
+
+    def metrics(self):
+        """
+        Returns a dictionary of the number of requests made by the loader and
+        the number of models loaded from their data.
+
+        """
+
+        return dict(requests=self.__requests, loaded=self.__loaded)
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = list()
+        stack.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.stack.remove(self)
+        with self.__lock:
+            if self.__pool is not None:
+                self.__pool.close()
+                self.__pool.join()
+                self.__pool = None
+            self.__groups.clear()
+            self.__data.clear()
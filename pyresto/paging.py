@@ -0,0 +1,163 @@
+# coding: utf-8
+
+"""
+pyresto.paging
+~~~~~~~~~~~~~~
+
+This module contains the page sizing policies used by the lazy
+:class:`Many <pyresto.core.Many>` relations to pick the number of items to
+request per page.
+
+"""
+
+import collections
+import threading
+
+
+__all__ = ('PageSizer',)
+
+
+class PageSizer(object):
+    """
+    Adaptive page sizing policy for the lazy :class:`Many
+    <pyresto.core.Many>` relations of the models which support variable page
+    sizes through :attr:`Model._page_size_param
+    <pyresto.core.Model._page_size_param>`.
+
+    Every iteration starts with a small page so the first items are available
+    quickly, and then the page size is doubled on every request up to an
+    ideal size which is learned from all the pages fetched for the relation:
+    the largest size that is expected to take at most ``target_latency``
+    seconds and ``max_page_bytes`` bytes given the observed per-item latency
+    and size, capped by the maximum page size of the API.
+
+    Since the pages are requested by number, a page size is only picked if it
+    divides the number of items already fetched so the pages never overlap or
+    leave gaps.
+
+    """
+
+    def __init__(self, initial=None, maximum=None, target_latency=1.0,
+                 max_page_bytes=1024 * 1024, smoothing=0.3):
+        """
+        Constructor for the page sizing policy.
+
+        :param initial: (optional) The size of the first page. Defaults to a
+                        quarter of the maximum page size.
+        :type initial: int or None
+
+        :param maximum: (optional) The largest page size to request. Defaults
+                        to :attr:`Model._max_page_size
+                        <pyresto.core.Model._max_page_size>` of the model.
+        :type maximum: int or None
+
+        :param target_latency: (optional) The number of seconds a single page
+                               request should take at most.
+        :type target_latency: float
+
+        :param max_page_bytes: (optional) The number of bytes a single page
+                               should take at most.
+        :type max_page_bytes: int
+
+        :param smoothing: (optional) The weight of the latest page in the
+                          moving averages of the per-item latency and size.
+        :type smoothing: float
+
+        """
+
+        self.initial = initial
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.max_page_bytes = max_page_bytes
+        self.smoothing = smoothing
+
+        self.__lock = threading.Lock()
+        self.__item_latency = None
+        self.__item_bytes = None
+        self.__pages = 0
+        self.__items = 0
+        self.__bytes = 0
+        self.__latency = 0.0
+        self.__sizes = collections.defaultdict(int)
+
+    def __limits(self, maximum):
+        maximum = self.maximum or maximum
+        initial = min(self.initial or max(maximum // 4, 1), maximum)
+        return initial, maximum
+
+    def ideal_size(self, maximum):
+        """
+        Returns the largest page size to grow to, given the maximum page size
+        of the API, based on the pages fetched so far.
+
+        """
+
+        size = self.maximum or maximum
+        if self.__item_latency:
+            size = min(size, int(self.target_latency / self.__item_latency))
+        if self.__item_bytes:
+            size = min(size, int(self.max_page_bytes / self.__item_bytes))
+
+        return max(size, 1)
+
+    def size_for(self, offset, previous, maximum):
+        """
+        Returns the size of the page starting at the item ``offset``, after a
+        page of ``previous`` items or ``None`` for the first page.
+
+        """
+
+        initial, maximum = self.__limits(maximum)
+        if previous is None:
+            size = initial
+        else:
+            size = min(previous * 2, self.ideal_size(maximum))
+
+        size = max(size, 1)
+        while offset % size:  # align the page with the items fetched so far
+            size -= 1
+
+        return size
+
+    def observe(self, size, count, latency, nbytes):
+        """
+        Records a fetched page of ``count`` items which was requested with the
+        page size ``size``, took ``latency`` seconds and ``nbytes`` bytes.
+
+        """
+
+        with self.__lock:
+            self.__pages += 1
+            self.__items += count
+            self.__bytes += nbytes
+            self.__latency += latency
+            self.__sizes[size] += 1
+
+            if not count:
+                return
+
+            weight = self.smoothing
+            item_latency = latency / count
+            item_bytes = float(nbytes) / count
+            if self.__item_latency is None:
+                self.__item_latency = item_latency
+                self.__item_bytes = item_bytes
+            else:
+                self.__item_latency += weight * (item_latency -
+                                                 self.__item_latency)
+                self.__item_bytes += weight * (item_bytes - self.__item_bytes)
+
+    def metrics(self):
+        """
+        Returns a dictionary of the page count, the item count, the total
+        bytes and latency, the averages per item and the number of pages
+        requested with each page size.
+
+        """
+
+        with self.__lock:
+            return dict(pages=self.__pages, items=self.__items,
+                        bytes=self.__bytes, latency=self.__latency,
+                        item_latency=self.__item_latency,
+                        item_bytes=self.__item_bytes,
+                        sizes=dict(self.__sizes))
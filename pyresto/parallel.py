@@ -0,0 +1,128 @@
+# coding: utf-8
+
+"""
+pyresto.parallel
+~~~~~~~~~~~~~~~~
+
+This module contains the process pool which can be plugged into
+:attr:`Model._parse_pool <pyresto.core.Model._parse_pool>` to parse and
+preprocess the response bodies on all the cores of the machine during bulk
+loads such as :func:`pyresto.crawler.crawl`.
+
+"""
+
+import marshal
+import multiprocessing
+import threading
+
+
+__all__ = ('ParsePool',)
+
+
+def _find_relation(owner, name):
+    for klass in owner.__mro__:
+        if name in vars(klass):
+            return vars(klass)[name]
+    raise AttributeError('{0} has no relation {1}'.format(owner.__name__,
+                                                          name))
+
+
+def _parse(model, body, relation):
+    # Runs in the worker processes. The models and relations are passed by
+    # reference since the preprocessors are usually not picklable. The data
+    # is sent back marshalled, so the pool only passes a string along and the
+    # calling process decodes it faster than it would parse the body or
+    # unpickle the data. The data marshal cannot handle is sent as it is.
+    data = model._parser(body)
+    if relation is not None:
+        data = _find_relation(*relation)._sanitize_data(data)
+    try:
+        return True, marshal.dumps(data)
+    except ValueError:
+        return False, data
+
+
+class ParsePool(object):
+    """
+    A pool of worker processes which parse the response bodies with
+    :attr:`Model._parser <pyresto.core.Model._parser>` and apply the
+    ``preprocessor`` of the :class:`Many <pyresto.core.Many>` relation they
+    are fetched for, so only the plain data is sent back for creating the
+    models, in the compact form of :mod:`marshal`. Decoding it costs the
+    calling process about a third less than parsing the JSON body, see
+    ``benchmarks/parallel.py``, and the preprocessors do not run there.
+
+    The calling thread waits for the result without holding the GIL, so the
+    pool is most useful with concurrent fetches such as the ones of
+    :func:`pyresto.crawler.crawl`. The models and the relations must be
+    importable by the workers, so they should be defined at module level.
+
+    """
+
+    def __init__(self, processes=None, min_size=32 * 1024):
+        """
+        Constructor for the parsing pool.
+
+        :param processes: (optional) The number of worker processes. Defaults
+                          to the number of CPUs.
+        :type processes: int or None
+
+        :param min_size: (optional) The body size in bytes under which the
+                         body is parsed in the calling process since sending
+                         it to a worker would take longer.
+        :type min_size: int
+
+        """
+
+        self.__processes = processes
+        self.__min_size = min_size
+        self.__pool = None
+        self.__lock = threading.Lock()
+        self.__parsed = 0
+        self.__inline = 0
+
+    @property
+    def _pool(self):
+        # the workers are started on first use, so defining a pool at import
+        # time does not fork the importing process
+        with self.__lock:
+            if self.__pool is None:
+                self.__pool = multiprocessing.Pool(self.__processes)
+            return self.__pool
+
+    def parse(self, model, body, relation=None):
+        """
+        Parses the ``body`` for the ``model`` and preprocesses it for the
+        :class:`Many <pyresto.core.Many>` ``relation`` if given.
+
+        """
+
+        ref = (relation._owner, relation._name) if relation else None
+        if len(body) < self.__min_size or (relation and ref[0] is None):
+            with self.__lock:
+                self.__inline += 1
+            data = model._parser(body)
+            return relation._sanitize_data(data) if relation else data
+
+        with self.__lock:
+            self.__parsed += 1
+        packed, data = self._pool.apply_async(_parse, (model, body, ref)).get()
+        return marshal.loads(data) if packed else data
+
+    def metrics(self):
+        """
+        Returns a dictionary of the number of bodies parsed by the workers and
+        in the calling process.
+
+        """
+
+        return dict(parsed=self.__parsed, inline=self.__inline)
+
+    def close(self):
+        """Stops the worker processes after the pending bodies are parsed."""
+
+        with self.__lock:
+            if self.__pool is not None:
+                self.__pool.close()
+                self.__pool.join()
+                self.__pool = None
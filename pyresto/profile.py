@@ -0,0 +1,390 @@
+# coding: utf-8
+
+"""
+pyresto.profile
+~~~~~~~~~~~~~~~
+
+This module contains a profiler which breaks the time spent by a workload
+down into waiting for the network, parsing, creating models, resolving
+relations and fetching models implicitly on attribute access, and lists the
+attribute accesses which made HTTP requests, such as the hidden N+1 fetches
+of a loop. Run a script or one of the :data:`SCENARIOS` with::
+
+    python -m pyresto.profile [--replay FILE | --record FILE] script.py
+    python -m pyresto.profile --scenario github-commits BYK/pyresto
+
+"""
+
+import collections
+import json
+import optparse
+import os
+import sys
+import threading
+import time
+
+from .core import (Foreign, Many, Model, ServerResponseException,
+                   raw_response)
+
+
+__all__ = ('Profiler', 'Recorder', 'Replayer', 'SCENARIOS', 'main')
+
+#: The categories the time is broken down into, in the report order.
+CATEGORIES = ('network', 'parsing', 'construction', 'relations',
+              'lazy fetches')
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+#: The type of the implicit requests listed by :meth:`Profiler.report`
+#: holding the accessed attribute as ``Model.name``, the file and the line
+#: where it was accessed, the number of accesses and of the requests made.
+implicit_fetch = collections.namedtuple('implicit_fetch',
+                                        'attribute site accesses requests')
+
+
+def _call_site():
+    # Returns the location of the innermost frame outside of pyresto
+    frame = sys._getframe(2)
+    while frame and os.path.abspath(frame.f_code.co_filename).startswith(
+            _PACKAGE_DIR):
+        frame = frame.f_back
+    if frame is None:
+        return '<unknown>'
+    return '{0}:{1}'.format(frame.f_code.co_filename, frame.f_lineno)
+
+
+class Profiler(object):
+    """
+    Measures the time spent in every category of :data:`CATEGORIES` by
+    wrapping the methods of :class:`Model <pyresto.core.Model>`,
+    :class:`Many <pyresto.core.Many>` and :class:`Foreign
+    <pyresto.core.Foreign>` while it is active, as a context manager. The
+    times are exclusive, so the time spent parsing while resolving a relation
+    is only counted as parsing.
+
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        self.__times = collections.defaultdict(float)
+        self.__calls = collections.defaultdict(int)
+        self.__implicit = dict()
+        self.__originals = list()
+        self.__started = None
+        self.wall_time = 0.0
+
+    def __stack(self):
+        local = self.__local
+        if not hasattr(local, 'stack'):
+            local.stack = list()
+            local.requests = 0
+        return local
+
+    def __measure(self, category, func, args, kwargs, attribute=None):
+        local = self.__stack()
+        outermost = attribute and not any(
+            frame[3] for frame in local.stack)
+        requests = local.requests
+        frame = [category, time.time(), 0.0, attribute]
+        local.stack.append(frame)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            local.stack.pop()
+            elapsed = time.time() - frame[1]
+            if local.stack:
+                local.stack[-1][2] += elapsed
+            if category == 'network':
+                local.requests += 1
+
+            with self.__lock:
+                self.__times[category] += elapsed - frame[2]
+                self.__calls[category] += 1
+                if outermost and local.requests > requests:
+                    key = (attribute, _call_site())
+                    accesses, made = self.__implicit.get(key, (0, 0))
+                    self.__implicit[key] = (accesses + 1,
+                                            made + local.requests - requests)
+
+    def __patch(self, owner, name, wrapper):
+        original = owner.__dict__[name]
+        self.__originals.append((owner, name, original))
+        setattr(owner, name, wrapper(original))
+
+    def __enter__(self):
+        measure = self.__measure
+
+        def timed_classmethod(category):
+            def wrap(original):
+                function = original.__func__
+
+                def wrapper(cls, *args, **kwargs):
+                    return measure(category, function, (cls,) + args, kwargs)
+                return classmethod(wrapper)
+            return wrap
+
+        def timed(category):
+            def wrap(function):
+                def wrapper(self, *args, **kwargs):
+                    return measure(category, function, (self,) + args, kwargs)
+                return wrapper
+            return wrap
+
+        def relation(function):
+            def wrapper(self, instance, owner):
+                if instance is None:
+                    return function(self, instance, owner)
+                return measure('relations', function, (self, instance, owner),
+                               {}, '{0}.{1}'.format(
+                                   instance.__class__.__name__, self._name))
+            return wrapper
+
+        def lazy(function):
+            def wrapper(self, name):
+                if self._fetched or name.startswith('__'):
+                    return function(self, name)
+                return measure('lazy fetches', function, (self, name), {},
+                               '{0}.{1}'.format(self.__class__.__name__,
+                                                name))
+            return wrapper
+
+        self.__patch(Model, '_request', timed_classmethod('network'))
+        self.__patch(Model, '_parse_body', timed_classmethod('parsing'))
+        self.__patch(Model, '__init__', timed('construction'))
+        self.__patch(Model, '__getattr__', lazy)
+        self.__patch(Many, '__get__', relation)
+        self.__patch(Foreign, '__get__', relation)
+
+        self.__started = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall_time += time.time() - self.__started
+        while self.__originals:
+            owner, name, original = self.__originals.pop()
+            setattr(owner, name, original)
+
+    def times(self):
+        """
+        Returns a dictionary of the exclusive time spent in every category
+        and the rest of the wall time under ``'other'``.
+
+        """
+
+        times = dict((category, self.__times[category])
+                     for category in CATEGORIES)
+        times['other'] = max(self.wall_time - sum(times.itervalues()), 0.0)
+        return times
+
+    def implicit_fetches(self):
+        """
+        Returns a list of :data:`implicit_fetch` for the attribute accesses
+        which made HTTP requests, the most requests first.
+
+        """
+
+        fetches = [implicit_fetch(attribute, site, accesses, requests)
+                   for (attribute, site), (accesses, requests)
+                   in self.__implicit.iteritems()]
+        return sorted(fetches, key=lambda fetch: (-fetch.requests,
+                                                  fetch.attribute, fetch.site))
+
+    def report(self, out=sys.stdout, top=20):
+        """Writes the time breakdown and the implicit fetches to ``out``."""
+
+        times = self.times()
+        total = sum(times.itervalues()) or 1.0
+        out.write('{0:<14} {1:>8} {2:>10} {3:>7}\n'.format(
+            'category', 'calls', 'seconds', '%'))
+        for category in CATEGORIES + ('other',):
+            out.write('{0:<14} {1:>8} {2:>10.3f} {3:>6.1f}%\n'.format(
+                category, self.__calls[category] or '', times[category],
+                100 * times[category] / total))
+
+        fetches = self.implicit_fetches()
+        if not fetches:
+            return
+
+        out.write('\nattribute accesses which made HTTP requests:\n')
+        out.write('{0:>8} {1:>8}  {2:<30} {3}\n'.format(
+            'requests', 'accesses', 'attribute', 'site'))
+        for fetch in fetches[:top]:
+            out.write('{0:>8} {1:>8}  {2:<30} {3}\n'.format(
+                fetch.requests, fetch.accesses, fetch.attribute, fetch.site))
+
+
+class Recorder(object):
+    """
+    Records the responses received by :meth:`Model._request
+    <pyresto.core.Model._request>` while it is active, as a context manager,
+    and writes them to the file at ``path`` for :class:`Replayer`.
+
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.responses = list()
+        self.__original = None
+
+    def __enter__(self):
+        self.__original = original = Model.__dict__['_request']
+        responses = self.responses
+
+        def record(cls, method, url, **kwargs):
+            response = original.__func__(cls, method, url, **kwargs)
+            responses.append(dict(method=method, url=url,
+                                  body=response.body,
+                                  next=response.continuation_url,
+                                  pages=response.page_count))
+            return response
+
+        Model._request = classmethod(record)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        Model._request = self.__original
+        with open(self.path, 'w') as f:
+            json.dump(self.responses, f)
+
+
+class Replayer(object):
+    """
+    Serves the responses recorded by :class:`Recorder` in the file at
+    ``path`` instead of making HTTP requests while it is active, as a
+    context manager. Requests which were not recorded raise
+    :exc:`ServerResponseException <pyresto.core.ServerResponseException>`.
+
+    """
+
+    def __init__(self, path, latency=0.0):
+        with open(path) as f:
+            self.responses = dict(((r['method'].upper(), r['url']), r)
+                                  for r in json.load(f))
+        self.latency = latency
+        self.__original = None
+
+    def __enter__(self):
+        self.__original = Model.__dict__['_request']
+        responses = self.responses
+        latency = self.latency
+
+        def replay(cls, method, url, **kwargs):
+            recorded = responses.get((method.upper(), url))
+            if recorded is None:
+                raise ServerResponseException(
+                    'No recorded response for {0} {1}'.format(method, url))
+            if latency:
+                time.sleep(latency)
+            return raw_response(recorded['body'], recorded['next'],
+                                recorded['pages'])
+
+        Model._request = classmethod(replay)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        Model._request = self.__original
+
+
+def _github_commits(full_name='BYK/pyresto', count='100'):
+    # Iterates over the commits of a repository and reads their stats, which
+    # are only in the commit details so every commit is fetched on its own.
+    from .apis import github
+
+    repo = github.Repo.get(full_name)
+    for position, commit in enumerate(repo.commits):
+        if position >= int(count):
+            break
+        commit.author
+        commit.stats
+
+
+def _github_user(login='BYK', count='30'):
+    # Reads the repositories of a user with their owners and contributors
+    from .apis import github
+
+    user = github.User.get(login)
+    for repo in user.repos[:int(count)]:
+        repo.owner
+        len(repo.contributors)
+
+
+def _bugzilla_bug(bug_id='1', service='mozilla'):
+    # Reads a bug with its comments, history and attachments
+    from .apis import bugzilla
+
+    bug = getattr(bugzilla, service).Bug.get(int(bug_id))
+    for comment in bug.comments:
+        comment.creator
+    for change in bug.history:
+        change.changer
+    for attachment in bug.attachments:
+        attachment.attacher
+
+
+#: The named scenarios which can be profiled with ``--scenario`` instead of a
+#: script, taking their arguments from the command line.
+SCENARIOS = {
+    'github-commits': _github_commits,
+    'github-user': _github_user,
+    'bugzilla-bug': _bugzilla_bug,
+}
+
+
+def main(argv=None):
+    """The entry point of ``python -m pyresto.profile``."""
+
+    parser = optparse.OptionParser(
+        prog='python -m pyresto.profile',
+        usage='%prog [options] script.py [args]\n'
+              '       %prog [options] --scenario NAME [args]',
+        description='Profiles a script or a scenario using pyresto models.')
+    parser.disable_interspersed_args()  # the rest belongs to the script
+    parser.add_option('--scenario', type='choice',
+                      choices=sorted(SCENARIOS),
+                      help='run a named scenario instead of a script')
+    parser.add_option('--replay', metavar='FILE',
+                      help='serve the responses recorded in FILE')
+    parser.add_option('--record', metavar='FILE',
+                      help='record the responses to FILE')
+    parser.add_option('--latency', type='float', default=0.0,
+                      help='seconds to wait for every replayed response')
+    parser.add_option('--top', type='int', default=20,
+                      help='number of implicit fetch sites to list')
+    options, args = parser.parse_args(argv)
+
+    if options.replay and options.record:
+        parser.error('--replay and --record cannot be used together')
+
+    if options.scenario:
+        scenario = SCENARIOS[options.scenario]
+        run = lambda: scenario(*args)
+    elif args:
+        def run():
+            sys.argv = list(args)
+            execfile(args[0], dict(__name__='__main__', __file__=args[0]))
+    else:
+        parser.error('either a script or --scenario is required')
+
+    if options.replay:
+        transport = Replayer(options.replay, options.latency)
+    elif options.record:
+        transport = Recorder(options.record)
+    else:
+        transport = None
+
+    profiler = Profiler()
+    try:
+        if transport:
+            with transport:
+                with profiler:
+                    run()
+        else:
+            with profiler:
+                run()
+    finally:
+        profiler.report(top=options.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,199 @@
+# coding: utf-8
+
+"""
+pyresto.scheduler
+~~~~~~~~~~~~~~~~~
+
+This module contains the request scheduler which can be plugged into
+:attr:`Model._scheduler <pyresto.core.Model._scheduler>` to limit the number
+of concurrent requests per host and to share them between priority classes,
+so the requests of the users of an application are not stuck behind the
+page fetches of a crawler running in the same process.
+
+"""
+
+import collections
+import contextlib
+import heapq
+import itertools
+import threading
+import time
+import urlparse
+
+
+__all__ = ('Scheduler', 'priority', 'current_priority', 'INTERACTIVE',
+           'DEFAULT', 'BULK')
+
+#: The priority of the requests made by :meth:`Model.get
+#: <pyresto.core.Model.get>` unless set otherwise.
+INTERACTIVE = 'interactive'
+
+#: The priority of the requests which are not given one.
+DEFAULT = 'default'
+
+#: The priority of the page fetches of the lazy and the paged :class:`Many
+#: <pyresto.core.Many>` relations unless set otherwise.
+BULK = 'bulk'
+
+#: The default weights of the priority classes.
+WEIGHTS = {INTERACTIVE: 16, DEFAULT: 4, BULK: 1}
+
+_local = threading.local()
+
+
+def current_priority():
+    """
+    Returns the priority set for the thread with :func:`priority` or
+    ``None``.
+
+    """
+
+    stack = getattr(_local, 'stack', None)
+    return stack[-1] if stack else None
+
+
+@contextlib.contextmanager
+def priority(name):
+    """
+    A context manager setting the priority of the requests made by the thread
+    inside it, overriding the defaults of :meth:`Model.get
+    <pyresto.core.Model.get>` and the relations but not the ``priority``
+    arguments given to the calls. For instance::
+
+        with priority(BULK):
+            users = [User.get(login) for login in logins]
+
+    """
+
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = list()
+    stack.append(name)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+
+class Scheduler(object):
+    """
+    Admits the requests with weighted fair queuing between the priority
+    classes, allowing at most ``per_host`` requests to the same host at once.
+    When requests of many classes are waiting, every class gets a share of
+    the admissions in proportion to its weight, so with the default
+    :data:`WEIGHTS` an interactive request waits behind at most one bulk
+    request for every sixteen interactive ones.
+
+    """
+
+    def __init__(self, weights=None, per_host=6):
+        """
+        Constructor for the scheduler.
+
+        :param weights: (optional) The weights of the priority classes,
+                        added to the default :data:`WEIGHTS`.
+        :type weights: dict
+
+        :param per_host: (optional) The maximum number of concurrent requests
+                         to a host.
+        :type per_host: int
+
+        """
+
+        self.weights = dict(WEIGHTS, **(weights or {}))
+        self.per_host = per_host
+        self.__condition = threading.Condition()
+        self.__active = collections.defaultdict(int)
+        self.__waiting = list()
+        self.__finish = dict()
+        self.__clock = 0.0
+        self.__order = itertools.count()
+        self.__requests = collections.defaultdict(int)
+        self.__waited = collections.defaultdict(float)
+        self.__max_wait = collections.defaultdict(float)
+
+    def __dispatch(self):
+        # Admits the waiting requests in the order of their finish tags as
+        # long as their hosts have free slots
+        waiting = self.__waiting
+        blocked = list()
+        while waiting:
+            entry = heapq.heappop(waiting)
+            host = entry[2]
+            if self.__active[host] < self.per_host:
+                self.__active[host] += 1
+                self.__clock = entry[0]
+                entry[3] = True
+            else:
+                blocked.append(entry)
+
+        for entry in blocked:
+            heapq.heappush(waiting, entry)
+        self.__condition.notify_all()
+
+    def acquire(self, url, priority=None):
+        """
+        Waits until a request to the ``url`` with the ``priority``, or the
+        one set with :func:`priority`, or :data:`DEFAULT`, is admitted.
+
+        """
+
+        priority = priority or current_priority() or DEFAULT
+        if priority not in self.weights:
+            raise ValueError('Unknown priority: {0}'.format(priority))
+
+        host = urlparse.urlsplit(url).netloc
+        started = time.time()
+        with self.__condition:
+            tag = max(self.__clock, self.__finish.get(priority, 0)) + \
+                1.0 / self.weights[priority]
+            self.__finish[priority] = tag
+            entry = [tag, next(self.__order), host, False]
+            heapq.heappush(self.__waiting, entry)
+
+            self.__dispatch()
+            while not entry[3]:
+                self.__condition.wait()
+
+            waited = time.time() - started
+            self.__requests[priority] += 1
+            self.__waited[priority] += waited
+            self.__max_wait[priority] = max(self.__max_wait[priority], waited)
+
+    def release(self, url):
+        """Frees the slot taken by a request to the ``url``."""
+
+        host = urlparse.urlsplit(url).netloc
+        with self.__condition:
+            self.__active[host] -= 1
+            if not self.__active[host]:
+                del self.__active[host]
+            self.__dispatch()
+
+    @contextlib.contextmanager
+    def slot(self, url, priority=None):
+        """A context manager holding a slot for a request to the ``url``."""
+
+        self.acquire(url, priority)
+        try:
+            yield
+        finally:
+            self.release(url)
+
+    def metrics(self):
+        """
+        Returns a dictionary of the number of requests, the total and the
+        longest seconds waited for every priority, and the number of active
+        and waiting requests.
+
+        """
+
+        with self.__condition:
+            return dict(
+                priorities=dict(
+                    (name, dict(requests=self.__requests[name],
+                                waited=self.__waited[name],
+                                max_wait=self.__max_wait[name]))
+                    for name in self.__requests),
+                active=sum(self.__active.itervalues()),
+                waiting=len(self.__waiting))
@@ -0,0 +1,297 @@
+# coding: utf-8
+
+"""
+pyresto.serialize
+~~~~~~~~~~~~~~~~~
+
+This module contains a compact binary format for model graphs, which keeps
+the loaded :class:`Many <pyresto.core.Many>` and :class:`Foreign
+<pyresto.core.Foreign>` relations and the shared references between the
+models, so they can be cached or handed to other processes and used again
+without fetching anything. The models mixing in :class:`PickleMixin` are
+pickled in this format too.
+
+"""
+
+import collections
+import cPickle
+import marshal
+import sys
+import zlib
+
+from .core import (Foreign, Many, Model, Relation, WrappedList,
+                   _RELATION_STATE)
+
+
+__all__ = ('dumps', 'loads', 'PickleMixin')
+
+#: The version of the format, which is checked when loading.
+VERSION = 2
+
+# The instance attributes which are recomputed or rebound after loading
+_SKIPPED = frozenset(('_pyresto_owner', '_auth', '_session', '_cache',
+                      '_Model__pk_vals', '_Model__footprint',
+                      '_Model__current_path', '_Model__hashed_by_id'))
+
+# The markers of the tagged values, which are the references to the shared
+# objects and the models, the tuples and the values marshal cannot handle.
+# Every tuple in a field value is tagged, so the tuples of the data itself are
+# never taken for references.
+_OBJECT, _NODE, _TUPLE, _PICKLED = 0, 1, 2, 3
+
+# The types of the values marshal can handle, which are stored as they are
+_PLAIN = frozenset((type(None), bool, int, long, float, complex, str,
+                    unicode))
+
+# The first byte of the serialized data telling if the rest is compressed
+_RAW, _COMPRESSED = 'm', 'z'
+
+_MISSING = object()
+
+
+def _relations(cls):
+    # Returns the relations of the class, the ones defined on the subclasses
+    # hiding the ones on the base classes.
+    found = dict()
+    for klass in cls.__mro__:
+        for name, relation in vars(klass).iteritems():
+            if isinstance(relation, Relation) and name not in found:
+                found[name] = relation
+    return found
+
+
+def _module(name):
+    # Imports the module called name, importlib is missing on Python 2.6
+    __import__(name)
+    return sys.modules[name]
+
+
+class _Writer(object):
+    def __init__(self):
+        self.classes = list()
+        self.shapes = list()
+        self.objects = list()
+        self.nodes = list()
+        self.__class_index = dict()
+        self.__shape_index = dict()
+        self.__object_index = dict()
+        self.__node_index = dict()
+        self.__queue = collections.deque()
+
+    def __index(self, index, table, key, value):
+        position = index.get(key)
+        if position is None:
+            position = index[key] = len(table)
+            table.append(value)
+        return position
+
+    def __value(self, value):
+        # The containers are stored once so the shared ones, like the
+        # embedded objects interned by Model._interner, stay shared.
+        if value.__class__ in _PLAIN:
+            return value
+        elif isinstance(value, Model):
+            return _NODE, self.node(value, False)
+        elif isinstance(value, (dict, list)):
+            return _OBJECT, self.__index(self.__object_index, self.objects,
+                                         id(value), value)
+        elif isinstance(value, tuple):
+            return _TUPLE, tuple(self.__value(item) for item in value)
+        return _PICKLED, cPickle.dumps(value, cPickle.HIGHEST_PROTOCOL)
+
+    def node(self, model, deep=True):
+        """Returns the index of the node for the model, adding it if new."""
+
+        position = self.__node_index.get(id(model))
+        if position is None:
+            position = self.__node_index[id(model)] = len(self.nodes)
+            self.nodes.append(None)
+            self.__queue.append((model, position, deep))
+        return position
+
+    def __relations(self, model):
+        relations = list()
+        for name, relation in sorted(_relations(model.__class__).iteritems()):
+            cached = relation._cached(model, _MISSING)
+            if cached is _MISSING:
+                continue
+            elif isinstance(relation, Many):
+                if not isinstance(cached, WrappedList):
+                    continue  # lazy and paged collections are not loaded
+                cached = [(_NODE, self.node(item)) if isinstance(item, Model)
+                          else self.__value(item)
+                          for item in list.__iter__(cached)]
+            elif isinstance(relation, Foreign) and cached is not None:
+                cached = _NODE, self.node(cached)
+            relations.append((name, cached))
+        return tuple(relations)
+
+    def write(self):
+        """Builds the queued nodes and the nodes they refer to."""
+
+        while self.__queue:
+            model, position, deep = self.__queue.popleft()
+            state = model.__dict__
+            keys = tuple(sorted(
+                key for key in state if key not in _SKIPPED and
+                not key.startswith(_RELATION_STATE)))
+            klass = model.__class__
+            owner = state.get('_pyresto_owner')
+
+            self.nodes[position] = (
+                self.__index(self.__class_index, self.classes, klass,
+                             (klass.__module__, klass.__name__)),
+                self.__index(self.__shape_index, self.shapes, keys, keys),
+                tuple(self.__value(state[key]) for key in keys),
+                state.get('_Model__pk_vals'),
+                -1 if owner is None else self.node(owner, False),
+                self.__relations(model) if deep else ())
+
+    def pickle_objects(self):
+        """
+        Pickles the shared objects marshal cannot handle, such as the ones
+        holding dates, and returns their indexes.
+
+        """
+
+        pickled = list()
+        for position, value in enumerate(self.objects):
+            try:
+                marshal.dumps(value)
+            except ValueError:
+                self.objects[position] = cPickle.dumps(
+                    value, cPickle.HIGHEST_PROTOCOL)
+                pickled.append(position)
+        return tuple(pickled)
+
+
+def dumps(models, compress=1):
+    """
+    Serializes the ``models`` along with their loaded relations, the models
+    in them and their owners into a byte string. The authentication and the
+    sessions bound to the models are not serialized, see :func:`loads`. The
+    values :mod:`marshal` cannot handle, such as dates, are pickled.
+
+    :param models: The models to serialize.
+    :type models: list of :class:`Model <pyresto.core.Model>`
+
+    :param compress: (optional) The :mod:`zlib` compression level, or ``0``
+                     to not compress. The fastest level shrinks the usual
+                     API responses many times with little overhead.
+    :type compress: int
+
+    :rtype: str
+
+    """
+
+    writer = _Writer()
+    roots = tuple(writer.node(model) for model in models)
+    writer.write()
+
+    def encode(pickled):
+        return marshal.dumps((VERSION, tuple(writer.classes),
+                              tuple(writer.shapes), writer.objects, pickled,
+                              tuple(writer.nodes), roots))
+
+    try:
+        data = encode(())
+    except ValueError:  # only checked object by object when needed
+        data = encode(writer.pickle_objects())
+    if compress:
+        return _COMPRESSED + zlib.compress(data, compress)
+    return _RAW + data
+
+
+def loads(data, auth=None, session=None):
+    """
+    Restores the models serialized with :func:`dumps` and returns them in a
+    list. The models keep their fetched state and loaded relations, so
+    nothing is fetched until a relation or a field which was not loaded is
+    accessed. Like :mod:`pickle`, it must not be given untrusted data.
+
+    :param auth: (optional) The authentication to bind to the models.
+
+    :param session: (optional) The :class:`requests.Session` to bind to the
+                    models.
+
+    :rtype: list
+
+    """
+
+    if data[:1] == _COMPRESSED:
+        data = zlib.decompress(data[1:])
+    elif data[:1] == _RAW:
+        data = data[1:]
+    else:
+        raise ValueError('Not serialized with pyresto.serialize.dumps')
+
+    loaded = marshal.loads(data)
+    if loaded[0] != VERSION:
+        raise ValueError('Unsupported serialization format version '
+                         '{0}'.format(loaded[0]))
+
+    version, classes, shapes, objects, pickled, nodes, roots = loaded
+    for position in pickled:
+        objects[position] = cPickle.loads(objects[position])
+
+    classes = [getattr(_module(module), name) for module, name in classes]
+    instances = [classes[node[0]].__new__(classes[node[0]])
+                 for node in nodes]
+
+    def restore(value):
+        if value.__class__ is not tuple:
+            return value
+
+        kind, content = value
+        if kind == _OBJECT:
+            return objects[content]
+        elif kind == _NODE:
+            return instances[content]
+        elif kind == _TUPLE:
+            return tuple(map(restore, content))
+        return cPickle.loads(content)
+
+    for instance, node in zip(instances, nodes):
+        klass, shape, values, pk_vals, owner, relations = node
+        state = instance.__dict__
+        state.update(zip(shapes[shape], map(restore, values)))
+        if pk_vals is not None:
+            state['_Model__pk_vals'] = pk_vals
+        if owner >= 0:
+            state['_pyresto_owner'] = instances[owner]
+        if auth is not None:
+            state['_auth'] = auth
+        if session is not None:
+            state['_session'] = session
+
+    # the relations are cached by the instances so they can be restored only
+    # after all the instances have their primary keys
+    for instance, node in zip(instances, nodes):
+        defined = _relations(instance.__class__)
+        for name, value in node[5]:
+            relation = defined[name]
+            if isinstance(relation, Many):
+                relation._restore(instance, map(restore, value))
+            else:
+                relation._restore(instance, value and restore(value))
+
+    return [instances[position] for position in roots]
+
+
+def _load_one(data):
+    # The function pickle calls to restore a model, see PickleMixin
+    return loads(data)[0]
+
+
+class PickleMixin(object):
+    """
+    A mixin for the models to pickle in the format of :func:`dumps`, which
+    keeps their loaded relations and leaves out their bindings::
+
+        class Repo(PickleMixin, github.Repo):
+            pass
+
+    """
+
+    def __reduce__(self):
+        return _load_one, (dumps([self]),)
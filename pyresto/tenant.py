@@ -0,0 +1,326 @@
+# coding: utf-8
+
+"""
+pyresto.tenant
+~~~~~~~~~~~~~~
+
+This module contains the tenant contexts for running pyresto on behalf of
+many users at once. Every :class:`Tenant` binds its credentials to its own
+connection pool, request budget and cache, and :class:`TenantPool` runs the
+work of thousands of tenants on a shared set of threads, taking turns between
+the tenants so a busy one cannot starve the others.
+
+"""
+
+import collections
+import threading
+import time
+
+import requests
+
+
+__all__ = ('Tenant', 'TenantPool')
+
+
+class _Budget(object):
+    # A token bucket allowing rate requests per second on average, and up to
+    # burst requests at once after being idle.
+
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.__tokens = float(self.burst)
+        self.__updated = time.time()
+        self.__lock = threading.Lock()
+
+    def __refill(self, now):
+        self.__tokens = min(self.burst, self.__tokens +
+                            (now - self.__updated) * self.rate)
+        self.__updated = now
+
+    def delay(self):
+        """Returns the seconds to wait before the next request is allowed."""
+
+        if not self.rate:
+            return 0
+        with self.__lock:
+            self.__refill(time.time())
+            return max(0, (1 - self.__tokens) / self.rate)
+
+    def wait(self):
+        """Waits until a request is allowed and takes it from the budget."""
+
+        if not self.rate:
+            return 0
+        with self.__lock:
+            self.__refill(time.time())
+            self.__tokens -= 1
+            delay = max(0, -self.__tokens / self.rate)
+        if delay:
+            time.sleep(delay)
+        return delay
+
+
+class _TenantSession(requests.Session):
+    # The session of a tenant, spending the tenant's budget for every request
+    # sent through its connection pool. The models call throttle before
+    # waiting for a slot of their scheduler, so the budget is spent ahead of
+    # the next request of the thread without holding the slot.
+
+    def __init__(self, budget, **kwargs):
+        super(_TenantSession, self).__init__(**kwargs)
+        self.budget = budget
+        self.requests = 0
+        self.waited = 0.0
+        self.__paid = threading.local()
+
+    def throttle(self):
+        self.waited += self.budget.wait()
+        self.__paid.ahead = True
+
+    def request(self, *args, **kwargs):
+        if getattr(self.__paid, 'ahead', False):
+            self.__paid.ahead = False
+        else:
+            self.waited += self.budget.wait()
+        self.requests += 1
+        return super(_TenantSession, self).request(*args, **kwargs)
+
+
+class Tenant(object):
+    """
+    The context of a single user of the APIs, holding the authentication, the
+    :class:`requests.Session` with its own connection pool, the request
+    budget and optionally the cache to use for the requests made on behalf
+    of the user. The models fetched through a tenant are bound to it, and so
+    are the models fetched through their relations::
+
+        alice = Tenant(auth=github.auths.app(client_id='<CLIENT_ID>',
+                                             client_secret='<SECRET>'),
+                       rate=1)
+        repo = alice.get(github.Repo, full_name='BYK/pyresto')
+        repo.commits  # fetched as alice, within alice's budget
+
+    """
+
+    def __init__(self, auth=None, url_base=None, rate=None, burst=1,
+                 cache=None, pool_size=10):
+        """
+        Constructor for the tenant.
+
+        :param auth: (optional) The authentication object of the tenant, such
+                     as one of the auths of an API created with its keyword
+                     arguments.
+
+        :param url_base: (optional) The base URL to use instead of
+                         :attr:`Model._url_base
+                         <pyresto.core.Model._url_base>`.
+        :type url_base: string or None
+
+        :param rate: (optional) The average number of requests per second
+                     allowed for the tenant, or ``None`` for no limit.
+        :type rate: float or None
+
+        :param burst: (optional) The number of requests which can be sent at
+                      once after being idle.
+        :type burst: int
+
+        :param cache: (optional) The cache to use instead of
+                      :attr:`Model._cache <pyresto.core.Model._cache>`.
+
+        :param pool_size: (optional) The number of connections to keep open
+                          per host.
+        :type pool_size: int
+
+        """
+
+        self.auth = auth
+        self.url_base = url_base
+        self.cache = cache
+        self.budget = _Budget(rate, burst)
+        self.session = _TenantSession(self.budget, config=dict(
+            pool_connections=pool_size, pool_maxsize=pool_size))
+
+    @property
+    def _bindings(self):
+        bindings = dict(auth=self.auth, session=self.session)
+        if self.url_base is not None:
+            bindings['url_base'] = self.url_base
+        if self.cache is not None:
+            bindings['cache'] = self.cache
+        return bindings
+
+    def get(self, model, *args, **kwargs):
+        """
+        Fetches a resource of the ``model`` as the tenant, see
+        :meth:`Model.get <pyresto.core.Model.get>`.
+
+        """
+
+        for name, value in self._bindings.iteritems():
+            kwargs.setdefault(name, value)
+        return model.get(*args, **kwargs)
+
+    def create(self, model, **fields):
+        """
+        Returns a new instance of the ``model`` with the given fields bound to
+        the tenant, to be saved with :meth:`Model.save
+        <pyresto.core.Model.save>`.
+
+        """
+
+        instance = model(**fields)
+        for name, value in self._bindings.iteritems():
+            setattr(instance, '_' + name, value)
+        return instance
+
+    def metrics(self):
+        """
+        Returns a dictionary of the number of requests sent by the tenant and
+        the seconds they waited for the budget.
+
+        """
+
+        return dict(requests=self.session.requests,
+                    waited=self.session.waited)
+
+
+class _Task(object):
+    def __init__(self, func, args, kwargs):
+        self.__call = func, args, kwargs
+        self.__done = threading.Event()
+        self.__result = self.__error = None
+
+    def run(self):
+        func, args, kwargs = self.__call
+        try:
+            self.__result = func(*args, **kwargs)
+        except Exception as error:
+            self.__error = error
+        self.__done.set()
+
+    def ready(self):
+        """Tells if the task is finished."""
+
+        return self.__done.is_set()
+
+    def get(self, timeout=None):
+        """
+        Waits for the task to finish and returns its result, or raises the
+        exception it raised.
+
+        """
+
+        # Event.wait returns None on Python 2.6, check the flag instead
+        self.__done.wait(timeout)
+        if not self.__done.is_set():
+            raise RuntimeError('The task did not finish in time')
+        if self.__error is not None:
+            raise self.__error
+        return self.__result
+
+
+class TenantPool(object):
+    """
+    A pool of threads running the work of many tenants. The tenants take
+    turns: every worker takes one task of the next tenant with pending tasks
+    whose budget allows a request, so the tasks of a tenant with a long queue
+    are interleaved with the tasks of the others instead of delaying them.
+    For instance::
+
+        pool = TenantPool(concurrency=32)
+        tasks = [pool.submit(tenant, tenant.get, github.User, login)
+                 for tenant, login in work]
+        users = [task.get() for task in tasks]
+
+    """
+
+    def __init__(self, concurrency=16):
+        """
+        Constructor for the pool.
+
+        :param concurrency: (optional) The number of worker threads.
+        :type concurrency: int
+
+        """
+
+        self.concurrency = concurrency
+        self.__queues = dict()
+        self.__turns = collections.deque()
+        self.__condition = threading.Condition()
+        self.__workers = list()
+        self.__closed = False
+
+    def submit(self, tenant, func, *args, **kwargs):
+        """
+        Queues the call of ``func`` with the given arguments for the
+        ``tenant`` and returns a task whose ``get`` method returns the result.
+
+        """
+
+        task = _Task(func, args, kwargs)
+        with self.__condition:
+            if self.__closed:
+                raise RuntimeError('The pool is closed')
+
+            queue = self.__queues.get(tenant)
+            if queue is None:
+                queue = self.__queues[tenant] = collections.deque()
+                self.__turns.append(tenant)
+            queue.append(task)
+
+            if len(self.__workers) < self.concurrency:
+                worker = threading.Thread(target=self.__work)
+                worker.daemon = True
+                self.__workers.append(worker)
+                worker.start()
+            self.__condition.notify()
+
+        return task
+
+    def __next_task(self):
+        # Returns the task of the next tenant whose budget allows a request,
+        # or None and the seconds to wait for one.
+        turns = self.__turns
+        delay = None
+        for _ in xrange(len(turns)):
+            tenant = turns.popleft()
+            wait = tenant.budget.delay()
+            if wait:
+                turns.append(tenant)
+                delay = wait if delay is None else min(delay, wait)
+                continue
+
+            queue = self.__queues[tenant]
+            task = queue.popleft()
+            if queue:
+                turns.append(tenant)
+            else:
+                del self.__queues[tenant]
+            return task, None
+
+        return None, delay
+
+    def __work(self):
+        condition = self.__condition
+        while True:
+            with condition:
+                while True:
+                    task, delay = self.__next_task()
+                    if task is not None:
+                        break
+                    elif self.__closed and not self.__turns:
+                        return
+                    condition.wait(delay)
+
+            task.run()
+
+    def close(self):
+        """Stops the workers once all the submitted tasks are finished."""
+
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+        for worker in self.__workers:
+            worker.join()
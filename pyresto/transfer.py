@@ -0,0 +1,220 @@
+# coding: utf-8
+
+"""
+pyresto.transfer
+~~~~~~~~~~~~~~~~
+
+This module contains the streaming decoders for the compressed response
+bodies and the transfer metrics used by :meth:`Model._request
+<pyresto.core.Model._request>`.
+
+"""
+
+import binascii
+import collections
+import re
+import threading
+import zlib
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, only gzip and deflate are used then
+    brotli = None
+
+
+__all__ = ('ACCEPT_ENCODING', 'decoder', 'Base64FieldDecoder',
+           'TransferMetrics')
+
+
+#: The value of the ``Accept-Encoding`` header listing the content encodings
+#: which can be decoded, including ``br`` only if :mod:`brotli` is installed.
+ACCEPT_ENCODING = 'gzip, deflate, br' if brotli else 'gzip, deflate'
+
+
+class _IdentityDecoder(object):
+    def decompress(self, chunk):
+        return chunk
+
+    def flush(self):
+        return ''
+
+
+class _ZlibDecoder(object):
+    def __init__(self, wbits):
+        self.__decompressor = zlib.decompressobj(wbits)
+
+    def decompress(self, chunk):
+        return self.__decompressor.decompress(chunk)
+
+    def flush(self):
+        return self.__decompressor.flush()
+
+
+class _DeflateDecoder(_ZlibDecoder):
+    # Some servers send raw deflate streams instead of the zlib wrapped ones
+    # the standard asks for, so try the latter first and fall back if needed
+    def __init__(self):
+        super(_DeflateDecoder, self).__init__(zlib.MAX_WBITS)
+        self.__started = False
+
+    def decompress(self, chunk):
+        if self.__started:
+            return super(_DeflateDecoder, self).decompress(chunk)
+
+        self.__started = True
+        try:
+            return super(_DeflateDecoder, self).decompress(chunk)
+        except zlib.error:
+            _ZlibDecoder.__init__(self, -zlib.MAX_WBITS)
+            return super(_DeflateDecoder, self).decompress(chunk)
+
+
+class _BrotliDecoder(object):
+    def __init__(self):
+        self.__decompressor = brotli.Decompressor()
+        # the brotli and brotlipy packages name this method differently
+        self.decompress = getattr(self.__decompressor, 'process', None) or \
+            self.__decompressor.decompress
+
+    def flush(self):
+        return ''
+
+
+def decoder(content_encoding):
+    """
+    Returns a streaming decoder for the given ``Content-Encoding`` header
+    value, having a ``decompress(chunk)`` method returning the decoded part
+    of every chunk and a ``flush()`` method returning the rest. Unknown
+    encodings are passed through as they are.
+
+    """
+
+    encoding = (content_encoding or '').strip().lower()
+    if encoding in ('gzip', 'x-gzip'):
+        return _ZlibDecoder(16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        return _DeflateDecoder()
+    elif encoding == 'br' and brotli:
+        return _BrotliDecoder()
+    return _IdentityDecoder()
+
+
+class Base64FieldDecoder(object):
+    """
+    A streaming decoder with the same interface as the ones returned by
+    :func:`decoder`, which receives the chunks of a JSON body and returns the
+    decoded content of the base64 encoded string field called ``name``,
+    such as the ``data`` of a Bugzilla attachment. The other parts of the
+    body are skipped, so a payload of any size is decoded with a buffer of
+    about the size of a chunk::
+
+        stream = Base64FieldDecoder('data')
+        for chunk in chunks:
+            output.write(stream.decompress(chunk))
+        output.write(stream.flush())
+
+    The first field with the ``name`` is decoded, at whatever depth it is.
+    Line breaks in the encoded value, escaped or not, are ignored.
+
+    """
+
+    # The longest tail of a chunk which can be the start of the field
+    _lookbehind = 256
+
+    def __init__(self, name):
+        self.__start = re.compile(r'[{,]\s*"' + re.escape(name) +
+                                  r'"\s*:\s*"')
+        self.__buffer = ''
+        self.__found = False
+        self.__done = False
+
+    def __decode(self, final=False):
+        # Decodes the complete 4 character groups of the buffered value
+        value = self.__buffer.replace('\\/', '/')
+        for escape in ('\\n', '\\r', '\n', '\r'):
+            value = value.replace(escape, '')
+        if not final and value.endswith('\\'):  # escape split by a chunk
+            value, self.__buffer = value[:-1], '\\'
+        else:
+            self.__buffer = ''
+
+        usable = len(value) if final else len(value) - len(value) % 4
+        self.__buffer = value[usable:] + self.__buffer
+        try:
+            return binascii.a2b_base64(value[:usable]) if usable else ''
+        except binascii.Error as error:
+            raise ValueError('Invalid base64 data: {0}'.format(error))
+
+    def decompress(self, chunk):
+        if self.__done:
+            return ''
+
+        self.__buffer += chunk
+        if not self.__found:
+            match = self.__start.search(self.__buffer)
+            if match is None:
+                self.__buffer = self.__buffer[-self._lookbehind:]
+                return ''
+            self.__found = True
+            self.__buffer = self.__buffer[match.end():]
+
+        end = self.__buffer.find('"')
+        if end < 0:
+            return self.__decode()
+
+        self.__done = True
+        self.__buffer = self.__buffer[:end]
+        return self.__decode(final=True)
+
+    def flush(self):
+        if not self.__found:
+            raise ValueError('The body has no such field')
+        elif not self.__done:
+            raise ValueError('The body ends inside the field')
+        return ''
+
+
+class TransferMetrics(object):
+    """
+    Collects the number of bytes received over the wire and the number of
+    bytes after decoding for the requests made by the models, totalled and for
+    the most recent ``history`` requests.
+
+    """
+
+    def __init__(self, history=100):
+        self.__lock = threading.Lock()
+        self.__requests = 0
+        self.__wire = 0
+        self.__decoded = 0
+        self.__recent = collections.deque(maxlen=history)
+
+    def record(self, url, encoding, wire_bytes, decoded_bytes):
+        """
+        Records a response for the ``url`` which was received in
+        ``wire_bytes`` bytes with the content ``encoding`` and decoded into
+        ``decoded_bytes`` bytes.
+
+        """
+
+        with self.__lock:
+            self.__requests += 1
+            self.__wire += wire_bytes
+            self.__decoded += decoded_bytes
+            self.__recent.append(dict(url=url, encoding=encoding or None,
+                                      wire_bytes=wire_bytes,
+                                      decoded_bytes=decoded_bytes))
+
+    def metrics(self):
+        """
+        Returns a dictionary of the request count, the total wire and decoded
+        bytes, the overall compression ratio and the list of the most recent
+        requests with their own byte counts.
+
+        """
+
+        with self.__lock:
+            ratio = float(self.__decoded) / self.__wire if self.__wire else None
+            return dict(requests=self.__requests, wire_bytes=self.__wire,
+                        decoded_bytes=self.__decoded, ratio=ratio,
+                        recent=list(self.__recent))
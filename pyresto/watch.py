@@ -0,0 +1,273 @@
+# coding: utf-8
+
+"""
+pyresto.watch
+~~~~~~~~~~~~~
+
+This module contains the watcher which polls many models and relations for
+changes, such as thousands of repositories, branches or bugs, with as few
+requests as possible: every resource is polled at its own interval which
+adapts to how often it changes, the polls are conditional requests which are
+answered with ``304 Not Modified`` when nothing changed, and they are spaced
+to stay within a request budget.
+
+"""
+
+import collections
+import heapq
+import itertools
+import logging
+import time
+
+from .core import _VALIDATORS, Many, ServerResponseException, WrappedList
+from .scheduler import BULK
+from .tenant import _Budget
+
+
+__all__ = ('Watcher', 'change')
+
+
+#: The type of the change events holding the watched model, the name of the
+#: watched relation or ``None`` if the model itself is watched, and the
+#: changes as a dictionary. For a model, the changes map the changed field
+#: names to ``(old, new)`` value pairs. For a relation, they map the primary
+#: keys of the added, removed or changed items to ``(old, new)`` pairs of the
+#: item data, where ``old`` is ``None`` for the added items and ``new`` is
+#: ``None`` for the removed ones.
+change = collections.namedtuple('change', 'model relation changes')
+
+
+def _diff(old, new):
+    return dict((key, (old.get(key), new.get(key)))
+                for key in set(old) | set(new)
+                if old.get(key) != new.get(key))
+
+
+def _find_relation(model, name):
+    for klass in model.__class__.__mro__:
+        relation = klass.__dict__.get(name)
+        if isinstance(relation, Many):
+            return relation
+    raise AttributeError('{0} has no Many relation called {1}'.format(
+        model.__class__.__name__, name))
+
+
+class _Watch(object):
+    # The state of a watched model or relation
+
+    def __init__(self, model, relation, callback, interval):
+        self.model = model
+        self.relation = relation
+        # Many returns the model of its items when accessed on the class
+        self.cls = getattr(model.__class__, relation._name) if relation \
+            else model.__class__
+        self.callback = callback
+        self.interval = interval
+        self.validators = dict()
+        self.state = None
+        self.modified = None
+        self.active = True
+
+    @property
+    def name(self):
+        return self.relation._name if self.relation else None
+
+    @property
+    def url(self):
+        model = self.model
+        if self.relation:
+            return self.relation._url(model)
+        return model._absolute_url(model._current_path)
+
+    def poll(self):
+        # Returns the changes since the last poll, or None if not modified
+        model, cls = self.model, self.cls
+        kwargs = model._request_kwargs
+        kwargs.pop('cache', None)  # polls must reach the server
+        kwargs.setdefault('priority', BULK)
+        kwargs['headers'] = dict((header, self.validators[name])
+                                 for name, header in _VALIDATORS
+                                 if name in self.validators)
+
+        response = cls._request('GET', cls._get_sanitized_url(self.url),
+                                **kwargs)
+        if response.validators:
+            self.validators = response.validators
+        if response.body is None:
+            self.modified = False
+            return None
+        self.modified = True
+
+        data = cls._parse_body(response.body, self.relation)
+        if self.relation:
+            pk = cls._pk[-1]
+            state = dict((item.get(pk), item) for item in data)
+        else:
+            state = data
+
+        previous, self.state = self.state, state
+        if previous is None:
+            return None  # the first poll only records the state
+
+        changes = _diff(previous, state)
+        if not changes:
+            return changes
+        elif self.relation is None:
+            model._load(data)
+        elif isinstance(self.relation._cached(model), WrappedList):
+            self.relation._restore(model, data)
+        return changes
+
+
+class Watcher(object):
+    """
+    Polls the watched models and relations and reports their changes as
+    :data:`change` events, to the callbacks given to :meth:`watch` and from
+    the iterator of the watcher::
+
+        watcher = Watcher(rate=1)
+        for repo in repos:
+            watcher.watch(repo)
+            watcher.watch(repo, 'branches')
+
+        for event in watcher:
+            print event.model, event.relation, event.changes
+
+    Every resource starts with the ``interval`` between its polls. It is
+    halved when the resource changes and grown by half when it does not,
+    between ``min_interval`` and ``max_interval``, so the resources which
+    rarely change are rarely polled. The watched models are updated with the
+    changes.
+
+    """
+
+    def __init__(self, interval=60, min_interval=5, max_interval=3600,
+                 rate=None, burst=1):
+        """
+        Constructor for the watcher.
+
+        :param interval: (optional) The initial seconds between the polls of
+                         a resource.
+        :type interval: float
+
+        :param min_interval: (optional) The shortest seconds between the
+                             polls of a resource.
+        :type min_interval: float
+
+        :param max_interval: (optional) The longest seconds between the polls
+                             of a resource.
+        :type max_interval: float
+
+        :param rate: (optional) The maximum average number of polls per
+                     second, or ``None`` for no limit.
+        :type rate: float or None
+
+        :param burst: (optional) The number of polls which can be sent at
+                      once after being idle.
+        :type burst: int
+
+        """
+
+        self.interval = interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.__budget = _Budget(rate, burst)
+        self.__queue = list()
+        self.__order = itertools.count()
+        self.__metrics = collections.defaultdict(int)
+
+    def __schedule(self, watch, due):
+        heapq.heappush(self.__queue, (due, next(self.__order), watch))
+
+    def watch(self, model, relation=None, callback=None):
+        """
+        Starts watching the ``model``, or its :class:`Many
+        <pyresto.core.Many>` relation called ``relation``, and returns a
+        handle to pass to :meth:`unwatch`. The first poll is due immediately
+        and records the state to compare the later polls with.
+
+        :param callback: (optional) The function to call with every
+                         :data:`change` event of the resource.
+        :type callback: function(change)
+
+        """
+
+        many = _find_relation(model, relation) if relation else None
+        watch = _Watch(model, many, callback, self.interval)
+        self.__schedule(watch, time.time())
+        return watch
+
+    def unwatch(self, watch):
+        """Stops watching the resource of the handle returned by watch."""
+
+        watch.active = False
+
+    def __poll(self, watch):
+        self.__budget.wait()
+        self.__metrics['polls'] += 1
+        try:
+            changes = watch.poll()
+        except ServerResponseException as error:
+            logging.error('Could not poll %s: %s', watch.url, error)
+            self.__metrics['errors'] += 1
+            changes = None
+        else:
+            if not watch.modified:
+                self.__metrics['not_modified'] += 1
+
+        if changes:
+            self.__metrics['changes'] += 1
+            watch.interval = max(self.min_interval, watch.interval / 2.0)
+            event = change(watch.model, watch.name, changes)
+            if watch.callback is not None:
+                watch.callback(event)
+            return event
+
+        watch.interval = min(self.max_interval, watch.interval * 1.5)
+        return None
+
+    def poll(self):
+        """
+        Polls the resources which are due and returns the list of their
+        :data:`change` events.
+
+        """
+
+        events = list()
+        queue = self.__queue
+        now = time.time()
+        while queue and queue[0][0] <= now:
+            _, _, watch = heapq.heappop(queue)
+            if not watch.active:
+                continue
+
+            event = self.__poll(watch)
+            if event is not None:
+                events.append(event)
+            self.__schedule(watch, time.time() + watch.interval)
+
+        return events
+
+    def __iter__(self):
+        queue = self.__queue
+        while queue:
+            for event in self.poll():
+                yield event
+
+            if queue:
+                time.sleep(max(0, queue[0][0] - time.time()))
+
+    def metrics(self):
+        """
+        Returns a dictionary of the number of polls, the polls which were
+        answered with ``304 Not Modified``, the polls which found changes,
+        the failed polls, and the polls per change.
+
+        """
+
+        metrics = dict((name, self.__metrics[name]) for name in
+                       ('polls', 'not_modified', 'changes', 'errors'))
+        metrics['polls_per_change'] = (float(metrics['polls']) /
+                                       metrics['changes']
+                                       if metrics['changes'] else None)
+        return metrics
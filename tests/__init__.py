@@ -1 +1,13 @@
 # coding: utf-8
+
+from io import BytesIO
+
+from mock import Mock
+
+
+def mock_response(body, links=None, headers=None, status_code=200):
+    """Returns a mock of a streamed :class:`requests.Response`."""
+
+    return Mock(status_code=status_code, raw=BytesIO(body), text=body,
+                links=links or dict(), headers=headers or dict(),
+                encoding=None)
@@ -0,0 +1,177 @@
+# coding: utf-8
+
+import json
+import time
+
+from mock import Mock, patch
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from pyresto.batch import Batch, BatchError
+from pyresto.core import Model, Many
+
+from . import mock_response
+
+
+class Issue(Model):
+    _url_base = 'http://example.com'
+    _path = '/repo/{repo}/issues/{id}'
+    _pk = ('repo', 'id')
+
+
+class Repo(Model):
+    _url_base = 'http://example.com'
+    _path = '/repo/{id}'
+    _pk = 'id'
+    issues = Many(Issue, '/repo/{id}/issues')
+
+
+class TestWrites(unittest.TestCase):
+    def setUp(self):
+        self.responses = list()
+        self.requests = list()
+
+        def request(method, url, **kwargs):
+            self.requests.append((method, url, kwargs.get('data')))
+            if method == 'get' and url.endswith('/issues'):
+                return mock_response(json.dumps(
+                    [dict(id=1, title='a'), dict(id=2, title='b')]))
+            response = self.responses.pop(0) if self.responses else '{}'
+            if isinstance(response, int):
+                return mock_response('', status_code=response)
+            return mock_response(response)
+
+        patcher = patch('requests.request', side_effect=request)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        Repo.issues = Many(Issue, '/repo/{id}/issues')  # drop the cache
+        self.repo = Repo(id=7)
+
+    def test_patch_sends_changes_only(self):
+        issue = self.repo.issues[0]
+        self.responses.append('{"id": 1, "title": "c", "state": "closed"}')
+        issue.patch(title='c')
+
+        method, url, data = self.requests[-1]
+        self.assertEqual(method, 'patch')
+        self.assertEqual(url, 'http://example.com/repo/7/issues/1')
+        self.assertEqual(json.loads(data), dict(title='c'))
+        self.assertEqual(issue.state, 'closed')
+        self.assertFalse(issue._dirty)
+
+    def test_unchanged_is_skipped(self):
+        issue = self.repo.issues[0]
+        issue.title = 'a'
+        issue.save()
+        self.assertEqual(len(self.requests), 1)
+
+    def test_create_and_delete_update_collection(self):
+        issues = self.repo.issues
+        issue = Issue(title='new')
+        issue._bind(self.repo)
+        self.assertTrue(issue._is_new)
+
+        self.responses.append('{"id": 3, "title": "new"}')
+        issue.save()
+        self.assertEqual(self.requests[-1][:2],
+                         ('post', 'http://example.com/repo/7/issues'))
+        self.assertEqual(issue._pk_vals, (7, 3))
+        self.assertIn(issue, issues)
+
+        issues[0].delete()
+        self.assertEqual(self.requests[-1][:2],
+                         ('delete', 'http://example.com/repo/7/issues/1'))
+        self.assertEqual([i.id for i in issues], [2, 3])
+
+    def test_dirty_fields_survive_fetch(self):
+        issue = Issue(repo=7, id=1)
+        issue.title = 'changed'
+        self.responses.append('{"id": 1, "title": "a", "state": "open"}')
+        self.assertEqual(issue.state, 'open')
+        self.assertEqual(issue.title, 'changed')
+
+
+class TestBatch(unittest.TestCase):
+    def setUp(self):
+        self.calls = list()
+        self.statuses = list()
+
+        def request(method, url, **kwargs):
+            self.calls.append((method, url))
+            status = self.statuses.pop(0) if self.statuses else 200
+            return mock_response('{}', status_code=status)
+
+        patcher = patch('requests.request', side_effect=request)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.time = Mock(time=time.time)
+        patcher = patch('pyresto.batch.time', self.time)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.issues = [Issue(repo=7, id=i, title='t') for i in xrange(5)]
+        for issue in self.issues:
+            issue._pk_vals = (7, issue.id)
+            issue._fetched = True
+
+    def test_commit(self):
+        with Batch(concurrency=2) as batch:
+            for issue in self.issues[:3]:
+                batch.patch(issue, title='x')
+            batch.save(self.issues[3])  # unchanged
+            batch.save(self.issues[4])
+            batch.delete(self.issues[4])
+
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(sorted(self.calls), [
+            ('delete', 'http://example.com/repo/7/issues/4'),
+            ('patch', 'http://example.com/repo/7/issues/0'),
+            ('patch', 'http://example.com/repo/7/issues/1'),
+            ('patch', 'http://example.com/repo/7/issues/2')])
+
+    def test_retry(self):
+        self.statuses.extend([503, 429])
+        batch = Batch(concurrency=1, backoff=0.5)
+        batch.patch(self.issues[0], title='x')
+        results = batch.commit()
+
+        self.assertIsNone(results[0].error)
+        self.assertEqual(len(self.calls), 3)
+        self.assertEqual([c[0][0] for c in self.time.sleep.call_args_list],
+                         [0.5, 1.0])
+
+    def test_create_not_retried(self):
+        for status in (503, 429):
+            self.statuses.append(status)
+            del self.calls[:]
+            batch = Batch(concurrency=1, retries=1)
+            batch.save(Issue(repo=7, title='new'))
+            result = batch.commit()[0]
+
+            self.assertEqual(result.action, 'create')
+            self.assertEqual(len(self.calls), 1 if status == 503 else 2)
+
+    def test_exit_raises(self):
+        self.statuses.append(404)
+        with self.assertRaises(BatchError) as context:
+            with Batch() as batch:
+                batch.patch(self.issues[0], title='x')
+                batch.patch(self.issues[1], title='x')
+
+        error = context.exception
+        self.assertEqual(len(error.results), 2)
+        self.assertEqual([r.error.status_code for r in error.failures],
+                         [404])
+
+    def test_failure(self):
+        self.statuses.append(404)
+        batch = Batch()
+        batch.patch(self.issues[0], title='x')
+        result = batch.commit()[0]
+
+        self.assertEqual(result.action, 'update')
+        self.assertEqual(result.error.status_code, 404)
+        self.assertEqual(len(self.calls), 1)
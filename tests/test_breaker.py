@@ -0,0 +1,162 @@
+# coding: utf-8
+
+import json
+import time
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from mock import patch
+from requests.exceptions import ConnectionError
+
+from pyresto.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from pyresto.core import (CircuitOpenException, Model,
+                          ServerResponseException, raw_response)
+
+from . import mock_response
+
+
+class Bug(Model):
+    _url_base = 'http://breaker.example.com'
+    _path = '/bug/{id}'
+    _pk = 'id'
+
+
+URL = 'http://breaker.example.com/bug/1'
+
+
+def fail():
+    raise ServerResponseException('Server response not OK', 503)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.breaker = CircuitBreaker(min_requests=4, window=4,
+                                      reset_timeout=60)
+
+    def trip(self):
+        for _ in xrange(4):
+            with self.assertRaises(ServerResponseException):
+                self.breaker.call(URL, fail)
+
+    def test_opens(self):
+        self.breaker.call(URL, lambda: 'ok')
+        self.breaker.call(URL, lambda: 'ok')
+        with self.assertRaises(ServerResponseException):
+            self.breaker.call(URL, fail)
+        self.assertEqual(self.breaker.state(URL), CLOSED)
+
+        with self.assertRaises(ServerResponseException):
+            self.breaker.call(URL, fail)  # half of the last 4 failed
+        self.assertEqual(self.breaker.state(URL), OPEN)
+        calls = list()
+        with self.assertRaises(CircuitOpenException):
+            self.breaker.call(URL, lambda: calls.append(1))
+        self.assertEqual(calls, [])
+
+        # other hosts are not affected
+        self.assertEqual(self.breaker.call('http://other.example.com/',
+                                           lambda: 'ok'), 'ok')
+        metrics = self.breaker.metrics()
+        self.assertEqual((metrics['opened'], metrics['rejected']), (1, 1))
+
+    def test_client_errors(self):
+        def missing():
+            raise ServerResponseException('Server response not OK', 404)
+
+        for _ in xrange(4):
+            with self.assertRaises(ServerResponseException):
+                self.breaker.call(URL, missing)
+        self.assertEqual(self.breaker.state(URL), CLOSED)
+
+    def test_probes(self):
+        self.trip()
+        with patch('time.time', return_value=time.time() + 61):
+            self.assertEqual(self.breaker.state(URL), OPEN)
+            with self.assertRaises(ConnectionError):
+                self.breaker.call(URL, self.refuse)
+            self.assertEqual(self.breaker.state(URL), OPEN)
+
+        with patch('time.time', return_value=time.time() + 61 + 121):
+            self.assertEqual(self.breaker.call(URL, self.probe), 'ok')
+        self.assertEqual(self.breaker.state(URL), CLOSED)
+
+    def refuse(self):
+        raise ConnectionError('Connection refused')
+
+    def probe(self):
+        self.assertEqual(self.breaker.state(URL), HALF_OPEN)
+        with self.assertRaises(CircuitOpenException):
+            self.breaker.call(URL, lambda: 'second probe')
+        return 'ok'
+
+    def test_shedding(self):
+        breaker = CircuitBreaker(max_concurrent=1)
+
+        def nested():
+            return breaker.call(URL, lambda: 'inner')
+
+        with self.assertRaises(CircuitOpenException):
+            breaker.call(URL, nested)
+        self.assertEqual(breaker.metrics()['shed'], 1)
+        self.assertEqual(breaker.state(URL), CLOSED)
+
+
+class TestModelBreaker(unittest.TestCase):
+    def setUp(self):
+        Bug._breaker = CircuitBreaker(min_requests=1, window=1)
+        self.addCleanup(setattr, Bug, '_breaker', None)
+
+        self.status = 200
+        body = json.dumps(dict(id=1, summary='ok'))
+        patcher = patch('requests.request', side_effect=lambda *args, **kw:
+                        mock_response(body, status_code=self.status))
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stale(self):
+        self.assertEqual(Bug.get(1).summary, 'ok')
+        self.status = 502
+        with self.assertRaises(ServerResponseException):
+            Bug.get(1)  # opens the circuit
+
+        self.assertEqual(Bug.get(1).summary, 'ok')  # stale
+        self.assertEqual(self.request.call_count, 2)
+        with self.assertRaises(CircuitOpenException):
+            Bug.get(2)  # nothing kept
+
+        metrics = Bug._breaker.metrics()
+        self.assertEqual((metrics['stale_hits'], metrics['stale_misses']),
+                         (1, 1))
+        self.assertEqual(metrics['circuits'],
+                         {'http://breaker.example.com': OPEN})
+
+    def test_kept_as_is(self):
+        with patch('json.dumps') as dumps:
+            Bug._rest_call(URL)
+        self.assertEqual(dumps.call_count, 0)
+        self.assertEqual(Bug._breaker.stale(Bug._cache_key('GET', URL)).body,
+                         json.dumps(dict(id=1, summary='ok')))
+
+    def test_stale_size(self):
+        breaker = CircuitBreaker(stale_size=25)
+        for key in ('a', 'b', 'c'):
+            breaker.keep(key, raw_response('x' * 10, None, None))
+        self.assertIsNone(breaker.stale('a'))
+        self.assertEqual(breaker.stale('c').body, 'x' * 10)
+        breaker.keep('d', raw_response('x' * 30, None, None))  # too large
+        self.assertIsNone(breaker.stale('d'))
+
+        metrics = breaker.metrics()
+        self.assertEqual((metrics['stale_kept'], metrics['stale_size']),
+                         (2, 20))
+
+    def test_writes(self):
+        self.status = 503
+        with self.assertRaises(ServerResponseException):
+            Bug._cached_request('DELETE', URL)
+        with self.assertRaises(CircuitOpenException):
+            Bug._cached_request('DELETE', URL)
+        self.assertEqual(self.request.call_count, 1)
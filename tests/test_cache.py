@@ -0,0 +1,214 @@
+# coding: utf-8
+
+import os
+import shutil
+import tempfile
+import time
+
+from mock import Mock, patch
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from pyresto.auth import UserQSAuth
+from pyresto.cache import MemoryCache, DiskCache, StaleWhileRevalidate
+from pyresto.core import Model
+
+from . import mock_response
+
+
+class MockModel(Model):
+    _url_base = 'http://example.com'
+    _pk = 'id'
+
+
+class TestMemoryCache(unittest.TestCase):
+    def test_get_set(self):
+        cache = MemoryCache()
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 'b')
+        self.assertEqual(cache.get('a').value, 'b')
+
+    def test_ttl(self):
+        cache = MemoryCache(ttl=-1)
+        cache.set('a', 'b')
+        self.assertIsNone(cache.get('a'))
+
+    def test_lru(self):
+        cache = MemoryCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a').value, 1)
+        self.assertEqual(len(cache), 2)
+
+    def test_lru_order_after_many_uses(self):
+        cache = MemoryCache(max_entries=3)
+        for key in 'abc':
+            cache.set(key, key)
+        for _ in xrange(100):  # queues far more uses than entries
+            cache.get('a')
+            cache.get('b')
+        cache.set('b', 'b')
+        cache.set('d', 'd')
+
+        self.assertIsNone(cache.get('c'))
+        cache.set('e', 'e')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual([cache.get(key).value for key in 'bde'],
+                         ['b', 'd', 'e'])
+
+
+class TestDiskCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_shared_between_instances(self):
+        writer = DiskCache(self.path)
+        reader = DiskCache(self.path)
+        self.assertIsNone(reader.get('a'))
+
+        writer.set('a', 'first')
+        writer.set(u'b', u'ünicode')
+        self.assertEqual(reader.get('a').value, 'first')
+        self.assertEqual(reader.get('b').value.decode('utf-8'), u'ünicode')
+
+        writer.set('a', 'second')
+        self.assertEqual(reader.get('a').value, 'second')
+
+        reader.delete('a')
+        self.assertIsNone(writer.get('a'))
+
+    def test_ttl(self):
+        cache = DiskCache(self.path, ttl=-1)
+        cache.set('a', 'b')
+        cache.set('c', 'd', ttl=60)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.get('c').value, 'd')
+        self.assertEqual(len(cache), 1)
+
+    def test_compaction(self):
+        other = DiskCache(self.path)
+        cache = DiskCache(self.path, max_size=1024, compact_ratio=0.5)
+        for i in xrange(50):
+            cache.set('key{0}'.format(i), 'x' * 50)
+
+        self.assertLessEqual(os.path.getsize(self.path), 1024)
+        self.assertEqual(cache.get('key49').value, 'x' * 50)
+        self.assertIsNone(cache.get('key0'))
+        # the other instance should notice that the file was replaced
+        self.assertEqual(other.get('key49').value, 'x' * 50)
+
+    def test_private_files(self):
+        cache = DiskCache(self.path, max_size=1024, compact_ratio=0.5)
+        cache.set('a', 'b')
+        for path in (self.path, self.path + '.lock'):
+            self.assertEqual(os.stat(path).st_mode & 0o777, 0o600)
+
+        for i in xrange(50):  # the compacted file replaces the data file
+            cache.set('key{0}'.format(i), 'x' * 50)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_torn_write(self):
+        cache = DiskCache(self.path)
+        cache.set('a', 'b')
+        with open(self.path, 'ab') as f:
+            f.write('garbage')
+
+        other = DiskCache(self.path)
+        self.assertEqual(other.get('a').value, 'b')
+        other.set('c', 'd')
+        self.assertEqual(DiskCache(self.path).get('c').value, 'd')
+
+
+class TestStaleWhileRevalidate(unittest.TestCase):
+    def setUp(self):
+        self.cache = MemoryCache()
+        self.fetch = Mock(side_effect=['first', 'second'])
+
+    def test_fresh(self):
+        policy = StaleWhileRevalidate(soft_ttl=60, hard_ttl=120)
+        self.assertEqual(policy.get(self.cache, 'a', self.fetch), 'first')
+        self.assertEqual(policy.get(self.cache, 'a', self.fetch), 'first')
+        self.assertEqual(self.fetch.call_count, 1)
+
+        metrics = policy.metrics()
+        self.assertEqual(metrics['misses'], 1)
+        self.assertEqual(metrics['hits'], 1)
+
+    def test_stale(self):
+        policy = StaleWhileRevalidate(soft_ttl=0, hard_ttl=120)
+        self.assertEqual(policy.get(self.cache, 'a', self.fetch), 'first')
+        # stale values are served immediately and refreshed in background
+        self.assertEqual(policy.get(self.cache, 'a', self.fetch), 'first')
+        policy.join()
+        self.assertEqual(self.cache.get('a').value, 'second')
+
+        metrics = policy.metrics()
+        self.assertEqual(metrics['stale_hits'], 1)
+        self.assertEqual(metrics['refreshes'], 1)
+        self.assertGreaterEqual(metrics['refresh_lag_max'], 0)
+
+    def test_deduplication(self):
+        policy = StaleWhileRevalidate(soft_ttl=0, hard_ttl=120)
+        self.cache.set('a', 'first')
+        policy._StaleWhileRevalidate__in_flight.add('a')
+        policy.get(self.cache, 'a', self.fetch)
+        self.assertEqual(policy.metrics()['deduplicated'], 1)
+        self.assertEqual(self.fetch.call_count, 0)
+
+    def test_hard_ttl(self):
+        policy = StaleWhileRevalidate(soft_ttl=0, hard_ttl=-1)
+        self.assertEqual(policy.get(self.cache, 'a', self.fetch), 'first')
+        self.assertEqual(policy.get(self.cache, 'a', self.fetch), 'second')
+        self.assertEqual(policy.metrics()['misses'], 2)
+
+
+class TestRestCallCache(unittest.TestCase):
+    def setUp(self):
+        MockModel._cache = MemoryCache()
+        patcher = patch('requests.request', side_effect=lambda *args, **kw:
+                        mock_response('{"id": 1}'))
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        del MockModel._cache
+
+    def test_get_is_cached(self):
+        self.assertEqual(MockModel._rest_call('/a').data, {'id': 1})
+        self.assertEqual(MockModel._rest_call('/a').data, {'id': 1})
+        self.assertEqual(self.request.call_count, 1)
+
+        MockModel._rest_call('/a', auth=('user', 'pass'))
+        self.assertEqual(self.request.call_count, 2)
+
+    def test_auth_fingerprint(self):
+        alice = UserQSAuth('alice', 'secret')
+        MockModel._rest_call('/a', auth=alice)
+        MockModel._rest_call('/a', auth=UserQSAuth('alice', 'secret'))
+        self.assertEqual(self.request.call_count, 1)
+        MockModel._rest_call('/a', auth=UserQSAuth('bob', 'secret'))
+        self.assertEqual(self.request.call_count, 2)
+
+    def test_unknown_auth_is_not_cached(self):
+        def token(user):
+            return lambda request: request
+
+        MockModel._rest_call('/a', auth=token('alice'))
+        MockModel._rest_call('/a', auth=token('bob'))
+        self.assertEqual(self.request.call_count, 2)
+        self.assertEqual(len(MockModel._cache), 0)
+
+    def test_writes_are_not_cached(self):
+        MockModel._rest_call('/a', method='POST')
+        MockModel._rest_call('/a', method='POST')
+        self.assertEqual(self.request.call_count, 2)
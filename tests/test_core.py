@@ -1,15 +1,26 @@
 # coding: utf-8
 
-from mock import Mock
+import datetime
+import json
+import urlparse
+
+from collections import namedtuple
+
+from mock import Mock, patch
 try:
     import unittest2 as unittest
 except ImportError:
     import unittest
 
-from pyresto.core import Model, Many, WrappedList, LazyList
+from pyresto.core import (Model, Many, WrappedList, LazyList, PagedList,
+                          _merge_query, compile_path)
+from pyresto.paging import PageSizer
+
+from . import mock_response
 
 
 class MockModel(Model):
+    _url_base = 'http://example.com'
     _pk = 'id'
 
 
@@ -24,6 +35,30 @@ class TestModelBase(unittest.TestCase):
         with self.assertRaises(TypeError):
             IdlessModel()
 
+    def test_path_template(self):
+        self.assertEqual(MockModel._path_template(dict(id=5)), '/mockmodel/5')
+
+        class PathModel(Model):
+            _pk = 'id'
+            _path = '/path/{id}'
+
+        self.assertEqual(PathModel._path_template(dict(id=5)), '/path/5')
+        PathModel._path = '/other/{id}'
+        self.assertEqual(PathModel._path_template(dict(id=5)), '/other/5')
+
+
+class TestCompilePath(unittest.TestCase):
+    def test_equivalence(self):
+        owner = MockModel(id=3)
+        mapping = dict(id=5, name=u'ü', self=owner, items=dict(a=1))
+        for template in ('/plain', u'/a/{id}/{name}?x=%2F', '{self._id}/b',
+                         '{items[a]}', '{id!r:>4}', u'/ü/{name}'):
+            self.assertEqual(compile_path(template)(mapping),
+                             template.format(**mapping))
+
+        with self.assertRaises(KeyError):
+            compile_path('/{missing}')(mapping)
+
 
 class TestWrappedList(unittest.TestCase):
     def setUp(self):
@@ -76,6 +111,52 @@ class TestWrappedList(unittest.TestCase):
         self.assertIn(MockModel(**self.list[1]), self.instance)
 
 
+class TestWrappedListIndex(unittest.TestCase):
+    def setUp(self):
+        self.wrapper = Mock(side_effect=lambda d: d if isinstance(d, MockModel)
+                            else MockModel(**d))
+        self.list = [{'id': i} for i in xrange(5)]
+        self.instance = WrappedList(self.list, self.wrapper, 'id')
+
+    def test_contains(self):
+        self.assertIn(MockModel(id=3), self.instance)
+        self.assertNotIn(MockModel(id=7), self.instance)
+        # only the matching item should be wrapped
+        self.assertEqual(self.wrapper.call_count, 1)
+        self.assertNotIn(self.list[1], self.instance)
+
+    def test_get_by_pk(self):
+        self.assertEqual(self.instance.get_by_pk(2).id, 2)
+        self.assertIsNone(self.instance.get_by_pk(7))
+        self.assertEqual(self.wrapper.call_count, 1)
+
+    def test_incremental_index(self):
+        self.assertNotIn(MockModel(id=5), self.instance)
+        self.instance.append({'id': 5})
+        self.assertIn(MockModel(id=5), self.instance)
+
+        self.instance.insert(0, {'id': 6})
+        self.assertEqual(self.instance.get_by_pk(5).id, 5)
+        self.assertEqual(self.instance.get_by_pk(0).id, 0)
+
+        del self.instance[0]
+        self.assertIsNone(self.instance.get_by_pk(6))
+
+    def test_intersection(self):
+        other = WrappedList([{'id': 3}, {'id': 4}, {'id': 9}], self.wrapper,
+                            'id')
+        common = self.instance & other
+        self.assertIsInstance(common, WrappedList)
+        self.assertEqual([item.id for item in common], [3, 4])
+        self.assertEqual(self.instance.intersection(set([0])).pks(),
+                         set([0]))
+
+    def test_hash(self):
+        self.assertEqual(hash(MockModel(id=1)), hash(MockModel(id=1)))
+        self.assertEqual(len(set([MockModel(id=1), MockModel(id=1),
+                                  MockModel(id=2)])), 2)
+
+
 class TestLazyList(unittest.TestCase):
     def setUp(self):
         self.wrapper = Mock(side_effect=lambda d: d if isinstance(d, MockModel)
@@ -91,6 +172,60 @@ class TestLazyList(unittest.TestCase):
                 self.assertEqual(item.id, orig['id'])
 
 
+class TestPagedList(unittest.TestCase):
+    def setUp(self):
+        self.wrapper = Mock(side_effect=lambda d: d if isinstance(d, MockModel)
+                            else MockModel(**d))
+        self.list = [{'id': i} for i in xrange(10)]
+        self.fetcher = Mock(side_effect=lambda page: (
+            self.list[(page - 1) * 3:page * 3], 4))
+        self.instance = PagedList(self.wrapper, self.fetcher, max_pages=2,
+                                  pk='id')
+
+    def test_get_item(self):
+        self.assertEqual(self.instance[0].id, 0)
+        self.assertEqual(self.instance[4].id, 4)
+        self.fetcher.assert_any_call(1)
+        self.fetcher.assert_any_call(2)
+        self.assertEqual(self.fetcher.call_count, 2)
+
+        with self.assertRaises(IndexError):
+            self.instance[12]
+
+    def test_len(self):
+        self.assertEqual(len(self.instance), 10)
+        # only the first and the last pages should be fetched
+        self.assertEqual(self.fetcher.call_count, 2)
+        self.assertEqual(self.instance[-1].id, 9)
+        self.assertEqual(self.fetcher.call_count, 2)
+
+    def test_get_slice(self):
+        self.assertEqual([i.id for i in self.instance[2:5]], [2, 3, 4])
+        self.assertEqual([i.id for i in self.instance[8:20]], [8, 9])
+        self.assertEqual([i.id for i in self.instance[-2:]], [8, 9])
+
+    def test_eviction(self):
+        self.instance[4]
+        self.instance[7]
+        self.instance[4]  # page 2 should have been evicted
+        self.assertEqual(self.fetcher.call_count, 4)
+
+    def test_iterator(self):
+        self.assertEqual([i.id for i in self.instance], range(10))
+
+    def test_index(self):
+        self.assertEqual(self.instance.get_by_pk(4).id, 4)
+        self.assertEqual(self.fetcher.call_count, 2)
+        self.assertIn(MockModel(id=9), self.instance)
+        self.assertEqual(self.instance.pks(), set(xrange(10)))
+
+    def test_unknown_page_count(self):
+        self.fetcher.side_effect = lambda page: (
+            self.list[(page - 1) * 3:page * 3], 4 if page == 4 else None)
+        self.assertEqual(len(self.instance), 10)
+        self.assertEqual(self.fetcher.call_count, 4)
+
+
 class TestManyLazy(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
@@ -171,9 +306,404 @@ class TestManyList(unittest.TestCase):
         del MockModel.list_many
 
 
+class TestManyPaged(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.list = ({'id': 1}, {'id': 2})
+        MockModel.paged_many = Many(MockModel, '/many?per_page=1', paged=True)
+
+    def setUp(self):
+        links = dict(last=dict(url='/many?per_page=1&page=2'),
+                     next=dict(url='/many?per_page=1&page=2'))
+        patcher = patch('requests.request', side_effect=lambda *args, **kw:
+                        mock_response('[{"id": 1}]', links))
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.instance = MockModel(id=13)
+
+    def test_get_item(self):
+        self.assertEqual(self.instance.paged_many[0].id, 1)
+        self.assertEqual(self.request.call_count, 1)
+        url = self.request.call_args[0][1]
+        self.assertTrue(url.endswith('/many?per_page=1&page=1'))
+
+    def test_page_cache(self):
+        fetched = list()
+
+        def fetch(page):
+            fetched.append(page)
+            return [dict(id=page)], 4
+
+        paged = PagedList(lambda item: item, fetch, max_pages=2)
+        self.assertEqual([paged[index]['id'] for index in (0, 1, 2, 1, 0, 3)],
+                         [1, 2, 3, 2, 1, 4])
+        # the first page is always kept, the others are least recently used
+        self.assertEqual(fetched, [1, 2, 3, 2, 4])
+
+    @classmethod
+    def tearDownClass(cls):
+        del MockModel.paged_many
+
+
+class TestGitHubRelations(unittest.TestCase):
+    def test_lists(self):
+        from pyresto.apis.github.models import User
+
+        body = json.dumps([dict(name='a'), dict(name='b')])
+        with patch('requests.request',
+                   side_effect=lambda *args, **kwargs: mock_response(body)):
+            repos = User(login='byk').repos
+
+        self.assertIsInstance(repos, list)
+        repos.append(repos[0])
+        self.assertEqual(len(repos + [repos[0]]), 4)
+        self.assertEqual([repo.name for repo in repos], ['a', 'b', 'a'])
+
+    def test_paged(self):
+        from pyresto.apis.github.models import User
+
+        def respond(method, url, **kwargs):
+            page = int(urlparse.parse_qs(urlparse.urlsplit(url).query)[
+                'page'][0])
+            last = url.replace('page={0}'.format(page), 'page=3')
+            return mock_response(json.dumps([dict(name='r{0}'.format(page)),
+                                             dict(name='s')]),
+                                 dict(last=dict(url=last)))
+
+        with patch('requests.request', side_effect=respond) as request:
+            repos = User(login='byk').paged('repos')
+            self.assertEqual(repos[0].name, 'r1')
+            self.assertEqual(len(repos), 6)
+            self.assertEqual(repos[4].name, 'r3')
+
+        self.assertIsInstance(repos, PagedList)
+        self.assertEqual(request.call_count, 2)  # the first and last pages
+
+
+class TestManySized(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        MockModel._page_size_param = 'per_page'
+        MockModel.sized_many = Many(MockModel, '/many?per_page=100',
+                                    lazy=True)
+
+    def setUp(self):
+        def request(method, url, **kwargs):
+            query = dict(urlparse.parse_qsl(urlparse.urlsplit(url).query))
+            page, per_page = int(query['page']), int(query['per_page'])
+            start = (page - 1) * per_page
+            items = [dict(id=i) for i in xrange(start,
+                                                min(start + per_page, 120))]
+            links = dict()
+            if start + per_page < 120:
+                links['next'] = dict(url='/many?page={0}'.format(page + 1))
+            return mock_response(json.dumps(items), links)
+
+        patcher = patch('requests.request', side_effect=request)
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.instance = MockModel(id=13)
+
+    def test_iterator(self):
+        ids = [item.id for item in self.instance.sized_many]
+        self.assertEqual(ids, range(120))
+
+        sizes = [dict(urlparse.parse_qsl(urlparse.urlsplit(
+            call[0][1]).query))['per_page']
+            for call in self.request.call_args_list]
+        self.assertEqual(sizes, ['25', '25', '50', '100'])
+
+        metrics = vars(MockModel)['sized_many'].page_sizer.metrics()
+        self.assertEqual(metrics['items'], 120)
+        self.assertEqual(metrics['sizes'], {25: 2, 50: 1, 100: 1})
+
+    def test_override(self):
+        vars(MockModel)['sized_many'].page_sizer = PageSizer(initial=60)
+        self.assertEqual(len(list(self.instance.sized_many)), 120)
+        self.assertEqual(self.request.call_count, 2)
+
+    @classmethod
+    def tearDownClass(cls):
+        del MockModel.sized_many
+        del MockModel._page_size_param
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        MockModel.query_many = Many(MockModel, '/many?per_page=2', lazy=True)
+        self.addCleanup(delattr, MockModel, 'query_many')
+
+        @classmethod
+        def filter_path(cls, path, filters):
+            pushed = dict((k, v) for k, v in filters.iteritems() if k == 'a')
+            remaining = dict((k, v) for k, v in filters.iteritems()
+                             if k != 'a')
+            return _merge_query(path, pushed), remaining
+
+        MockModel._filter_path = filter_path
+        self.addCleanup(delattr, MockModel, '_filter_path')
+
+        self.urls = list()
+
+        def request(method, url, **kwargs):
+            self.urls.append(url)
+            page = [dict(id=1, a=1, b=1), dict(id=2, a=1, b=2)] \
+                if '&page=' not in url else [dict(id=3, a=1, b=2)]
+            links = dict(next=dict(url=url + '&page=2')) \
+                if '&page=' not in url else None
+            return mock_response(json.dumps(page), links)
+
+        patcher = patch('requests.request', side_effect=request)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.instance = MockModel(id=1)
+
+    def test_pushdown(self):
+        query = self.instance.query_many.filter(a=1).filter(b=2)
+        self.assertEqual(query.explain(), dict(
+            path='/many?per_page=2&a=1', pushed=['a'], client=['b']))
+        self.assertEqual([item.id for item in query], [2, 3])
+        self.assertEqual(self.urls, ['http://example.com/many?per_page=2&a=1',
+                                     'http://example.com/many?per_page=2&a=1'
+                                     '&page=2'])
+        self.assertEqual(query.metrics(), dict(fetched=3, matched=2))
+
+    def test_callable(self):
+        query = self.instance.query('query_many').filter(
+            a=lambda value: value > 0, id=3)
+        self.assertEqual(query.explain()['client'], ['a', 'id'])
+        self.assertEqual([item.id for item in query], [3])
+
+    def test_resume(self):
+        query = self.instance.query_many.filter(b=2)
+        cursor = query.cursor()
+        self.assertEqual(next(cursor).id, 2)
+        self.assertEqual([item.id for item in query.cursor(cursor.state())],
+                         [3])
+
+    def test_merge_query(self):
+        self.assertEqual(
+            _merge_query(u'/c?sha=a&per_page=100', dict(
+                sha='b', labels=['x', 'y'], draft=False,
+                since=datetime.datetime(2012, 7, 1, 12))),
+            '/c?per_page=100&draft=false&labels=x,y'
+            '&sha=b&since=2012-07-01T12%3A00%3A00Z')
+
+    def test_apis(self):
+        from pyresto.apis.bugzilla.models import Bug
+        from pyresto.apis.github.models import Commit
+
+        self.assertEqual(Commit._filter_path(
+            '/repos/r/commits?per_page=100', dict(author='byk', x=1)),
+            ('/repos/r/commits?per_page=100&author=byk', dict(x=1)))
+        self.assertEqual(Commit._filter_path('/repos/r/watched', dict(x=1)),
+                         ('/repos/r/watched', dict(x=1)))
+        self.assertEqual(Bug._filter_path('bug?product=Core',
+                                          dict(status='NEW')),
+                         ('bug?product=Core&status=NEW', dict()))
+        # summary searches match substrings, so it is filtered client side
+        self.assertEqual(Bug._filter_path('bug', dict(status='NEW',
+                                                      summary='crash')),
+                         ('bug?status=NEW', dict(summary='crash')))
+        self.assertEqual(Bug._filter_path('bug', dict(summary='crash')),
+                         ('bug', dict(summary='crash')))
+        self.assertEqual(Bug._filter_path('bug/1?include_fields=comments',
+                                          dict(creator='a')),
+                         ('bug/1?include_fields=comments', dict(creator='a')))
+
+    def test_bugzilla_search(self):
+        from pyresto.apis.bugzilla.models import Bug, BugzillaModel
+
+        class Product(BugzillaModel):
+            _path = 'product/{name}'
+            _pk = 'name'
+            bugs = Many(Bug, 'bug?product={name}', lazy=True,
+                        preprocessor=lambda data: data['bugs'])
+
+        bugs = [dict(id=1, status='NEW', summary='crash on start'),
+                dict(id=2, status='NEW', summary='crash')]
+        with patch('requests.request', side_effect=lambda *args, **kwargs:
+                   mock_response(json.dumps(dict(bugs=bugs)))) as request:
+            product = Product(name='Core')
+            product._url_base = 'http://bugzilla.example.com/rest/'
+            query = product.bugs.filter(status='NEW', summary='crash')
+            self.assertEqual([bug.id for bug in query], [2])
+
+        self.assertEqual(query.explain()['client'], ['summary'])
+        self.assertEqual(request.call_args[0][1],
+                         'http://bugzilla.example.com/rest/bug?product=Core'
+                         '&status=NEW')
+
+
+class TestBugzillaServices(unittest.TestCase):
+    def test_bound_classes(self):
+        from pyresto.apis.bugzilla import mozilla, mozilla_test, models
+
+        class MyBug(mozilla.Bug):
+            pass
+
+        self.assertTrue(issubclass(mozilla.Bug, models.Bug))
+        self.assertIs(mozilla.Bug, mozilla.Bug)
+
+        def respond(method, url, **kwargs):
+            if url.endswith('include_fields=blocks'):
+                return mock_response(json.dumps(dict(blocks=[2])))
+            return mock_response(json.dumps(dict(id=1)))
+
+        with patch('requests.request', side_effect=respond) as request:
+            bug = MyBug.get('1')
+            blocked = bug.blocks[0]
+
+        self.assertTrue(request.call_args[0][1].startswith(mozilla.url))
+        self.assertIsInstance(bug, MyBug)
+        self.assertIsInstance(bug, mozilla.Bug)
+        self.assertNotIsInstance(bug, mozilla_test.Bug)
+        self.assertIs(bug._session, mozilla.session)
+
+        # fetched through a relation, so an instance of the shared class
+        self.assertIs(blocked.__class__, models.Bug)
+        self.assertIsInstance(blocked, mozilla.Bug)
+        self.assertNotIsInstance(blocked, MyBug)
+        self.assertNotIsInstance(blocked, mozilla_test.Bug)
+        self.assertNotIsInstance(models.Bug(id=2), mozilla.Bug)
+        self.assertEqual(blocked, mozilla.Bug(id=2))
+        self.assertEqual(mozilla.Bug(id=2)._url_base, mozilla.url)
+
+
 class TestForeign(unittest.TestCase):
     pass
 
 
 class TestModel(unittest.TestCase):
-    pass
+    def test_bindings(self):
+        result = namedtuple('result', 'data continuation_url')
+        MockModel.bound_many = Many(MockModel, '{self._current_path}/many')
+        self.addCleanup(delattr, MockModel, 'bound_many')
+
+        @classmethod
+        def rest_call_mock(cls, url, **kwargs):
+            self.assertEqual(kwargs['session'], 'session')
+            if url == 'http://other.com/mockmodel/1':
+                return result(dict(id=1), None)
+            self.assertEqual(url, 'http://other.com/mockmodel/1/many')
+            return result([dict(id=2)], None)
+
+        MockModel._rest_call = rest_call_mock
+        self.addCleanup(delattr, MockModel, '_rest_call')
+
+        instance = MockModel.get(1, url_base='http://other.com',
+                                 session='session')
+        child = instance.bound_many[0]
+        self.assertEqual(child._url_base, 'http://other.com')
+        self.assertEqual(child._session, 'session')
+        self.assertNotEqual(child, MockModel(id=2))
+
+    def test_get_fields(self):
+        result = namedtuple('result', 'data continuation_url')
+        calls = list()
+
+        @classmethod
+        def rest_call_mock(cls, url, **kwargs):
+            calls.append(url)
+            return result(dict(id=1, a=1, b=2, c=3), None)
+
+        MockModel._rest_call = rest_call_mock
+        self.addCleanup(delattr, MockModel, '_rest_call')
+
+        instance = MockModel.get(1, fields=('a',))
+        self.assertEqual(instance.__dict__.get('a'), 1)
+        self.assertNotIn('b', instance.__dict__)
+        # a missing field should trigger a full fetch
+        self.assertEqual(instance.b, 2)
+        self.assertEqual(len(calls), 2)
+
+    def test_get_fields_projected(self):
+        result = namedtuple('result', 'data continuation_url')
+        urls = list()
+
+        @classmethod
+        def rest_call_mock(cls, url, **kwargs):
+            urls.append(url)
+            return result(dict(id=1, a=1), None)
+
+        MockModel._rest_call = rest_call_mock
+        MockModel._project_path = classmethod(
+            lambda cls, path, fields: path + '?fields=' + ','.join(fields))
+        self.addCleanup(delattr, MockModel, '_rest_call')
+        self.addCleanup(delattr, MockModel, '_project_path')
+
+        MockModel.get(1, fields=('a',))
+        self.assertEqual(urls, ['/mockmodel/1?fields=a'])
+
+    def test_related_fields(self):
+        result = namedtuple('result', 'data continuation_url')
+        MockModel.fields_many = Many(MockModel, '/many')
+        self.addCleanup(delattr, MockModel, 'fields_many')
+
+        @classmethod
+        def rest_call_mock(cls, url, **kwargs):
+            return result([dict(id=2, a=1, b=2)], None)
+
+        MockModel._rest_call = rest_call_mock
+        self.addCleanup(delattr, MockModel, '_rest_call')
+
+        items = MockModel(id=1).related('fields_many', fields=('a',))
+        self.assertEqual(items[0].__dict__.get('a'), 1)
+        self.assertNotIn('b', items[0].__dict__)
+
+        with self.assertRaises(AttributeError):
+            MockModel(id=1).related('missing')
+
+    def test_new_model_hash(self):
+        new = MockModel(title='x')
+        self.assertEqual(hash(new), id(new))
+        self.assertNotEqual(new, MockModel(title='x'))
+        self.assertEqual(len(set([new, new, MockModel(id=1)])), 2)
+
+    def test_saved_model_hash(self):
+        new = MockModel(title='x')
+        models = set([new])
+        new.id = 1  # as assigned by save()
+
+        # hashed before it had a pk, so it keeps its identity for good
+        self.assertIn(new, models)
+        self.assertEqual(hash(new), id(new))
+        self.assertNotEqual(new, MockModel(id=1))
+        self.assertNotEqual(MockModel(id=1), new)
+        self.assertEqual(MockModel(id=1), MockModel(id=1))
+
+    def test_relations_per_instance(self):
+        result = namedtuple('result', 'data continuation_url')
+        MockModel.own_many = Many(MockModel, '/many/{id}')
+        self.addCleanup(delattr, MockModel, 'own_many')
+        responses = [[dict(id=2)], [dict(id=3)]]
+
+        @classmethod
+        def rest_call_mock(cls, url, **kwargs):
+            return result(responses.pop(0), None)
+
+        MockModel._rest_call = rest_call_mock
+        self.addCleanup(delattr, MockModel, '_rest_call')
+
+        first, again = MockModel(id=1), MockModel(id=1)
+        self.assertEqual(first, again)
+        self.assertEqual(first.own_many[0].id, 2)
+        # an equal instance fetched again does not see the stale relation
+        self.assertEqual(again.own_many[0].id, 3)
+        self.assertEqual(first.own_many[0].id, 2)
+
+    def test_bugzilla_projection(self):
+        from pyresto.apis.bugzilla.models import Bug, Comment
+
+        self.assertEqual(Bug._project_path(
+            'bug/1?include_fields=_all&exclude_fields=comments', ('summary',)),
+            'bug/1?include_fields=id,summary')
+        # the relations select a field of the bug and are pruned client side
+        self.assertIsNone(Comment._project_path(
+            'bug/1?include_fields=comments', ('text',)))
+
+    def test_current_path(self):
+        instance = MockModel(id=1)
+        self.assertEqual(instance._current_path, '/mockmodel/1')
+        instance._pk_vals = (2,)
+        self.assertEqual(instance._current_path, '/mockmodel/2')
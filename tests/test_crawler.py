@@ -0,0 +1,78 @@
+# coding: utf-8
+
+from collections import namedtuple
+
+from mock import Mock
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from pyresto.core import Model, Many
+from pyresto.crawler import crawl, load_many
+
+
+result = namedtuple('result', 'data continuation_url')
+
+# node -> dependencies
+GRAPH = {1: [2, 3], 2: [4], 3: [4, 1], 4: [5], 5: []}
+
+
+class Node(Model):
+    _url_base = 'http://example.com'
+    _pk = 'id'
+
+    @classmethod
+    def _rest_call(cls, url, **kwargs):
+        node_id = int(url.split('/')[2])
+        if url.endswith('/deps'):
+            return result([dict(id=i) for i in GRAPH[node_id]], None)
+        return result(dict(id=node_id, name='node{0}'.format(node_id)), None)
+
+
+Node.deps = Many(Node, '/node/{id}/deps')
+
+
+class TestCrawl(unittest.TestCase):
+    def test_visits_each_node_once(self):
+        nodes = list(crawl([Node(id=1)], ('deps',)))
+        self.assertEqual(sorted(node.id for node, depth in nodes),
+                         [1, 2, 3, 4, 5])
+        depths = dict((node.id, depth) for node, depth in nodes)
+        self.assertEqual(depths, {1: 0, 2: 1, 3: 1, 4: 2, 5: 3})
+
+    def test_limits(self):
+        nodes = list(crawl([Node(id=1)], ('deps',), max_depth=1))
+        self.assertEqual(sorted(node.id for node, depth in nodes), [1, 2, 3])
+
+        nodes = list(crawl([Node(id=1)], ('deps',), max_nodes=2))
+        self.assertEqual(len(nodes), 2)
+
+    def test_unknown_relation(self):
+        nodes = list(crawl([Node(id=1)], ('missing',)))
+        self.assertEqual(len(nodes), 1)
+
+
+class TestLoadMany(unittest.TestCase):
+    def tearDown(self):
+        if '_fetch_many' in Node.__dict__:
+            del Node._fetch_many
+
+    def test_batches(self):
+        fetch_many = Mock(side_effect=lambda ids, **kwargs: [
+            dict(id=i, name='batch{0}'.format(i)) for i in ids])
+        Node._fetch_many = staticmethod(fetch_many)
+
+        nodes = [Node(id=i) for i in xrange(5)]
+        load_many(nodes, batch_size=2)
+
+        self.assertEqual(fetch_many.call_count, 3)
+        self.assertEqual([node.name for node in nodes],
+                         ['batch{0}'.format(i) for i in xrange(5)])
+        self.assertTrue(all(node._fetched for node in nodes))
+
+    def test_fallback(self):
+        nodes = [Node(id=i) for i in xrange(3)]
+        load_many(nodes)
+        self.assertEqual([node.name for node in nodes],
+                         ['node{0}'.format(i) for i in xrange(3)])
@@ -0,0 +1,143 @@
+# coding: utf-8
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import urlparse
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from mock import patch
+
+from pyresto.core import Many, Model
+from pyresto.distribute import PageQueue, resume
+
+from . import mock_response
+
+
+class Commit(Model):
+    _url_base = 'http://distribute.example.com'
+    _path = '/repos/{repo}/commits/{sha}'
+    _pk = ('repo', 'sha')
+
+
+class Repo(Model):
+    _url_base = 'http://distribute.example.com'
+    _path = '/repos/{name}'
+    _pk = 'name'
+
+    commits = Many(Commit, '/repos/{name}/commits', lazy=True)
+
+
+class Server(object):
+    # Serves 3 pages of 2 commits, with the link to the last page if counted
+
+    def __init__(self, counted):
+        self.counted = counted
+        self.urls = list()
+        self.headers = list()
+
+    def __call__(self, method, url, headers=None, **kwargs):
+        self.urls.append(url)
+        self.headers.append(headers)
+        base, _, query = url.partition('?')
+        page = int(urlparse.parse_qs(query).get('page', ['1'])[0])
+        links = dict()
+        if page < 3:
+            links['next'] = dict(url='{0}?page={1}'.format(base, page + 1))
+        if self.counted:
+            links['last'] = dict(url=base + '?page=3')
+        body = [dict(sha=str(i)) for i in xrange(page * 2 - 2, page * 2)]
+        return mock_response(json.dumps(body), links=links)
+
+
+class TestCursor(unittest.TestCase):
+    def setUp(self):
+        Repo.commits = Many(Commit, '/repos/{name}/commits', lazy=True)
+        self.server = Server(counted=False)
+        patcher = patch('requests.request', side_effect=self.server)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resume(self):
+        cursor = Repo(name='r').commits.cursor()
+        self.assertEqual([next(cursor).sha for _ in xrange(3)],
+                         ['0', '1', '2'])
+
+        state = json.loads(json.dumps(cursor.state()))
+        self.assertEqual(state['relation'], 'commits')
+        self.assertEqual(state['skip'], 1)
+
+        Repo.commits = Many(Commit, '/repos/{name}/commits', lazy=True)
+        del self.server.urls[:]
+        self.assertEqual([c.sha for c in resume(state)], ['3', '4', '5'])
+        self.assertEqual(self.server.urls, [
+            'http://distribute.example.com/repos/r/commits?page=2',
+            'http://distribute.example.com/repos/r/commits?page=3'])
+
+    def test_page_boundary(self):
+        cursor = iter(Repo(name='r').commits)
+        self.assertEqual([next(cursor).sha for _ in xrange(2)], ['0', '1'])
+        state = cursor.state()
+        self.assertEqual(state['skip'], 0)
+        self.assertEqual([c.sha for c in resume(state)], ['2', '3', '4', '5'])
+
+    def test_finished(self):
+        cursor = Repo(name='r').commits.cursor()
+        list(cursor)
+        self.assertIsNone(cursor.state()['position'])
+        self.assertEqual(list(resume(cursor.state())), [])
+
+
+class TestPageQueue(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'pages.db')
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def scan(self, counted, workers=2):
+        server = Server(counted)
+        pages = list()
+
+        def work():
+            queue = PageQueue(self.path, Repo(name='r'), 'commits', poll=0.01)
+            pages.extend(queue)
+
+        with patch('requests.request', side_effect=server):
+            threads = [threading.Thread(target=work) for _ in xrange(workers)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.server = server
+        return sorted(c.sha for page in pages for c in page), server.urls
+
+    def test_page_numbers(self):
+        shas, urls = self.scan(counted=True)
+        self.assertEqual(shas, map(str, xrange(6)))
+        self.assertEqual(len(urls), 3)
+
+    def test_continuation(self):
+        shas, urls = self.scan(counted=False)
+        self.assertEqual(shas, map(str, xrange(6)))
+        self.assertEqual(len(urls), 3)
+
+    def test_model_headers(self):
+        headers = classmethod(lambda cls, method: {'Accept': 'text/json'})
+        with patch.object(Commit, '_request_headers', headers, create=True):
+            self.scan(counted=True, workers=1)
+        self.assertEqual([sent['Accept'] for sent in self.server.headers],
+                         ['text/json'] * 3)
+
+    def test_finished_scan(self):
+        self.scan(counted=True)
+        queue = PageQueue(self.path, Repo(name='r'), 'commits')
+        self.assertEqual(list(queue), [])
+        self.assertEqual(queue.metrics(),
+                         dict(pending=0, claimed=0, done=3))
@@ -0,0 +1,125 @@
+# coding: utf-8
+
+import json
+import threading
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from mock import patch
+
+from pyresto.core import Model, ServerResponseException
+from pyresto.hedge import Hedger
+
+from . import mock_response
+
+
+class Repo(Model):
+    _url_base = 'http://hedge.example.com'
+    _path = '/repos/{name}'
+    _pk = 'name'
+
+
+URL = 'http://hedge.example.com/repos/r'
+
+
+def warmed(**kwargs):
+    # A hedger which knows the latency of the URL
+    hedger = Hedger(min_samples=1, min_delay=0, **kwargs)
+    hedger.observe(URL, 0.01)
+    return hedger
+
+
+class TestHedger(unittest.TestCase):
+    def test_delay(self):
+        hedger = Hedger(percentile=50, min_samples=3, min_delay=0)
+        self.assertIsNone(hedger.delay(URL))
+        for latency in (0.1, 0.3, 0.2):
+            hedger.observe('http://hedge.example.com/repos/other', latency)
+        self.assertEqual(hedger.delay(URL), 0.2)  # from the host
+
+        for latency in (1, 3, 2):
+            hedger.observe(URL + '?page=2', latency)
+        self.assertEqual(hedger.delay(URL), 2)
+
+    def test_hedge_wins(self):
+        hedger = warmed()
+        events = list()
+
+        def send(cancelled):
+            events.append(cancelled)
+            if len(events) == 1:
+                cancelled.wait(5)
+                return 'slow'
+            return 'fast'
+
+        self.assertEqual(hedger.request(URL, send), 'fast')
+        self.assertTrue(events[0].wait(1))
+        self.assertFalse(events[1].is_set())
+        metrics = hedger.metrics()
+        self.assertEqual((metrics['hedged'], metrics['wins']), (1, 1))
+
+    def test_errors(self):
+        hedger = warmed()
+        calls = list()
+        started = threading.Event()
+
+        def send(cancelled):
+            calls.append(cancelled)
+            if len(calls) == 1:
+                started.wait(5)  # fails after the hedge is sent
+                raise ServerResponseException('Boom', 500)
+            started.set()
+            return 'hedge'
+
+        self.assertEqual(hedger.request(URL, send), 'hedge')
+
+        def fail(cancelled):
+            raise ServerResponseException('Boom', 500)
+
+        with self.assertRaises(ServerResponseException):
+            hedger.request(URL, fail)
+
+    def test_budget(self):
+        hedger = warmed(max_rate=0, burst=0)
+        threads = list()
+
+        def send(cancelled):
+            threads.append(threading.current_thread())
+            return 'only'
+
+        self.assertEqual(hedger.request(URL, send), 'only')
+        self.assertEqual(threads, [threading.current_thread()])
+        self.assertEqual(hedger.metrics()['hedged'], 0)
+
+
+class TestModelHedging(unittest.TestCase):
+    def setUp(self):
+        Repo._hedger = warmed()
+        self.addCleanup(setattr, Repo, '_hedger', None)
+
+        self.calls = list()
+        released = threading.Event()
+        self.addCleanup(released.set)
+
+        def request(method, url, **kwargs):
+            self.calls.append(method)
+            if method == 'get' and len(self.calls) == 1:
+                released.wait(5)
+            return mock_response(json.dumps(dict(name='r',
+                                                 call=len(self.calls))))
+
+        patcher = patch('requests.request', side_effect=request)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get(self):
+        self.assertEqual(Repo.get('r').call, 2)
+        self.assertEqual(Repo._hedger.metrics()['wins'], 1)
+
+    def test_not_idempotent(self):
+        Repo._cached_request('DELETE', URL)
+        self.assertEqual(self.calls, ['delete'])
+        self.assertEqual(Repo._hedger.metrics()['requests'], 0)
@@ -0,0 +1,100 @@
+# coding: utf-8
+
+import gc
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from pyresto.core import Model, Foreign
+from pyresto.interning import Interner
+
+
+class User(Model):
+    _url_base = 'http://example.com'
+    _pk = 'login'
+    _interner = Interner()
+
+
+class Commit(Model):
+    _url_base = 'http://example.com'
+    _pk = 'sha'
+    author = Foreign(User, '__author', embedded=True)
+
+
+class TestInterner(unittest.TestCase):
+    def test_intern(self):
+        interner = Interner()
+        first = interner.intern({u'login': u'alice', u'tags': [u'a', 1]})
+        second = interner.intern({u'login': u'alice', u'tags': [u'a', 1]})
+
+        self.assertIs(first, second)
+        self.assertIs(first[u'tags'], second[u'tags'])
+        self.assertIs(interner.intern(u'alice'), first[u'login'])
+        self.assertEqual(interner.metrics()['hits'], 2)
+
+    def test_types_differ(self):
+        interner = Interner()
+        number = interner.intern(dict(value=1))
+        flag = interner.intern(dict(value=True))
+        self.assertIsNot(number, flag)
+        self.assertIs(flag['value'], True)
+
+    def test_max_entries(self):
+        interner = Interner(max_entries=2)
+        interner.intern(u'a')
+        interner.intern(u'b')
+        interner.intern(u'c')
+        self.assertEqual(interner.metrics()['values'], 1)
+
+
+class TestEmbedded(unittest.TestCase):
+    def setUp(self):
+        User._interner.clear()
+
+    def test_shared_models(self):
+        commits = [Commit(sha=i, author=dict(login=u'user{0}'.format(i % 3)))
+                   for i in xrange(30)]
+
+        self.assertIs(commits[0].author, commits[3].author)
+        self.assertIsNot(commits[0].author, commits[1].author)
+        self.assertEqual(commits[1].author.login, u'user1')
+        for commit in commits:
+            commit.author
+        self.assertEqual(User._interner.metrics()['models'], 3)
+
+    def test_opt_in(self):
+        self.assertIsNone(Model._interner)
+        self.assertIsNone(Commit._interner)
+
+    def test_no_owner(self):
+        first = Commit(sha='o1', author=dict(login=u'alice'))
+        second = Commit(sha='o2', author=dict(login=u'alice'))
+        self.assertIs(first.author, second.author)
+        self.assertIsNone(first.author._pyresto_owner)
+        self.assertEqual(first.author._pk_vals, (u'alice',))
+
+    def test_read_only(self):
+        first = Commit(sha='r1', author=dict(login=u'alice', name=u'A'))
+        second = Commit(sha='r2', author=dict(login=u'alice', name=u'A'))
+        with self.assertRaises(AttributeError):
+            first.author.name = u'B'
+        self.assertEqual(second.author.name, u'A')
+        self.assertEqual(second.author._dirty, frozenset())
+
+    def test_weak_models(self):
+        commit = Commit(sha='w1', author=dict(login=u'alice'))
+        commit.author
+        self.assertEqual(User._interner.metrics()['models'], 1)
+        del commit
+        gc.collect()
+        self.assertEqual(User._interner.metrics()['models'], 0)
+
+    def test_bindings_not_shared(self):
+        first = Commit(sha='b1', author=dict(login=u'alice'))
+        second = Commit(sha='b2', author=dict(login=u'alice'))
+        second._url_base = 'http://other.com'
+
+        self.assertIsNot(first.author, second.author)
+        self.assertEqual(second.author._url_base, 'http://other.com')
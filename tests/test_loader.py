@@ -0,0 +1,151 @@
+# coding: utf-8
+
+import json
+import urlparse
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from mock import patch
+
+from pyresto.core import Many, Model
+from pyresto.loader import Loader, current_loader
+
+from . import mock_response
+
+
+class Bug(Model):
+    _url_base = 'http://loader.example.com'
+    _path = '/bug/{id}'
+    _pk = 'id'
+
+    @classmethod
+    def _fetch_many(cls, ids, **kwargs):
+        path = '/bug?id=' + ','.join(unicode(i) for i in ids)
+        return cls._rest_call(url=cls._url_base + path, **kwargs).data
+
+
+class Comment(Model):
+    _url_base = 'http://loader.example.com'
+    _path = '/comment/{id}'
+    _pk = 'id'
+
+
+def _respond(method, url, **kwargs):
+    parsed = urlparse.urlparse(url)
+    if parsed.path == '/bug':
+        ids = urlparse.parse_qs(parsed.query)['id'][0].split(',')
+        body = [dict(id=int(i), summary=u'bug ' + i) for i in ids]
+    elif parsed.path.endswith('/depends_on'):
+        body = [dict(id=2), dict(id=3), dict(id=4)]
+    elif parsed.path.endswith('/comments'):
+        body = [dict(id=5), dict(id=6)]
+    elif parsed.path.startswith('/comment/'):
+        body = dict(id=int(parsed.path[9:]), text=u'comment')
+    else:
+        body = dict(id=int(parsed.path[5:]),
+                    summary=u'bug ' + parsed.path[5:])
+    return mock_response(json.dumps(body))
+
+
+class TestLoader(unittest.TestCase):
+    def setUp(self):
+        Bug.depends_on = Many(Bug, '/bug/{id}/depends_on')
+        Bug.comments = Many(Comment, '/bug/{id}/comments')
+        patcher = patch('requests.request', side_effect=_respond)
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def urls(self):
+        return [call[0][1] for call in self.request.call_args_list]
+
+    def test_batch_request(self):
+        bug = Bug(id=1)
+        with Loader() as loader:
+            summaries = [b.summary for b in bug.depends_on]
+
+        self.assertEqual(summaries, [u'bug 2', u'bug 3', u'bug 4'])
+        self.assertEqual(self.urls(), [
+            'http://loader.example.com/bug/1/depends_on',
+            'http://loader.example.com/bug?id=2,3,4'])
+        self.assertEqual(loader.metrics(), dict(requests=1, loaded=3))
+
+    def test_batch_size(self):
+        bug = Bug(id=1)
+        with Loader(batch_size=2):
+            summaries = [b.summary for b in bug.depends_on]
+
+        self.assertEqual(summaries, [u'bug 2', u'bug 3', u'bug 4'])
+        self.assertEqual(self.urls()[1:], [
+            'http://loader.example.com/bug?id=2,3',
+            'http://loader.example.com/bug?id=4'])
+
+    def test_fan_out(self):
+        bug = Bug(id=1)
+        with Loader():
+            comments = bug.comments
+            texts = [c.text for c in comments]
+
+        self.assertEqual(texts, [u'comment', u'comment'])
+        self.assertEqual(sorted(self.urls()[1:]), [
+            'http://loader.example.com/comment/5',
+            'http://loader.example.com/comment/6'])
+
+    def test_inactive(self):
+        bug = Bug(id=1)
+        self.assertIsNone(current_loader())
+        summaries = [b.summary for b in bug.depends_on]
+
+        self.assertEqual(summaries, [u'bug 2', u'bug 3', u'bug 4'])
+        self.assertEqual(len(self.urls()), 4)
+
+
+class TestLoadRelations(unittest.TestCase):
+    def setUp(self):
+        from pyresto.apis.bugzilla.models import Bug as BugzillaBug
+        self.Bug = BugzillaBug
+        self.urls = list()
+
+        def respond(method, url, **kwargs):
+            self.urls.append(url)
+            query = urlparse.parse_qs(urlparse.urlparse(url).query)
+            ids = [int(i) for i in query['id'][0].split(',')]
+            bugs = [dict(id=i, comments=[dict(id=i * 10, text=u'c')],
+                         history=[dict(when=u'now')], depends_on=[i + 1])
+                    for i in ids if i != 3]  # 3 is not visible
+            return mock_response(json.dumps(dict(bugs=bugs)))
+
+        patcher = patch('requests.request', side_effect=respond)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def bugs(self, ids):
+        bugs = [self.Bug(id=i) for i in ids]
+        for bug in bugs:
+            bug._url_base = 'https://bugzilla.example.com/bzapi/'
+        return bugs
+
+    def test_batches(self):
+        bugs = self.bugs(range(1, 6))
+        requests = self.Bug.load_relations(bugs, 'comments', 'history',
+                                           'depends_on', batch_size=2)
+        self.assertEqual(requests, 3)
+        self.assertEqual(self.urls[0],
+                         'https://bugzilla.example.com/bzapi/bug?id=1,2'
+                         '&include_fields=id,comments,history,depends_on')
+
+        self.assertEqual(bugs[1].comments[0].id, 20)
+        self.assertIs(bugs[1].comments[0]._pyresto_owner, bugs[1])
+        self.assertEqual(bugs[0].history[0].when, u'now')
+        self.assertEqual(bugs[4].depends_on[0].id, 6)
+        self.assertEqual(len(self.urls), 3)  # served from the cache
+
+        self.assertEqual(self.Bug.load_relations(bugs[:2], 'comments'), 0)
+
+    def test_invalid(self):
+        with self.assertRaises(AttributeError):
+            self.Bug.load_relations(self.bugs([1]), 'summary')
+        with self.assertRaises(TypeError):
+            self.Bug.load_relations(self.bugs([1]), 'comments', size=1)
@@ -0,0 +1,49 @@
+# coding: utf-8
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from pyresto.paging import PageSizer
+
+
+class TestPageSizer(unittest.TestCase):
+    def test_growth(self):
+        sizer = PageSizer()
+        self.assertEqual(sizer.size_for(0, None, 100), 25)
+        self.assertEqual(sizer.size_for(25, 25, 100), 25)
+        self.assertEqual(sizer.size_for(50, 25, 100), 50)
+        self.assertEqual(sizer.size_for(100, 50, 100), 100)
+        self.assertEqual(sizer.size_for(200, 100, 100), 100)
+
+    def test_alignment(self):
+        sizer = PageSizer(initial=30)
+        self.assertEqual(sizer.size_for(30, 30, 100), 30)
+        self.assertEqual(sizer.size_for(60, 30, 100), 60)
+        # 100 would skip the items 100-119 so the largest divisor is used
+        self.assertEqual(sizer.size_for(120, 60, 100), 60)
+
+    def test_latency(self):
+        sizer = PageSizer(target_latency=1.0)
+        sizer.observe(25, 25, 0.5, 2500)  # 20ms per item
+        self.assertEqual(sizer.ideal_size(100), 50)
+        self.assertEqual(sizer.size_for(100, 50, 100), 50)
+
+    def test_bytes(self):
+        sizer = PageSizer(max_page_bytes=4000)
+        sizer.observe(25, 25, 0.0, 2500)  # 100 bytes per item
+        self.assertEqual(sizer.ideal_size(100), 40)
+
+    def test_metrics(self):
+        sizer = PageSizer(maximum=10)
+        self.assertEqual(sizer.size_for(0, None, 100), 2)
+        sizer.observe(2, 2, 0.1, 20)
+        sizer.observe(4, 3, 0.1, 30)
+
+        metrics = sizer.metrics()
+        self.assertEqual(metrics['pages'], 2)
+        self.assertEqual(metrics['items'], 5)
+        self.assertEqual(metrics['bytes'], 50)
+        self.assertEqual(metrics['sizes'], {2: 1, 4: 1})
+        self.assertAlmostEqual(metrics['item_bytes'], 10.0)
@@ -0,0 +1,79 @@
+# coding: utf-8
+
+import json
+import marshal
+
+from operator import itemgetter
+
+from mock import patch
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from pyresto.core import Model, Many
+from pyresto.parallel import ParsePool, _parse
+
+from . import mock_response
+
+
+class Comment(Model):
+    _url_base = 'http://example.com'
+    _pk = 'id'
+
+
+class Bug(Model):
+    _url_base = 'http://example.com'
+    _pk = 'id'
+    comments = Many(Comment, '/bug/{self.id}/comment',
+                    preprocessor=itemgetter('comments'))
+
+
+class TestParsePool(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.pool = ParsePool(processes=2, min_size=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.close()
+
+    def setUp(self):
+        Comment._parse_pool = self.pool
+        self.addCleanup(delattr, Comment, '_parse_pool')
+
+        body = json.dumps(dict(comments=[dict(id=i, text='comment')
+                                         for i in xrange(10)]))
+        patcher = patch('requests.request', side_effect=lambda *args, **kw:
+                        mock_response(body))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_relation_registered(self):
+        relation = vars(Bug)['comments']
+        self.assertIs(relation._owner, Bug)
+        self.assertEqual(relation._name, 'comments')
+
+    def test_preprocessed_in_workers(self):
+        comments = Bug(id=1).comments
+        self.assertEqual([c.id for c in comments], range(10))
+        self.assertIsInstance(comments[0], Comment)
+        self.assertEqual(self.pool.metrics()['parsed'], 1)
+
+    def test_marshalled(self):
+        body = json.dumps(dict(comments=[dict(id=1)]))
+        packed, data = _parse(Comment, body, (Bug, 'comments'))
+        self.assertTrue(packed)
+        self.assertEqual(marshal.loads(data), [dict(id=1)])
+
+        with patch.object(Comment, '_parser', staticmethod(
+                lambda body: [object()])):
+            packed, data = _parse(Comment, body, None)
+        self.assertFalse(packed)
+
+    def test_inline(self):
+        Comment._parse_pool = ParsePool(min_size=1024 * 1024)
+        comments = Bug(id=2).comments
+        self.assertEqual(len(comments), 10)
+        self.assertEqual(Comment._parse_pool.metrics(),
+                         dict(parsed=0, inline=1))
@@ -0,0 +1,117 @@
+# coding: utf-8
+
+import json
+import os
+import sys
+import tempfile
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from mock import patch
+from StringIO import StringIO
+
+from pyresto.core import Many, Model, ServerResponseException
+from pyresto.profile import CATEGORIES, Profiler, Replayer, main
+
+
+class Comment(Model):
+    _url_base = 'http://profile.example.com'
+    _path = '/comments/{id}'
+    _pk = 'id'
+
+
+class Post(Model):
+    _url_base = 'http://profile.example.com'
+    _path = '/posts/{id}'
+    _pk = 'id'
+
+    comments = Many(Comment, '/posts/{id}/comments')
+
+
+def _recording(responses):
+    fd, path = tempfile.mkstemp(suffix='.json')
+    with os.fdopen(fd, 'w') as f:
+        json.dump([dict(method='get', url=url, body=json.dumps(body),
+                        next=None, pages=None)
+                   for url, body in responses], f)
+    return path
+
+
+class TestProfiler(unittest.TestCase):
+    def setUp(self):
+        base = 'http://profile.example.com'
+        self.path = _recording([
+            (base + '/posts/1', dict(id=1, title=u'hello')),
+            (base + '/posts/1/comments', [dict(id=1), dict(id=2)]),
+            (base + '/comments/1', dict(id=1, body=u'first')),
+            (base + '/comments/2', dict(id=2, body=u'second')),
+        ])
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_breakdown(self):
+        with Replayer(self.path):
+            with Profiler() as profiler:
+                post = Post.get(1)
+                bodies = [comment.body for comment in post.comments]
+
+        self.assertEqual(bodies, [u'first', u'second'])
+        times = profiler.times()
+        self.assertEqual(set(times), set(CATEGORIES + ('other',)))
+        self.assertTrue(all(value >= 0 for value in times.itervalues()))
+
+        fetches = profiler.implicit_fetches()
+        self.assertEqual([(f.attribute, f.accesses, f.requests)
+                          for f in fetches],
+                         [('Comment.body', 2, 2), ('Post.comments', 1, 1)])
+        self.assertIn('test_profile.py', fetches[0].site)
+
+        out = StringIO()
+        profiler.report(out)
+        self.assertIn('lazy fetches', out.getvalue())
+        self.assertIn('Comment.body', out.getvalue())
+
+    def test_restores_methods(self):
+        originals = (Model.__dict__['_request'], Model.__dict__['__init__'],
+                     Model.__dict__['__getattr__'], Many.__dict__['__get__'])
+        with Replayer(self.path):
+            with Profiler():
+                Post.get(1)
+
+        self.assertEqual(originals, (Model.__dict__['_request'],
+                                     Model.__dict__['__init__'],
+                                     Model.__dict__['__getattr__'],
+                                     Many.__dict__['__get__']))
+
+    def test_replay_missing(self):
+        with Replayer(self.path):
+            self.assertRaises(ServerResponseException, Post.get, 2)
+
+
+class TestMain(unittest.TestCase):
+    def test_script(self):
+        fd, script = tempfile.mkstemp(suffix='.py')
+        self.addCleanup(os.remove, script)
+        self.addCleanup(os.remove, script + '.out')
+        with os.fdopen(fd, 'w') as f:
+            f.write('import sys\n'
+                    'if __name__ == "__main__":\n'
+                    '    open(__file__ + ".out", "w").write(" ".join('
+                    'sys.argv))\n')
+        self.addCleanup(setattr, sys, 'argv', sys.argv)
+
+        with patch.object(Profiler, 'report') as report:
+            main(['--top', '3', script, '--verbose', 'x'])
+
+        with open(script + '.out') as f:
+            self.assertEqual(f.read(), script + ' --verbose x')
+        report.assert_called_once_with(top=3)
+
+    def test_exclusive_transports(self):
+        with patch('sys.stderr', StringIO()):
+            self.assertRaises(SystemExit, main, ['--replay', 'a',
+                                                 '--record', 'b', 'x.py'])
@@ -0,0 +1,132 @@
+# coding: utf-8
+
+import threading
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from mock import patch
+
+from pyresto.core import Many, Model
+from pyresto.scheduler import (BULK, INTERACTIVE, Scheduler, current_priority,
+                               priority)
+
+from . import mock_response
+
+
+class Commit(Model):
+    _url_base = 'http://scheduler.example.com'
+    _path = '/commits/{sha}'
+    _pk = 'sha'
+
+
+class Repo(Model):
+    _url_base = 'http://scheduler.example.com'
+    _path = '/repos/{name}'
+    _pk = 'name'
+
+    commits = Many(Commit, '/repos/{name}/commits', lazy=True)
+
+
+class TestPriority(unittest.TestCase):
+    def test_context(self):
+        self.assertIsNone(current_priority())
+        with priority(BULK):
+            self.assertEqual(current_priority(), BULK)
+            with priority(INTERACTIVE):
+                self.assertEqual(current_priority(), INTERACTIVE)
+            self.assertEqual(current_priority(), BULK)
+        self.assertIsNone(current_priority())
+
+
+class TestScheduler(unittest.TestCase):
+    def admit_order(self, scheduler, requests):
+        # Holds the only slot while the requests queue up, then releases it
+        # and returns the order in which the requests were admitted
+        url = 'http://scheduler.example.com/'
+        scheduler.acquire(url)
+        order = list()
+        threads = list()
+        for name, level in requests:
+            def run(name=name, level=level):
+                scheduler.acquire(url, level)
+                order.append(name)
+                scheduler.release(url)
+
+            thread = threading.Thread(target=run)
+            thread.start()
+            threads.append(thread)
+            while scheduler.metrics()['waiting'] < len(threads):
+                pass
+
+        scheduler.release(url)
+        for thread in threads:
+            thread.join()
+        return order
+
+    def test_interactive_jumps_ahead(self):
+        scheduler = Scheduler(per_host=1)
+        order = self.admit_order(scheduler, [('bulk1', BULK), ('bulk2', BULK),
+                                             ('user', INTERACTIVE)])
+        self.assertEqual(order, ['user', 'bulk1', 'bulk2'])
+
+    def test_weighted_share(self):
+        scheduler = Scheduler(weights=dict(a=2, b=1), per_host=1)
+        requests = [('a%d' % i, 'a') for i in xrange(4)] + \
+                   [('b%d' % i, 'b') for i in xrange(2)]
+        order = self.admit_order(scheduler, requests)
+        self.assertEqual(order, ['a0', 'a1', 'b0', 'a2', 'a3', 'b1'])
+
+    def test_per_host_limit(self):
+        scheduler = Scheduler(per_host=2)
+        scheduler.acquire('http://a.example.com/1')
+        scheduler.acquire('http://a.example.com/2')
+        scheduler.acquire('http://b.example.com/1')
+        self.assertEqual(scheduler.metrics()['active'], 3)
+
+        blocked = threading.Thread(target=scheduler.acquire,
+                                   args=('http://a.example.com/3',))
+        blocked.start()
+        while not scheduler.metrics()['waiting']:
+            pass
+        self.assertTrue(blocked.is_alive())
+
+        scheduler.release('http://a.example.com/1')
+        blocked.join()
+        self.assertEqual(scheduler.metrics()['waiting'], 0)
+
+    def test_unknown_priority(self):
+        self.assertRaises(ValueError, Scheduler().acquire, 'http://a/', 'x')
+
+
+class TestModelPriorities(unittest.TestCase):
+    def setUp(self):
+        self.scheduler = Scheduler()
+        Model._scheduler = self.scheduler
+        self.addCleanup(setattr, Model, '_scheduler', None)
+
+        def respond(method, url, **kwargs):
+            if url.endswith('/commits'):
+                return mock_response('[{"sha": "a"}]')
+            return mock_response('{"name": "r"}')
+
+        patcher = patch('requests.request', side_effect=respond)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def priorities(self):
+        return dict((name, value['requests']) for name, value in
+                    self.scheduler.metrics()['priorities'].iteritems())
+
+    def test_defaults(self):
+        repo = Repo.get('r')
+        list(repo.commits)
+        self.assertEqual(self.priorities(), {INTERACTIVE: 1, BULK: 1})
+
+    def test_context_overrides_defaults(self):
+        with priority(BULK):
+            Repo.get('r')
+        Repo.get('r', priority=BULK)
+        self.assertEqual(self.priorities(), {BULK: 2})
@@ -0,0 +1,114 @@
+# coding: utf-8
+
+import cPickle
+import datetime
+import json
+
+from mock import patch
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from pyresto.core import Model, Many, Foreign
+from pyresto.interning import Interner
+from pyresto.serialize import PickleMixin, dumps, loads
+
+from . import mock_response
+
+
+class User(Model):
+    _url_base = 'http://example.com'
+    _pk = 'login'
+    _interner = Interner()
+
+
+class Commit(Model):
+    _url_base = 'http://example.com'
+    _path = '/repo/{repo}/commits/{sha}'
+    _pk = ('repo', 'sha')
+    author = Foreign(User, '__author', embedded=True)
+
+
+class Repo(PickleMixin, Model):
+    _url_base = 'http://example.com'
+    _path = '/repo/{name}'
+    _pk = 'name'
+    commits = Many(Commit, '/repo/{name}/commits')
+    owner = Foreign(User, '__owner', embedded=True)
+
+
+class TestSerialize(unittest.TestCase):
+    def setUp(self):
+        commits = [dict(sha=str(i), message=u'fix', author=dict(login=u'bob'))
+                   for i in xrange(3)]
+        patcher = patch('requests.request', side_effect=lambda *args, **kw:
+                        mock_response(json.dumps(commits)))
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        Repo.commits = Many(Commit, '/repo/{name}/commits')  # drop the cache
+        self.repo = Repo(name=u'pyresto', owner=dict(login=u'alice'))
+        self.repo._fetched = True
+        self.repo.commits[0].author
+        self.repo.commits[1].author
+        self.repo.owner
+        self.request.reset_mock()
+
+    def check(self, repo):
+        self.assertIsNot(repo, self.repo)
+        self.assertEqual(repo, self.repo)
+        self.assertEqual(repo.owner.login, u'alice')
+
+        commits = repo.commits
+        self.assertEqual([c.sha for c in commits], ['0', '1', '2'])
+        self.assertIs(commits[0]._pyresto_owner, repo)
+        self.assertEqual(commits[2]._pk_vals, (u'pyresto', '2'))
+        self.assertIs(commits[0].author, commits[1].author)
+        self.assertEqual(commits[2].author.login, u'bob')
+        self.assertEqual(self.request.call_count, 0)
+
+    def test_round_trip(self):
+        data = dumps([self.repo])
+        Repo.commits = Many(Commit, '/repo/{name}/commits')
+        self.check(loads(data)[0])
+
+    def test_pickle(self):
+        data = cPickle.dumps(self.repo, cPickle.HIGHEST_PROTOCOL)
+        Repo.commits = Many(Commit, '/repo/{name}/commits')
+        self.check(cPickle.loads(data))
+
+    def test_pickle_opt_in(self):
+        self.assertNotIn('__reduce__', vars(Model))
+        self.assertIsNot(User.__reduce__, Repo.__reduce__)
+
+    def test_tuples(self):
+        user = User(login=u'bob', labels=(0, 0), pairs=[(1, 1)],
+                    nested=((1, (u'a',)),))
+        user = loads(dumps([user]))[0]
+        self.assertEqual(user.labels, (0, 0))
+        self.assertEqual(user.pairs, [(1, 1)])
+        self.assertEqual(user.nested, ((1, (u'a',)),))
+
+    def test_unmarshallable(self):
+        created = datetime.datetime(2012, 1, 2, 3, 4, 5)
+        user = User(login=u'bob', created=created,
+                    dates=dict(joined=created.date()))
+        user = loads(dumps([user]))[0]
+        self.assertEqual(user.created, created)
+        self.assertEqual(user.dates, dict(joined=created.date()))
+
+    def test_uncompressed(self):
+        data = dumps([self.repo], compress=0)
+        self.assertGreater(len(data), len(dumps([self.repo])))
+        Repo.commits = Many(Commit, '/repo/{name}/commits')
+        self.check(loads(data)[0])
+
+    def test_bindings(self):
+        repo = loads(dumps([self.repo]), auth=('user', 'pass'))[0]
+        self.assertEqual(repo._auth, ('user', 'pass'))
+
+    def test_version(self):
+        data = dumps([self.repo], compress=0)
+        data = data.replace('i\x02\x00\x00\x00', 'i\x03\x00\x00\x00', 1)
+        self.assertRaises(ValueError, loads, data)
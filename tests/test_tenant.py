@@ -0,0 +1,206 @@
+# coding: utf-8
+
+import threading
+import time
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from mock import patch
+
+import requests
+
+from pyresto.cache import MemoryCache
+from pyresto.core import Many, Model
+from pyresto.scheduler import Scheduler
+from pyresto.tenant import Tenant, TenantPool, _Budget
+
+from . import mock_response
+
+
+class Repo(Model):
+    _url_base = 'http://tenant.example.com'
+    _path = '/repos/{name}'
+    _pk = 'name'
+
+
+class User(Model):
+    _url_base = 'http://tenant.example.com'
+    _path = '/users/{login}'
+    _pk = 'login'
+
+    repos = Many(Repo, '/users/{login}/repos')
+
+
+def _respond(method, url, **kwargs):
+    if url.endswith('/repos'):
+        return mock_response('[{"name": "a"}, {"name": "b"}]')
+    return mock_response('{"login": "alice"}')
+
+
+class TestTenant(unittest.TestCase):
+    def setUp(self):
+        patcher = patch('requests.request', side_effect=_respond)
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bindings(self):
+        cache = MemoryCache()
+        tenant = Tenant(auth=('alice', 'secret'), cache=cache)
+        user = tenant.get(User, 'alice')
+        repo = user.repos[0]
+
+        for instance in (user, repo):
+            self.assertEqual(instance._auth, ('alice', 'secret'))
+            self.assertIs(instance._session, tenant.session)
+            self.assertIs(instance._cache, cache)
+
+        for call in self.request.call_args_list:
+            self.assertIs(call[1]['session'], tenant.session)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(User._cache)
+
+    def test_separate_caches(self):
+        alice, bob = Tenant(cache=MemoryCache()), Tenant(cache=MemoryCache())
+        alice.get(User, 'alice')
+        bob.get(User, 'alice')
+        alice.get(User, 'alice')
+        self.assertEqual(self.request.call_count, 2)
+
+    def test_isolation(self):
+        def respond(method, url, auth=None, **kwargs):
+            owner = auth[0]
+            if url.endswith('/repos'):
+                return mock_response('[{{"name": "{0}-repo"}}]'.format(owner))
+            return mock_response('{{"login": "shared", "seen_by": "{0}"}}'
+                                 .format(owner))
+
+        self.request.side_effect = respond
+        alice = Tenant(auth=('alice', 'secret'), cache=MemoryCache())
+        bob = Tenant(auth=('bob', 'secret'), cache=MemoryCache())
+
+        alice_user = alice.get(User, 'shared')
+        self.assertEqual(alice_user.repos[0].name, 'alice-repo')
+        bob_user = bob.get(User, 'shared')
+        self.assertEqual(alice_user, bob_user)  # the same resource
+
+        self.assertEqual(bob_user.seen_by, 'bob')
+        self.assertEqual(bob_user.repos[0].name, 'bob-repo')
+        self.assertEqual(bob_user.repos[0]._auth, ('bob', 'secret'))
+        self.assertEqual(alice_user.repos[0].name, 'alice-repo')
+        self.assertEqual(alice_user.repos[0]._auth, ('alice', 'secret'))
+        sessions = {'alice': alice.session, 'bob': bob.session}
+        for call in self.request.call_args_list:
+            self.assertIs(call[1]['session'], sessions[call[1]['auth'][0]])
+        self.assertEqual(self.request.call_count, 4)
+
+    def test_create(self):
+        tenant = Tenant(auth=('alice', 'secret'))
+        repo = tenant.create(Repo, name='new')
+        self.assertEqual(repo._auth, ('alice', 'secret'))
+        self.assertIs(repo._session, tenant.session)
+
+    def test_session_spends_budget(self):
+        tenant = Tenant(rate=1000, burst=2)
+        with patch.object(requests.Session, 'request') as request:
+            tenant.session.request('get', 'http://tenant.example.com/')
+        self.assertEqual(request.call_count, 1)
+        self.assertEqual(tenant.metrics()['requests'], 1)
+
+
+    def test_budget_spent_before_scheduler(self):
+        User._scheduler = Scheduler(per_host=1)
+        self.addCleanup(setattr, User, '_scheduler', None)
+        self.request.side_effect = lambda method, url, session=None, **kw: \
+            session.request(method, url, **kw)
+
+        limited, free = Tenant(), Tenant()
+        waiting, gate = threading.Event(), threading.Event()
+        self.addCleanup(gate.set)
+
+        def wait():
+            waiting.set()
+            gate.wait(5)
+            return 0
+
+        limited.budget.wait = wait
+        with patch.object(requests.Session, 'request', side_effect=lambda
+                          *args, **kwargs: mock_response('{"login": "x"}')):
+            slow = threading.Thread(target=limited.get, args=(User, 'alice'))
+            slow.start()
+            waiting.wait(5)
+
+            # the slot of the host is free while alice waits for her budget
+            fast = threading.Thread(target=free.get, args=(User, 'bob'))
+            fast.start()
+            fast.join(2)
+            self.assertFalse(fast.is_alive())
+            gate.set()
+            slow.join(5)
+
+        self.assertEqual(limited.metrics()['requests'], 1)
+        self.assertEqual(free.metrics()['requests'], 1)
+
+class TestBudget(unittest.TestCase):
+    def test_unlimited(self):
+        budget = _Budget()
+        self.assertEqual(budget.delay(), 0)
+        self.assertEqual(budget.wait(), 0)
+
+    def test_burst(self):
+        budget = _Budget(rate=1, burst=2)
+        self.assertEqual(budget.wait(), 0)
+        self.assertEqual(budget.wait(), 0)
+        self.assertGreater(budget.delay(), 0.9)
+
+
+class TestTenantPool(unittest.TestCase):
+    def test_turns(self):
+        busy, quiet = Tenant(), Tenant()
+        order = list()
+        started, gate = threading.Event(), threading.Event()
+
+        pool = TenantPool(concurrency=1)
+        pool.submit(busy, lambda: started.set() or gate.wait())
+        started.wait()
+        for i in xrange(3):
+            pool.submit(busy, order.append, ('busy', i))
+        for i in xrange(2):
+            pool.submit(quiet, order.append, ('quiet', i))
+        gate.set()
+        pool.close()
+
+        self.assertEqual(order, [('busy', 0), ('quiet', 0), ('busy', 1),
+                                 ('quiet', 1), ('busy', 2)])
+
+    def test_skips_tenants_over_budget(self):
+        limited, free = Tenant(rate=0.01), Tenant()
+        limited.budget.wait()  # spend the only token
+        pool = TenantPool(concurrency=1)
+        first = pool.submit(limited, time.time)
+        second = pool.submit(free, time.time)
+
+        self.assertGreater(second.get(1), 0)
+        self.assertFalse(first.ready())
+
+    def test_get_timeout(self):
+        gate = threading.Event()
+        self.addCleanup(gate.set)
+        def work():
+            gate.wait(5)
+            return 'done'
+
+        pool = TenantPool(concurrency=1)
+        task = pool.submit(Tenant(), work)
+
+        self.assertRaises(RuntimeError, task.get, 0.01)
+        gate.set()
+        self.assertEqual(task.get(5), 'done')
+
+    def test_errors(self):
+        pool = TenantPool()
+        task = pool.submit(Tenant(), int, 'x')
+        pool.close()
+        self.assertRaises(ValueError, task.get)
@@ -0,0 +1,200 @@
+# coding: utf-8
+
+import base64
+import gzip
+import os
+import shutil
+import tempfile
+import zlib
+
+from io import BytesIO
+
+from mock import patch
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from pyresto.apis.bugzilla.models import Attachment
+from pyresto.core import (Model, ResponseTooLargeException,
+                          ServerResponseException)
+from pyresto.transfer import Base64FieldDecoder, TransferMetrics, decoder
+
+from . import mock_response
+
+
+def gzipped(data):
+    buf = BytesIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+        f.write(data)
+    return buf.getvalue()
+
+
+class MockModel(Model):
+    _url_base = 'http://example.com'
+    _pk = 'id'
+    _chunk_size = 16
+
+
+class TestDecoder(unittest.TestCase):
+    body = '{"comments": ["%s"]}' % ('x' * 1000)
+
+    def decode(self, encoding, data):
+        stream = decoder(encoding)
+        chunks = [stream.decompress(data[i:i + 7])
+                  for i in xrange(0, len(data), 7)]
+        return ''.join(chunks) + stream.flush()
+
+    def test_gzip(self):
+        self.assertEqual(self.decode('gzip', gzipped(self.body)), self.body)
+
+    def test_deflate(self):
+        self.assertEqual(self.decode('deflate', zlib.compress(self.body)),
+                         self.body)
+        raw = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        data = raw.compress(self.body) + raw.flush()
+        self.assertEqual(self.decode('deflate', data), self.body)
+
+    def test_identity(self):
+        self.assertEqual(self.decode('', self.body), self.body)
+        self.assertEqual(self.decode('unknown', self.body), self.body)
+
+
+class TestBase64FieldDecoder(unittest.TestCase):
+    content = os.urandom(1000)
+
+    def decode(self, body, size):
+        stream = Base64FieldDecoder('data')
+        chunks = [stream.decompress(body[i:i + size])
+                  for i in xrange(0, len(body), size)]
+        return ''.join(chunks) + stream.flush()
+
+    def test_chunks(self):
+        encoded = base64.b64encode(self.content).replace('/', '\\/')
+        body = '{"summary": "data", "data" : "%s", "x": 1}' % encoded
+        for size in (1, 3, 7, 64, len(body)):
+            self.assertEqual(self.decode(body, size), self.content)
+
+    def test_line_breaks(self):
+        encoded = base64.encodestring(self.content).replace('\n', '\\n')
+        body = '{"attachments": {"1": {"data": "%s"}}}' % encoded
+        self.assertEqual(self.decode(body, 5), self.content)
+
+    def test_missing(self):
+        self.assertRaises(ValueError, self.decode, '{"size": 0}', 4)
+        self.assertRaises(ValueError, self.decode, '{"data": "YWJj', 4)
+
+
+class TestTransferMetrics(unittest.TestCase):
+    def test_metrics(self):
+        metrics = TransferMetrics(history=1)
+        metrics.record('/a', 'gzip', 10, 100)
+        metrics.record('/b', '', 50, 50)
+
+        result = metrics.metrics()
+        self.assertEqual(result['requests'], 2)
+        self.assertEqual(result['wire_bytes'], 60)
+        self.assertEqual(result['decoded_bytes'], 150)
+        self.assertEqual(result['ratio'], 2.5)
+        self.assertEqual(result['recent'], [dict(url='/b', encoding=None,
+                                                 wire_bytes=50,
+                                                 decoded_bytes=50)])
+
+
+class TestRequest(unittest.TestCase):
+    body = '{"id": 1, "text": "%s"}' % ('a' * 500)
+
+    def setUp(self):
+        MockModel._transfer_metrics = TransferMetrics()
+        patcher = patch('requests.request', side_effect=lambda *args, **kw:
+                        mock_response(gzipped(self.body),
+                                      headers={'content-encoding': 'gzip'}))
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_compressed(self):
+        data = MockModel._rest_call('/a', headers={'X-Test': '1'}).data
+        self.assertEqual(data['text'], 'a' * 500)
+
+        headers = self.request.call_args[1]['headers']
+        self.assertIn('gzip', headers['Accept-Encoding'])
+        self.assertEqual(headers['X-Test'], '1')
+        self.assertFalse(self.request.call_args[1]['prefetch'])
+
+        metrics = MockModel._transfer_metrics.metrics()
+        self.assertEqual(metrics['decoded_bytes'], len(self.body))
+        self.assertLess(metrics['wire_bytes'], len(self.body) / 5)
+
+    def test_detected_charset(self):
+        text = u'Привет, как дела? Это тестовый текст о погоде'
+        self.request.side_effect = lambda *args, **kw: mock_response(
+            u'{{"text": "{0}"}}'.format(text).encode('koi8-r'))
+        self.assertEqual(MockModel._rest_call('/a').data['text'], text)
+
+    def test_logged_error_body(self):
+        self.request.side_effect = lambda *args, **kw: mock_response(
+            gzipped('x' * 100000), headers={'content-encoding': 'gzip'},
+            status_code=500)
+        with patch('logging.error') as error:
+            self.assertRaises(ServerResponseException, MockModel._rest_call,
+                              '/a')
+
+        body = error.call_args[0][-1]
+        self.assertTrue(body.startswith('x' * 1024))
+        self.assertEqual(len(body), 1027)  # with the ellipsis
+
+    def test_max_size(self):
+        MockModel._max_response_size = 100
+        self.addCleanup(delattr, MockModel, '_max_response_size')
+        self.assertRaises(ResponseTooLargeException, MockModel._rest_call,
+                          '/a')
+
+    def test_content_length(self):
+        MockModel._max_response_size = 100
+        self.addCleanup(delattr, MockModel, '_max_response_size')
+        self.request.side_effect = lambda *args, **kw: mock_response(
+            self.body, headers={'content-length': str(len(self.body))})
+        self.assertRaises(ResponseTooLargeException, MockModel._rest_call,
+                          '/a')
+
+
+class TestAttachmentDownload(unittest.TestCase):
+    content = os.urandom(5000)
+
+    def setUp(self):
+        body = '{"data": "%s"}' % base64.b64encode(self.content)
+        patcher = patch('requests.request', side_effect=lambda *args, **kw:
+                        mock_response(gzipped(body),
+                                      headers={'content-encoding': 'gzip'}))
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def attachment(self, id):
+        attachment = Attachment(id=id)
+        attachment._url_base = 'https://bugzilla.example.com/bzapi/'
+        return attachment
+
+    def test_file(self):
+        output = BytesIO()
+        self.attachment(7).download(output)
+        self.assertEqual(output.getvalue(), self.content)
+        self.assertEqual(self.request.call_args[0][1],
+                         'https://bugzilla.example.com/bzapi/attachment/7'
+                         '?attachmentdata=1&include_fields=data')
+
+    def test_mmap(self):
+        data = self.attachment(7).download()
+        self.assertEqual(data[:], self.content)
+        data.close()
+
+    def test_many(self):
+        paths = Attachment.download_many(
+            [self.attachment(i) for i in xrange(4)], self.dir)
+        self.assertEqual(paths, [os.path.join(self.dir, unicode(i))
+                                 for i in xrange(4)])
+        for path in paths:
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), self.content)
@@ -0,0 +1,124 @@
+# coding: utf-8
+
+import json
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest
+
+from mock import patch
+
+from pyresto.core import Many, Model
+from pyresto.watch import Watcher, change
+
+from . import mock_response
+
+
+class Branch(Model):
+    _url_base = 'http://watch.example.com'
+    _path = '/repos/{repo}/branches/{name}'
+    _pk = ('repo', 'name')
+
+
+class Repo(Model):
+    _url_base = 'http://watch.example.com'
+    _path = '/repos/{name}'
+    _pk = 'name'
+
+    branches = Many(Branch, '/repos/{name}/branches')
+
+
+class Server(object):
+    # Serves the resources with ETags and answers the conditional requests
+    # for unchanged resources with 304
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.requests = list()
+        self.headers = list()
+
+    def __call__(self, method, url, headers=None, **kwargs):
+        self.requests.append((url, headers.get('If-None-Match')))
+        self.headers.append(headers)
+        body = json.dumps(self.resources[url])
+        etag = '"{0}"'.format(hash(body))
+        if headers.get('If-None-Match') == etag:
+            return mock_response('', headers=dict(etag=etag), status_code=304)
+        return mock_response(body, headers=dict(etag=etag))
+
+
+class TestWatcher(unittest.TestCase):
+    def setUp(self):
+        self.server = Server({
+            'http://watch.example.com/repos/r': dict(name='r', stars=1),
+            'http://watch.example.com/repos/r/branches': [
+                dict(name='master', sha='a')],
+        })
+        patcher = patch('requests.request', side_effect=self.server)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.repo = Repo(name='r', stars=1)
+
+    def test_model_changes(self):
+        events = list()
+        watcher = Watcher(interval=0, min_interval=0)
+        watcher.watch(self.repo, callback=events.append)
+
+        self.assertEqual(watcher.poll(), [])  # records the state
+        self.assertEqual(watcher.poll(), [])  # not modified
+        self.server.resources['http://watch.example.com/repos/r']['stars'] = 2
+        event = change(self.repo, None, dict(stars=(1, 2)))
+        self.assertEqual(watcher.poll(), [event])
+
+        self.assertEqual(events, [event])
+        self.assertEqual(self.repo.stars, 2)
+        self.assertEqual([etag is not None
+                          for _, etag in self.server.requests],
+                         [False, True, True])
+        metrics = watcher.metrics()
+        self.assertEqual(metrics['not_modified'], 1)
+        self.assertEqual(metrics['polls_per_change'], 3)
+
+    def test_relation_changes(self):
+        watcher = Watcher(interval=0, min_interval=0)
+        watcher.watch(self.repo, 'branches')
+        watcher.poll()
+
+        branches = self.server.resources[
+            'http://watch.example.com/repos/r/branches']
+        branches[0]['sha'] = 'b'
+        branches.append(dict(name='dev', sha='c'))
+        event, = watcher.poll()
+
+        self.assertEqual(event.relation, 'branches')
+        self.assertEqual(event.changes, {
+            'master': (dict(name='master', sha='a'),
+                       dict(name='master', sha='b')),
+            'dev': (None, dict(name='dev', sha='c'))})
+
+    def test_model_headers(self):
+        headers = classmethod(lambda cls, method: {'Accept': 'text/json'})
+        with patch.object(Repo, '_request_headers', headers, create=True):
+            watcher = Watcher(interval=0, min_interval=0)
+            watcher.watch(self.repo)
+            watcher.poll()
+            watcher.poll()
+
+        self.assertEqual([sent['Accept'] for sent in self.server.headers],
+                         ['text/json', 'text/json'])
+        self.assertIn('If-None-Match', self.server.headers[1])
+
+    def test_adaptive_interval(self):
+        watcher = Watcher(interval=10, min_interval=5, max_interval=20)
+        watch = watcher.watch(self.repo)
+        watcher.poll()
+        self.assertEqual(watch.interval, 15)
+        self.assertEqual(watcher.poll(), [])  # not due yet
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_unwatch(self):
+        watcher = Watcher()
+        watcher.unwatch(watcher.watch(self.repo))
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(self.server.requests, [])